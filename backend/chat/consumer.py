@@ -1,20 +1,250 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+
+import msgpack
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from chat.models import ChatMessage, ChatSession
+from chat.services import broadcaster, replay_buffer
+from chat.services.broadcaster import unpack_messages
+from chat.services.chat_service import ChatService
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Full-duplex chat for one session on ws/chat/<session_id>/.
+
+    Server -> client: group broadcasts (assistant messages, streamed deltas)
+    plus replies to client frames. Client -> server frames are JSON objects
+    with a "type":
+
+        {"type": "message", "message": "...", "stream": true, "client_id": "..."}
+            Store the user message and queue the turn. Answered with
+            {"event": "turn_queued", "turn_id": ..., "client_id": ...}; the
+            assistant reply arrives as a normal broadcast with that turn_id.
+        {"type": "history", "since": "<cursor>", "before": "<cursor>", "limit": 50}
+            Answered with {"event": "history", "messages": [...], "draft_json": {...}}
+            plus cursors (see ChatService.get_session_summary). After a
+            reconnect, pass the last since_cursor to get only new messages.
+        {"type": "ack", "event_seq": N}
+            The client has rendered every broadcast up to event_seq N.
+            Needs ?client_id= on the connection; the ack is stored with
+            the replay buffer and a later reconnect with the same
+            client_id and no last_seq replays from N.
+
+    Broadcasts arrive in batches from the background broadcaster: reply
+    deltas sent close together are merged, and an assistant message whose
+    draft_version the connection has already seen omits draft_json.
+    Connect with ?format=msgpack to receive broadcasts as msgpack binary
+    frames instead of JSON text.
+
+    Every broadcast carries an event_seq. After a dropped connection,
+    reconnect with ?last_seq=<last event_seq seen> (or with the same
+    ?client_id= after acking) to have the missed broadcasts replayed from
+    the replay buffer. If some of them have already expired, the server
+    sends {"event": "resync_required"} and the client should fall back to
+    a history request.
+    """
 
     async def connect(self):
-        self.session_id = self.scope['url_route']['kwargs']['session_id']
+        self.session_id = int(self.scope['url_route']['kwargs']['session_id'])
         self.room_group_name = f"chat_{self.session_id}"
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.binary_frames = query.get('format', ['json'])[0] == 'msgpack'
+        # draft_version whose draft_json this connection has sent; the first
+        # draft after a connect or replay always goes out in full
+        self.draft_version = None
+        self.client_id = query.get('client_id', [None])[0]
+        try:
+            self.last_seq = int(query['last_seq'][0]) if 'last_seq' in query else None
+        except ValueError:
+            self.last_seq = None
+
+        if not await ChatSession.objects.filter(id=self.session_id).aexists():
+            await self.close(code=4404)
+            return
 
+        # Join the group before reading the buffer so nothing falls in between;
+        # chat_batch drops anything the replay already covered
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
+        broadcaster.get_broadcaster().attach_consumer_loop(asyncio.get_running_loop())
+
+        if not replay_buffer.replay_enabled():
+            return
+        if self.last_seq is None and self.client_id:
+            try:
+                self.last_seq = await replay_buffer.acked_seq(self.room_group_name, self.client_id)
+            except Exception as e:
+                print(f"WebSocket ack lookup error for {self.room_group_name}: {e}")
+        if self.last_seq is not None:
+            await self.replay_missed()
+
+    async def replay_missed(self):
+        try:
+            messages, complete = await replay_buffer.replay_since(self.room_group_name, self.last_seq)
+        except Exception as e:
+            print(f"WebSocket replay error for {self.room_group_name}: {e}")
+            messages, complete = [], False
+
+        if not complete:
+            await self.send_event("resync_required", last_seq=self.last_seq)
+            # The client's last_seq may come from a buffer that has since expired
+            self.last_seq = None
+        for message in messages:
+            await self.send_broadcast(message)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
+    async def send_event(self, event, **data):
+        await self.send(text_data=json.dumps({"event": event, **data}))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            frame = json.loads(text_data or "")
+        except json.JSONDecodeError:
+            await self.send_event("error", error="Frames must be JSON objects")
+            return
+
+        if not isinstance(frame, dict):
+            await self.send_event("error", error="Frames must be JSON objects")
+            return
+
+        frame_type = frame.get("type")
+
+        if frame_type == "message":
+            await self.receive_chat_turn(frame)
+        elif frame_type == "history":
+            await self.send_history(frame)
+        elif frame_type == "ack":
+            await self.receive_ack(frame)
+        else:
+            await self.send_event("error", error=f"Unknown frame type '{frame_type}'")
+
+    async def receive_ack(self, frame):
+        event_seq = frame.get("event_seq")
+        if not isinstance(event_seq, int) or isinstance(event_seq, bool) or event_seq < 0:
+            await self.send_event("error", error="'event_seq' must be a non-negative integer")
+            return
+        if not self.client_id:
+            await self.send_event("error", error="Connect with ?client_id= to ack")
+            return
+        if not replay_buffer.replay_enabled():
+            return
+
+        # Never ack past what this connection has actually sent
+        if self.last_seq is not None:
+            event_seq = min(event_seq, self.last_seq)
+        try:
+            await replay_buffer.ack(self.room_group_name, self.client_id, event_seq)
+        except Exception as e:
+            print(f"WebSocket ack error for {self.room_group_name}: {e}")
+
+    async def receive_chat_turn(self, frame):
+        client_id = frame.get("client_id")
+        user_text = frame.get("message")
+
+        if not isinstance(user_text, str) or not user_text.strip():
+            await self.send_event("error", error="'message' is required", client_id=client_id)
+            return
+
+        session = await ChatSession.objects.filter(id=self.session_id).only("id", "is_closed").afirst()
+        if session is None:
+            await self.send_event("error", error="Chat session not found.", client_id=client_id)
+            return
+        if session.is_closed:
+            await self.send_event("error", error="Chat is closed.", client_id=client_id)
+            return
+
+        user_message = await ChatMessage.objects.acreate(
+            session_id=self.session_id,
+            role="user",
+            content=user_text
+        )
+
+        stream = frame.get("stream")
+        ChatService.submit_turn(
+            self.session_id,
+            user_text,
+            user_message.id,
+            stream=stream if isinstance(stream, bool) else None
+        )
+
+        await self.send_event(
+            "turn_queued",
+            turn_id=user_message.id,
+            client_id=client_id,
+            timestamp=str(user_message.created_at)
+        )
+
+    async def send_history(self, frame):
+        session = await ChatSession.objects.filter(id=self.session_id).afirst()
+        if session is None:
+            await self.send_event("error", error="Chat session not found.")
+            return
+
+        since = frame.get("since")
+        limit = frame.get("limit")
+        limit = min(limit, 500) if isinstance(limit, int) and limit > 0 else None
+
+        try:
+            queryset, newest_first = ChatService.history_queryset(
+                self.session_id, since=since, before=frame.get("before"), limit=limit
+            )
+        except ValueError as e:
+            await self.send_event("error", error=str(e))
+            return
+
+        rows = [row async for row in queryset]
+        page = ChatService.history_page(rows, limit, newest_first, since)
+
+        await self.send_event(
+            "history",
+            session_id=session.id,
+            **page,
+            draft_json=session.draft_json,
+            draft_version=session.draft_version,
+            is_closed=session.is_closed,
+            is_submitted=session.is_submitted
+        )
+        self.draft_version = session.draft_version
+
     async def chat_message(self, event):
         """
         Receive message from group and forward to WebSocket client.
         """
         await self.send(text_data=json.dumps(event["message"]))
+
+    async def chat_delta(self, event):
+        """
+        Forward a streamed piece of the assistant reply to the WebSocket client.
+        """
+        await self.send(text_data=json.dumps(event["message"]))
+
+    async def chat_batch(self, event):
+        """
+        Forward a packed batch of broadcasts, one frame per message.
+        """
+        for message in unpack_messages(event["payload"]):
+            await self.send_broadcast(message)
+
+    async def send_broadcast(self, message):
+        event_seq = message.get("event_seq")
+        if event_seq is not None:
+            if self.last_seq is not None and event_seq <= self.last_seq:
+                return
+            self.last_seq = event_seq
+
+        draft_version = message.get("draft_version")
+        if "draft_json" in message and draft_version is not None:
+            if draft_version == self.draft_version:
+                message = {key: value for key, value in message.items() if key != "draft_json"}
+            else:
+                self.draft_version = draft_version
+
+        if self.binary_frames:
+            await self.send(bytes_data=msgpack.packb(message, use_bin_type=True))
+        else:
+            await self.send(text_data=json.dumps(message))
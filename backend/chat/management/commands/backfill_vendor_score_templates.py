@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from chat.models import SentEmail, VendorScore
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy sent_email.template onto VendorScore rows created before the template column existed, '
+        'so ranked_scores() and top_scores() see them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows need the backfill',
+        )
+
+    def handle(self, *args, **options):
+        missing = VendorScore.objects.filter(template__isnull=True)
+
+        if options['dry_run']:
+            self.stdout.write(f'{missing.count()} VendorScore row(s) without a template')
+            return
+
+        # One UPDATE ... SET template_id = (SELECT ...) instead of a save() per row
+        updated = missing.update(
+            template=Subquery(
+                SentEmail.objects.filter(id=OuterRef('sent_email_id')).values('template_id')[:1]
+            )
+        )
+        self.stdout.write(self.style.SUCCESS(f'Backfilled template on {updated} VendorScore row(s)'))
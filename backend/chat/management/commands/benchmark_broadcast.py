@@ -0,0 +1,149 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.services.broadcaster import Broadcaster, unpack_messages
+
+
+class Command(BaseCommand):
+    help = 'Broadcast streamed turns to many chat sessions and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=200,
+            help='Number of chat sessions, one subscriber each (default: 200)',
+        )
+        parser.add_argument(
+            '--deltas',
+            type=int,
+            default=40,
+            help='Streamed reply deltas per session before the final message (default: 40)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Publishing threads, like the chat worker pool (default: 8)',
+        )
+        parser.add_argument(
+            '--layer',
+            choices=['memory', 'redis'],
+            default='memory',
+            help='Channel layer shared by all sessions (redis uses CHANNEL_REDIS_URL)',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['batched', 'direct', 'both'],
+            default='both',
+            help='batched: background broadcaster; direct: async_to_sync(group_send) per event',
+        )
+
+    def handle(self, *args, **options):
+        modes = ['direct', 'batched'] if options['mode'] == 'both' else [options['mode']]
+        for mode in modes:
+            self.run_mode(mode, options)
+
+    def make_layer(self, options):
+        # Large capacity so the benchmark measures sending, not dropped messages
+        capacity = options['deltas'] + 10
+        if options['layer'] == 'redis':
+            from channels_redis.core import RedisChannelLayer
+            return RedisChannelLayer(hosts=[settings.CHANNEL_REDIS_URL], capacity=capacity)
+
+        from channels.layers import InMemoryChannelLayer
+        return InMemoryChannelLayer(capacity=capacity)
+
+    def run_mode(self, mode, options):
+        layer = self.make_layer(options)
+        sessions = options['sessions']
+        groups = [f"chat_{session_id}" for session_id in range(1, sessions + 1)]
+        channels = async_to_sync(self.subscribe)(layer, groups)
+
+        draft_json = {"project_title": "Office Setup", "budget": 50000, "items": [
+            {"name": "laptops", "quantity": 20, "specs": {"ram": "16GB"}},
+        ]}
+
+        def events(session_index):
+            for seq in range(1, options['deltas'] + 1):
+                yield {
+                    "event": "assistant_reply_delta",
+                    "role": "assistant",
+                    "delta": "token ",
+                    "seq": seq,
+                    "turn_id": session_index,
+                }
+            yield {
+                "role": "assistant",
+                "content": "token " * options['deltas'],
+                "draft_json": draft_json,
+                "draft_version": 1,
+                "missing_fields": ["deadline_days"],
+                "timestamp": "2025-01-01 00:00:00+00:00",
+                "turn_id": session_index,
+            }
+
+        if mode == 'batched':
+            broadcaster = Broadcaster(channel_layer=layer)
+
+            def publish_session(index):
+                for message in events(index):
+                    broadcaster.publish(groups[index], message)
+        else:
+            group_send = async_to_sync(layer.group_send)
+
+            def publish_session(index):
+                for message in events(index):
+                    event_type = "chat_delta" if "event" in message else "chat_message"
+                    group_send(groups[index], {"type": event_type, "message": message})
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(publish_session, range(sessions)))
+        published = time.perf_counter() - started
+        if mode == 'batched':
+            broadcaster.flush()
+        sent = time.perf_counter() - started
+
+        frames, delivered, payload_bytes = async_to_sync(self.drain)(layer, channels)
+
+        published_events = sessions * (options['deltas'] + 1)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{mode}: {published_events} events for {sessions} sessions on {options['layer']} layer "
+                f"in {sent:.2f}s ({published_events / sent:.0f} events/s, publishers done after {published:.2f}s); "
+                f"{frames} channel layer messages ({payload_bytes / 1024:.0f} KiB), "
+                f"{delivered} client frames"
+            )
+        )
+
+    async def subscribe(self, layer, groups):
+        channels = []
+        for group in groups:
+            channel = await layer.new_channel()
+            await layer.group_add(group, channel)
+            channels.append(channel)
+        return channels
+
+    async def drain(self, layer, channels):
+        frames = delivered = payload_bytes = 0
+        for channel in channels:
+            while True:
+                try:
+                    event = await asyncio.wait_for(layer.receive(channel), timeout=0.05)
+                except asyncio.TimeoutError:
+                    break
+                frames += 1
+                if event["type"] == "chat_batch":
+                    payload_bytes += len(event["payload"])
+                    delivered += len(unpack_messages(event["payload"]))
+                else:
+                    payload_bytes += len(json.dumps(event["message"]))
+                    delivered += 1
+        return frames, delivered, payload_bytes
@@ -0,0 +1,113 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from chat.services.llm import run_llm
+from chat.services.llm_clients import close_clients
+from chat.services.llm_standin import LATENCY_DISTRIBUTIONS, StandInConfig, make_server
+
+
+class Command(BaseCommand):
+    help = 'Send a burst of chat messages through run_llm and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=50,
+            help='Number of chat messages in the burst (default: 50)',
+        )
+        parser.add_argument(
+            '--no-pooling',
+            action='store_true',
+            help='Build a fresh client per call (pre-registry behaviour) for comparison',
+        )
+        parser.add_argument(
+            '--standin',
+            action='store_true',
+            help='Run against an in-process LLM stand-in instead of the configured provider',
+        )
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=20.0,
+            help='Stand-in mean latency in ms (default: 20)',
+        )
+        parser.add_argument(
+            '--latency-jitter-ms',
+            type=float,
+            default=0.0,
+            help='Stand-in latency spread (see llm_standin --help)',
+        )
+        parser.add_argument(
+            '--latency-distribution',
+            choices=LATENCY_DISTRIBUTIONS,
+            default='fixed',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Stand-in fraction of failed requests (0-1)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Stand-in random seed (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'LLM_CLIENT_POOLING': not options['no_pooling']}
+        server = None
+
+        if options['standin']:
+            server = make_server('127.0.0.1', 0, StandInConfig(
+                latency_ms=options['latency_ms'],
+                latency_jitter_ms=options['latency_jitter_ms'],
+                latency_distribution=options['latency_distribution'],
+                error_rate=options['error_rate'],
+                seed=options['seed'],
+            ))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_address[1]}'
+            overrides.update(MISTRAL_SERVER_URL=url, HF_INFERENCE_URL=url)
+
+        try:
+            self.run_burst(options, overrides)
+        finally:
+            if server:
+                server.shutdown()
+                server.server_close()
+
+    def run_burst(self, options, overrides):
+        draft_json = {"project_title": "Office Setup", "budget": 50000}
+        latencies = []
+
+        with override_settings(**overrides):
+            close_clients()
+            started = time.perf_counter()
+
+            for i in range(options['messages']):
+                call_started = time.perf_counter()
+                run_llm(f"Also need {i + 1} monitors", draft_json)
+                latencies.append((time.perf_counter() - call_started) * 1000)
+
+            total = time.perf_counter() - started
+            close_clients()
+
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(latencies)} messages in {total:.2f}s "
+                f"(pooling {'off' if options['no_pooling'] else 'on'}): "
+                f"mean {statistics.mean(latencies):.1f}ms, "
+                f"p50 {statistics.median(latencies):.1f}ms, "
+                f"p95 {p95:.1f}ms"
+            )
+        )
@@ -0,0 +1,147 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat.models import ChatSession, EmailTemplate, SentEmail, VendorScore
+from chat.services.scoring_service import ScoringService
+from gmail_service.models import GmailAccount
+from vendors.models import Vendor
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare stored ranks (full rescore after a change) with read-time window ranking. '
+        'Fixture rows are created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vendors',
+            type=int,
+            default=5000,
+            help='Vendors per template (default: 5000)',
+        )
+        parser.add_argument(
+            '--templates',
+            type=int,
+            default=4,
+            help='Templates in the fixture (default: 4)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='K for the top-K query (default: 10)',
+        )
+        parser.add_argument(
+            '--changes',
+            type=int,
+            default=20,
+            help='Single-vendor score changes to apply (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def make_fixture(self, options):
+        rng = random.Random(0)
+        account, _ = GmailAccount.objects.get_or_create(email='benchmark-ranking@example.com')
+        vendors = Vendor.objects.bulk_create([
+            Vendor(
+                name=f'Benchmark vendor {index}',
+                email=f'benchmark-ranking-{index}@example.com',
+                overall_rating=Decimal(f'{rng.uniform(1, 5):.2f}'),
+                on_time_delivery_rate=Decimal(f'{rng.uniform(50, 100):.2f}'),
+                is_email_verified=rng.random() < 0.7,
+            )
+            for index in range(options['vendors'])
+        ])
+
+        templates = []
+        for index in range(options['templates']):
+            session = ChatSession.objects.create(gmail_account=account, draft_json={'budget': 50000})
+            template = EmailTemplate.objects.create(session=session, subject=f'Benchmark {index}', template_body='')
+            SentEmail.objects.bulk_create([
+                SentEmail(
+                    template=template,
+                    vendor=vendor,
+                    sender=account,
+                    vendor_email_at_time=vendor.email,
+                    vendor_name_at_time=vendor.name,
+                    status='sent',
+                )
+                for vendor in vendors
+            ])
+            ScoringService.calculate_scores_for_template(template, Decimal('50000'))
+            templates.append(template)
+        return templates
+
+    def timed(self, func, repeat=1):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def run(self, options):
+        templates = self.make_fixture(options)
+        template = templates[0]
+        rng = random.Random(1)
+        score_ids = list(VendorScore.objects.filter(template=template).values_list('id', flat=True))
+
+        def change_one():
+            VendorScore.objects.filter(id=rng.choice(score_ids)).update(
+                final_score=Decimal(f'{rng.uniform(0, 100):.2f}')
+            )
+
+        # Stored ranks: every change needs a full rescore to keep ranks right
+        def stored_change():
+            change_one()
+            ScoringService.calculate_scores_for_template(template, Decimal('50000'))
+
+        def stored_read():
+            return list(VendorScore.objects.filter(template=template).order_by('rank').values_list('id', 'rank'))
+
+        def window_change():
+            change_one()
+
+        def window_read():
+            return list(ScoringService.ranked_scores(template).values_list('id', 'live_rank'))
+
+        def stored_top():
+            return list(VendorScore.objects.filter(template=template, rank__lte=options['top']).values_list('id'))
+
+        def window_top():
+            return list(ScoringService.top_scores([template], options['top']).values_list('id'))
+
+        def window_top_all():
+            return list(ScoringService.top_scores(templates, options['top']).values_list('id'))
+
+        changes = options['changes']
+        stored_change_ms, _ = self.timed(stored_change, changes)
+        stored_read_ms, _ = self.timed(stored_read, 5)
+        window_change_ms, _ = self.timed(window_change, changes)
+        window_read_ms, _ = self.timed(window_read, 5)
+        stored_top_ms, _ = self.timed(stored_top, 20)
+        window_top_ms, _ = self.timed(window_top, 20)
+        window_top_all_ms, rows = self.timed(window_top_all, 20)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['vendors']} vendors x {options['templates']} templates\n"
+            f"  change one score: stored rank {stored_change_ms:.1f}ms (full rescore), "
+            f"window rank {window_change_ms:.1f}ms\n"
+            f"  read full ranking: stored {stored_read_ms:.1f}ms, window {window_read_ms:.1f}ms\n"
+            f"  top-{options['top']} of one template: stored {stored_top_ms:.1f}ms, window {window_top_ms:.1f}ms\n"
+            f"  top-{options['top']} of every template: window {window_top_all_ms:.1f}ms ({len(rows)} rows)"
+        ))
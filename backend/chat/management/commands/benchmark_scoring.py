@@ -0,0 +1,119 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chat.services import scoring_engine
+from chat.services.scoring_service import ScoringService
+
+
+class Command(BaseCommand):
+    help = 'Compare per-vendor Decimal scoring with the vectorized engine on synthetic RFPs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vendors',
+            default='10,1000,100000',
+            help='Comma-separated vendor counts per RFP (default: 10,1000,100000)',
+        )
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=50000.0,
+            help='RFP budget (default: 50000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+        )
+
+    def handle(self, *args, **options):
+        budget = Decimal(str(options['budget']))
+        for count in [int(value) for value in options['vendors'].split(',') if value.strip()]:
+            self.run_size(count, budget, random.Random(options['seed']))
+
+    def make_rows(self, count, budget, rng):
+        sent_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        rows = []
+        for index in range(count):
+            quoted = rng.random() < 0.8
+            rows.append(SimpleNamespace(
+                sent_email_id=index + 1,
+                sent_at=sent_at,
+                vendor=SimpleNamespace(
+                    is_email_verified=rng.random() < 0.7,
+                    is_phone_verified=rng.random() < 0.5,
+                    is_business_verified=rng.random() < 0.3,
+                    overall_rating=Decimal(f"{rng.uniform(1, 5):.2f}"),
+                    on_time_delivery_rate=Decimal(f"{rng.uniform(50, 100):.2f}"),
+                ),
+                quoted_amount=Decimal(f"{float(budget) * rng.uniform(0.5, 1.5):.2f}") if quoted else None,
+                received_at=sent_at + timedelta(hours=rng.uniform(1, 200)) if quoted else None,
+            ))
+        return rows
+
+    def legacy(self, rows, budget):
+        # Same calls as calculate_score_for_vendor, minus the per-row query
+        results = []
+        for row in rows:
+            price = ScoringService.calculate_price_score(row.quoted_amount, budget)
+            quality = ScoringService.calculate_vendor_quality_score(
+                ScoringService.calculate_verification_score(row.vendor),
+                ScoringService.calculate_rating_score(row.vendor),
+                ScoringService.calculate_delivery_score(row.vendor),
+                ScoringService.calculate_warranty_score(None),
+                ScoringService.calculate_response_score(row.sent_at, row.received_at),
+            )
+            results.append((row.sent_email_id, ScoringService.calculate_final_score(price, quality)))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+    def to_inputs(self, rows):
+        count = len(rows)
+        return scoring_engine.ScoringInputs(
+            sent_email_ids=np.array([row.sent_email_id for row in rows], dtype=np.int64),
+            # Vendor components come precomputed from the quality snapshot
+            verification_score=np.array([
+                float(ScoringService.calculate_verification_score(row.vendor)) for row in rows
+            ]),
+            rating_score=np.array([float(ScoringService.calculate_rating_score(row.vendor)) for row in rows]),
+            delivery_score=np.array([float(ScoringService.calculate_delivery_score(row.vendor)) for row in rows]),
+            quoted_amount=np.array(
+                [float(row.quoted_amount) if row.quoted_amount is not None else np.nan for row in rows]
+            ),
+            response_hours=np.array([
+                (row.received_at - row.sent_at).total_seconds() / 3600 if row.received_at else np.nan
+                for row in rows
+            ]),
+        ) if count else None
+
+    def run_size(self, count, budget, rng):
+        rows = self.make_rows(count, budget, rng)
+        inputs = self.to_inputs(rows)
+
+        started = time.perf_counter()
+        legacy = self.legacy(rows, budget)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scores = scoring_engine.compute_scores(inputs, budget, ScoringService.QUALITY_WEIGHTS)
+        compute_seconds = time.perf_counter() - started
+        decimal_rows = list(scoring_engine.to_decimal_rows(inputs, scores))
+        total_seconds = time.perf_counter() - started
+
+        engine_final = {sent_email_id: values['final_score'] for sent_email_id, values in decimal_rows}
+        mismatches = sum(1 for sent_email_id, final in legacy if engine_final[sent_email_id] != final)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} vendors: per-vendor Decimal {legacy_seconds * 1000:.1f}ms, "
+                f"vectorized {compute_seconds * 1000:.1f}ms "
+                f"({total_seconds * 1000:.1f}ms incl. Decimal conversion), "
+                f"{mismatches} final score mismatches"
+            )
+        )
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.services.quotation_parser import fast_extract_quotation
+
+# (reply text, expected path, expected USD amount or None)
+REGRESSION_CASES = [
+    ("Our price is USD 12,500", "fast_path", Decimal("12500.00")),
+    ("Price: ₹1,00,000", "fast_path", Decimal("1200.00")),
+    ("Rs. 4.5 lakh", "fast_path", Decimal("5400.00")),
+    ("$3k - $4k", "fast_path", Decimal("4000.00")),
+    ("$3-4k", "fast_path", Decimal("4000.00")),
+    ("Rs 2 lakh - 3 lakhs", "fast_path", Decimal("3600.00")),
+    ("5000-8000 USD", "fast_path", Decimal("8000.00")),
+    ("12,500.75 USD", "fast_path", Decimal("12500.75")),
+    ("USD 10 mn", "fast_path", Decimal("10000000.00")),
+    # Decimal commas and European grouping
+    ("EUR 1.234,56", "fast_path", Decimal("1358.02")),
+    ("€ 1.234.567", "fast_path", Decimal("1358023.70")),
+    ("EUR 12,50", "fast_path", Decimal("13.75")),
+    ("$1.234", "conflict", None),
+    # Space grouping
+    ("Prix: € 12 500 HT", "fast_path", Decimal("13750.00")),
+    ("Total 12 500 EUR", "fast_path", Decimal("13750.00")),
+    ("$ 1 234", "fast_path", Decimal("1234.00")),
+    ("€ 12 500,50", "fast_path", Decimal("13750.55")),
+    # Units after the amount, or differing units on a range
+    ("USD 10 m", "conflict", None),
+    ("$100 - 200 units", "conflict", None),
+    ("USD 12.50 per unit", "conflict", None),
+    ("$5/unit", "conflict", None),
+    ("500 USD per month", "conflict", None),
+    ("$3k - 4 lakh", "conflict", None),
+    # Several amounts: the largest is kept as a hint for the LLM
+    ("USD 500 for setup and USD 1,200 for delivery", "conflict", Decimal("1200.00")),
+    ("Thanks, we will revert shortly", "no_candidate", None),
+]
+
+
+class Command(BaseCommand):
+    help = 'Run the quotation fast path over known replies and report any that are read differently'
+
+    def handle(self, *args, **options):
+        failures = 0
+        for text, path, amount in REGRESSION_CASES:
+            extraction = fast_extract_quotation(text)
+            if extraction.path == path and extraction.amount == amount:
+                continue
+            failures += 1
+            self.stdout.write(
+                f"{text!r}: expected {path} {amount}, got {extraction.path} {extraction.amount}"
+            )
+
+        if failures:
+            raise CommandError(f"{failures} of {len(REGRESSION_CASES)} cases failed")
+        self.stdout.write(self.style.SUCCESS(f"{len(REGRESSION_CASES)} cases passed"))
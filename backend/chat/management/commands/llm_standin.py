@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.services.llm_standin import LATENCY_DISTRIBUTIONS, StandInConfig, make_server
+
+
+class Command(BaseCommand):
+    help = 'Run a local stand-in for the Mistral and HuggingFace APIs (offline tests and benchmarks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=0.0,
+            help='Mean response latency in ms (median for lognormal)',
+        )
+        parser.add_argument(
+            '--latency-jitter-ms',
+            type=float,
+            default=0.0,
+            help='Spread: half-width (uniform), std dev (normal), log-space sigma x 1000 (lognormal)',
+        )
+        parser.add_argument(
+            '--latency-distribution',
+            choices=LATENCY_DISTRIBUTIONS,
+            default='fixed',
+        )
+        parser.add_argument(
+            '--stream-chunk-chars',
+            type=int,
+            default=8,
+            help='Characters per streamed chunk (default: 8)',
+        )
+        parser.add_argument(
+            '--stream-chunk-delay-ms',
+            type=float,
+            default=0.0,
+            help='Delay between streamed chunks in ms',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with 429/500/503 (0-1)',
+        )
+        parser.add_argument(
+            '--malformed-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of responses with broken JSON (0-1)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed for reproducible latency, errors and malformed responses',
+        )
+        parser.add_argument(
+            '--script',
+            help='JSON file with [{"match": "<regex>", "response": "<text or object>"}] rules, tried before the built-in rules',
+        )
+
+    def handle(self, *args, **options):
+        script = []
+        if options['script']:
+            try:
+                with open(options['script']) as f:
+                    script = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not load script {options["script"]}: {e}')
+
+        config = StandInConfig(
+            latency_ms=options['latency_ms'],
+            latency_jitter_ms=options['latency_jitter_ms'],
+            latency_distribution=options['latency_distribution'],
+            stream_chunk_chars=options['stream_chunk_chars'],
+            stream_chunk_delay_ms=options['stream_chunk_delay_ms'],
+            error_rate=options['error_rate'],
+            malformed_rate=options['malformed_rate'],
+            seed=options['seed'],
+            script=script,
+        )
+
+        server = make_server(options['host'], options['port'], config)
+        url = f'http://{options["host"]}:{options["port"]}'
+
+        self.stdout.write(self.style.SUCCESS(f'LLM stand-in listening on {url}'))
+        self.stdout.write(f'Set MISTRAL_SERVER_URL={url} and HF_INFERENCE_URL={url} to use it')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('LLM stand-in stopped'))
+        finally:
+            server.server_close()
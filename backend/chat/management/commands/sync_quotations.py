@@ -1,17 +1,53 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from email.utils import parsedate_to_datetime
+from email.utils import parsedate_to_datetime, parseaddr
+from collections import Counter, defaultdict
 import time
 from decimal import Decimal, InvalidOperation
-from chat.models import SentEmail, VendorQuotation
+from django.db.models import Min, Q
+from chat.models import EmailTemplate, SentEmail, VendorQuotation
 from gmail_service.services.gmail import GmailService, GmailAccount
 from gmail_service.models import EmailThread, EmailMessage
-from chat.services.llm import extract_quotation_info
+from chat.services import extraction_cache, incremental_scoring
+from chat.services.llm import (
+    QUOTATION_EXTRACTOR_VERSION,
+    extract_quotations,
+    quotation_content_hash,
+)
+
+
+def settled_hash(extraction, content_hash):
+    """
+    Content hash to record for an extraction attempt. An unresolved
+    conflict (the LLM returned nothing) and a failed LLM call record none,
+    so the next sync tries them again instead of treating them as extracted.
+    """
+    if extraction.path == 'llm_error':
+        return ''
+    if extraction.path == 'conflict' and extraction.amount is None:
+        return ''
+    return content_hash
+
 
 class Command(BaseCommand):
     help = 'Continuously sync vendor replies/quotations for sent emails'
 
+    # Gmail search strings are chunked to stay well under the API query size limit
+    DISCOVERY_QUERY_MAX_CHARS = 1500
+    # Overlap each discovery window with the previous one so clock skew can't drop replies
+    DISCOVERY_OVERLAP_SECONDS = 3600
+    # Pending extractions are flushed once this many LLM batches' worth has queued up
+    EXTRACTION_FLUSH_BATCHES = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reextract = False
+        self.extraction_paths = Counter()
+        self.pending_extractions = []
+        self.failed_extractions = 0
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--once',
@@ -34,6 +70,16 @@ class Command(BaseCommand):
             type=str,
             help='Sync only quotations for a specific user email',
         )
+        parser.add_argument(
+            '--reextract',
+            action='store_true',
+            help='Re-run extraction on empty quotations even if their content was already tried',
+        )
+        parser.add_argument(
+            '--discover',
+            action='store_true',
+            help='Find replies with one mailbox search per account instead of reading every thread',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(
@@ -42,11 +88,13 @@ class Command(BaseCommand):
 
         if options['once']:
             self.sync_vendor_replies(options)
+            self.flush_rescoring()
         else:
             # Continuous sync
             while True:
                 try:
                     self.sync_vendor_replies(options)
+                    self.flush_rescoring()
                     time.sleep(options['interval'])
                 except KeyboardInterrupt:
                     self.stdout.write(
@@ -59,14 +107,27 @@ class Command(BaseCommand):
                     )
                     time.sleep(60) 
 
+    def flush_rescoring(self):
+        """Rescore what this pass changed now; a --once run exits before the debounce timer fires"""
+        try:
+            rescored = incremental_scoring.flush()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rescoring vendors: {e}'))
+            return
+        if rescored:
+            self.stdout.write(f'Rescored {rescored} vendor scores')
+
     def sync_vendor_replies(self, options=None):
-        """Sync replies for all sent emails that have thread_ids"""
+        """Sync replies for sent emails whose RFP is still accepting quotes"""
+
+        self.ensure_response_deadlines()
         
-        # Get all successfully sent emails with thread_ids that we haven't fully synced
+        # Only sent emails with thread_ids whose template is neither closed nor past its deadline
         sent_emails = SentEmail.objects.filter(
+            EmailTemplate.accepting_quotes_q(prefix='template__'),
             status='sent',
             thread_id__isnull=False
-        ).exclude(thread_id='')
+        ).exclude(thread_id='').select_related('sender', 'template')
         
         # Filter by template if specified
         if options and options.get('template_id'):
@@ -85,16 +146,227 @@ class Command(BaseCommand):
 
         self.stdout.write(f'Found {sent_emails.count()} sent emails to sync')
 
+        self.reextract = bool(options and options.get('reextract'))
+        self.extraction_paths = Counter()
+        self.pending_extractions = []
+        self.failed_extractions = 0
+
+        try:
+            if options and options.get('discover'):
+                # The watermark is only safe to advance when every open sent email was searched
+                self.discover_vendor_replies(
+                    sent_emails,
+                    advance_watermark=not options.get('template_id')
+                )
+            else:
+                for sent_email in sent_emails:
+                    try:
+                        self.sync_single_email_thread(sent_email)
+                    except Exception as e:
+                        self.stdout.write(
+                            self.style.ERROR(
+                                f'Error syncing thread for {sent_email.vendor_name_at_time}: {e}'
+                            )
+                        )
+        finally:
+            self.flush_extractions()
+
+        if self.extraction_paths:
+            summary = ', '.join(f'{path}={count}' for path, count in sorted(self.extraction_paths.items()))
+            self.stdout.write(f'Extraction paths this pass: {summary}')
+            if self.extraction_paths['llm_error']:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'{self.extraction_paths["llm_error"]} extraction(s) failed on LLM errors '
+                        f'and will be retried next pass'
+                    )
+                )
+            cache_stats = extraction_cache.stats()
+            self.stdout.write(
+                f'Extraction cache: {cache_stats["local_hits"]} local hit(s), '
+                f'{cache_stats["persistent_hits"]} persistent hit(s), {cache_stats["misses"]} miss(es)'
+            )
+
+        extraction_cache.prune()
+
+    def queue_extraction(self, email_content, on_result):
+        """
+        Defer extraction so replies that need the LLM share batched calls.
+        on_result(extraction) runs when the queue is flushed.
+        """
+        self.pending_extractions.append((email_content, on_result))
+
+        flush_size = max(1, settings.QUOTATION_BATCH_SIZE) * self.EXTRACTION_FLUSH_BATCHES
+        if len(self.pending_extractions) >= flush_size:
+            self.flush_extractions()
+
+    def flush_extractions(self):
+        """Extract every queued reply (fast path first, batched LLM fallback) and store the results"""
+        pending, self.pending_extractions = self.pending_extractions, []
+        if not pending:
+            return
+
+        extractions = extract_quotations({
+            str(index): email_content for index, (email_content, _) in enumerate(pending)
+        })
+
+        for index, (_, on_result) in enumerate(pending):
+            extraction = extractions[str(index)]
+            self.extraction_paths[extraction.path] += 1
+            try:
+                on_result(extraction)
+            except Exception as e:
+                self.failed_extractions += 1
+                self.stdout.write(
+                    self.style.ERROR(f'Failed to store extracted quotation: {e}')
+                )
+
+    def ensure_response_deadlines(self):
+        """Give templates sent before response windows existed a deadline from their first send"""
+        templates = EmailTemplate.objects.filter(
+            response_deadline__isnull=True,
+            sent_emails__status='sent'
+        ).select_related('session').annotate(first_sent_at=Min('sent_emails__sent_at'))
+
+        for template in templates:
+            template.open_response_window(started_at=template.first_sent_at)
+
+    def discover_vendor_replies(self, sent_emails, advance_watermark=True):
+        """
+        Mailbox-wide discovery: one messages.list search per account for mail from
+        any vendor with an open RFP. Cost scales with new replies, not open threads,
+        and replies sent in a new thread are found too.
+        """
+        by_account = defaultdict(list)
         for sent_email in sent_emails:
+            by_account[sent_email.sender_id].append(sent_email)
+
+        for open_sent_emails in by_account.values():
+            gmail_account = open_sent_emails[0].sender
             try:
-                self.sync_single_email_thread(sent_email)
+                self.discover_account_replies(gmail_account, open_sent_emails, advance_watermark)
             except Exception as e:
                 self.stdout.write(
                     self.style.ERROR(
-                        f'Error syncing thread for {sent_email.vendor_name_at_time}: {e}'
+                        f'Failed to discover replies for {gmail_account.email}: {e}'
                     )
                 )
 
+    def discover_account_replies(self, gmail_account, open_sent_emails, advance_watermark=True):
+        started_at = timezone.now()
+        service = GmailService.get_service(gmail_account)
+
+        # vendor email -> open sent emails, newest first
+        vendor_index = defaultdict(list)
+        for sent_email in sorted(open_sent_emails, key=lambda s: s.sent_at, reverse=True):
+            vendor_index[sent_email.vendor_email_at_time.lower()].append(sent_email)
+
+        since = gmail_account.replies_synced_at or min(s.sent_at for s in open_sent_emails)
+        after = int(since.timestamp()) - self.DISCOVERY_OVERLAP_SECONDS
+
+        hits = {}
+        for query in self.build_discovery_queries(vendor_index.keys(), after):
+            for hit in GmailService.list_message_ids(gmail_account, query, service=service):
+                hits[hit['id']] = hit
+
+        # Only fetch messages we haven't already turned into quotations; empty
+        # ones are fetched again so process_inbound_message can retry them
+        quoted_ids = set(
+            VendorQuotation.objects.filter(
+                email_message__message_id__in=hits.keys()
+            ).exclude(
+                (Q(quoted_amount__isnull=True) | Q(quoted_amount=0))
+                & (Q(currency__isnull=True) | Q(currency=''))
+            ).values_list('email_message__message_id', flat=True)
+        )
+
+        self.stdout.write(
+            f'Discovery for {gmail_account.email}: {len(hits)} hit(s), {len(hits) - len(quoted_ids)} to fetch'
+        )
+
+        new_quotations = 0
+
+        for message_id in hits:
+            if message_id in quoted_ids:
+                continue
+
+            msg = GmailService.get_message(gmail_account, message_id, service=service)
+            if msg['direction'] != 'INBOUND':
+                continue
+
+            sent_email = self.match_sent_email(vendor_index, msg)
+            if not sent_email:
+                continue
+
+            thread, _ = EmailThread.objects.get_or_create(
+                gmail_account=gmail_account,
+                thread_id=msg['thread_id'],
+                defaults={'recipient_email': sent_email.vendor_email_at_time}
+            )
+
+            new_quotations += self.process_inbound_message(sent_email, thread, msg)
+
+        # Store this account's replies before the watermark moves past them; if
+        # extraction raises or a quotation fails to save, the next pass finds them again
+        failed = self.failed_extractions
+        self.flush_extractions()
+
+        if advance_watermark and self.failed_extractions == failed:
+            gmail_account.replies_synced_at = started_at
+            gmail_account.save(update_fields=['replies_synced_at'])
+
+        if new_quotations > 0:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Queued {new_quotations} quotation(s) for {gmail_account.email} for extraction'
+                )
+            )
+
+    def build_discovery_queries(self, vendor_emails, after):
+        """Chunk 'from:(a OR b ...) after:<epoch>' searches by query length"""
+        suffix = f') after:{after}'
+        base_length = len('from:(') + len(suffix)
+
+        queries = []
+        chunk = []
+        length = base_length
+
+        for email in sorted(vendor_emails):
+            added = len(email) + (len(' OR ') if chunk else 0)
+            if chunk and length + added > self.DISCOVERY_QUERY_MAX_CHARS:
+                queries.append('from:(' + ' OR '.join(chunk) + suffix)
+                chunk = []
+                length = base_length
+                added = len(email)
+            chunk.append(email)
+            length += added
+
+        if chunk:
+            queries.append('from:(' + ' OR '.join(chunk) + suffix)
+
+        return queries
+
+    def match_sent_email(self, vendor_index, msg):
+        """
+        Same thread wins; otherwise attribute the reply to the latest RFP
+        sent to that vendor before the reply arrived.
+        """
+        from_email = parseaddr(msg.get('from', ''))[1].lower()
+        candidates = vendor_index.get(from_email)
+        if not candidates:
+            return None
+
+        for sent_email in candidates:
+            if sent_email.thread_id and sent_email.thread_id == msg.get('thread_id'):
+                return sent_email
+
+        received_at = parse_datetime(msg['timestamp']) if isinstance(msg.get('timestamp'), str) else None
+        for sent_email in candidates:
+            if received_at is None or sent_email.sent_at <= received_at:
+                return sent_email
+
+        return candidates[-1]
+
     def sync_single_email_thread(self, sent_email):
         """Sync a single email thread for replies"""
         
@@ -124,144 +396,174 @@ class Command(BaseCommand):
             new_quotations = 0
 
             for msg in inbound_messages:
-                self.stdout.write(f'Processing inbound message: {msg.get("message_id", "unknown")}')
-                
-                # Create EmailMessage record first
-                email_message, created = EmailMessage.objects.get_or_create(
-                    message_id=msg['message_id'],
-                    defaults={
-                        'thread': thread,
-                        'direction': msg['direction'],
-                        'timestamp': timezone.now(),
-                        'template_id': sent_email.template.id,
-                    }
+                new_quotations += self.process_inbound_message(sent_email, thread, msg)
+
+            if new_quotations > 0:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Queued {new_quotations} quotation(s) from {sent_email.vendor_name_at_time} for extraction'
+                    )
                 )
 
-                # Check if we already have a quotation for this email message
-                existing_quotation = VendorQuotation.objects.filter(email_message=email_message).first()
-                
-                if existing_quotation:
-                    # If quotation exists but is empty (no amount/currency), try to update it
-                    if not existing_quotation.quoted_amount and not existing_quotation.currency:
-                        # email_content = msg.get('body', '').strip() or msg.get('subject', '').strip()
-                        email_content = msg.get('body', '').strip()
-                        
-                        if email_content:
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(
+                    f'Failed to sync thread {thread_id}: {e}'
+                )
+            )
+
+    def process_inbound_message(self, sent_email, thread, msg):
+        """
+        Store one inbound message and queue its quotation for extraction.
+        Returns 1 if a quotation will be added or filled in.
+        """
+
+        self.stdout.write(f'Processing inbound message: {msg.get("message_id", "unknown")}')
+
+        # Create EmailMessage record first
+        email_message, created = EmailMessage.objects.get_or_create(
+            message_id=msg['message_id'],
+            defaults={
+                'thread': thread,
+                'direction': msg['direction'],
+                'timestamp': timezone.now(),
+                'template_id': sent_email.template.id,
+            }
+        )
+
+        # Check if we already have a quotation for this email message
+        existing_quotation = VendorQuotation.objects.filter(email_message=email_message).first()
+
+        if existing_quotation:
+            # If quotation exists but is empty (no amount/currency), try to update it
+            if not existing_quotation.quoted_amount and not existing_quotation.currency:
+                # email_content = msg.get('body', '').strip() or msg.get('subject', '').strip()
+                email_content = msg.get('body', '').strip()
+
+                content_hash = quotation_content_hash(email_content)
+
+                if email_content and not self.reextract and not existing_quotation.needs_extraction(
+                    content_hash, QUOTATION_EXTRACTOR_VERSION
+                ):
+                    self.stdout.write(
+                        f'Quotation {existing_quotation.id} unchanged since last extraction, skipping'
+                    )
+                elif email_content:
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f'Updating empty quotation {existing_quotation.id} with new content'
+                        )
+                    )
+
+                    def update_quotation(extraction, quotation=existing_quotation):
+                        quoted_amount, currency = extraction.amount, extraction.currency
+
+                        # Update the existing empty quotation
+                        quotation.subject = msg.get('subject', '')
+                        quotation.body = msg.get('body', '')
+                        quotation.quoted_amount = quoted_amount
+                        quotation.currency = currency
+                        quotation.extraction_confidence = extraction.confidence
+                        quotation.extraction_path = extraction.path
+                        quotation.extraction_hash = settled_hash(extraction, content_hash)
+                        quotation.extractor_version = QUOTATION_EXTRACTOR_VERSION
+                        quotation.extracted_at = timezone.now()
+                        quotation.save()
+
+                        # Log extraction results
+                        if quoted_amount and currency:
                             self.stdout.write(
-                                self.style.WARNING(
-                                    f'Updating empty quotation {existing_quotation.id} with new content'
+                                self.style.SUCCESS(
+                                    f'Updated quotation {quotation.id}: {quoted_amount} {currency} ({extraction.path})'
                                 )
                             )
-                            
-                            # Parse quotation amount from email body using centralized LLM service
-                            
-                            quoted_amount, currency = extract_quotation_info(email_content)
-                            
-                            # Update the existing empty quotation
-                            existing_quotation.subject = msg.get('subject', '')
-                            existing_quotation.body = msg.get('body', '')
-                            existing_quotation.quoted_amount = quoted_amount
-                            existing_quotation.currency = currency
-                            existing_quotation.save()
-                            
-                            # Log LLM extraction results
-                            if quoted_amount and currency:
-                                self.stdout.write(
-                                    self.style.SUCCESS(
-                                        f'Updated quotation {existing_quotation.id}: {quoted_amount} {currency}'
-                                    )
-                                )
-                                new_quotations += 1
-                            else:
-                                self.stdout.write(
-                                    self.style.WARNING(
-                                        f'LLM found no quotation in updated message'
-                                    )
-                                )
                         else:
                             self.stdout.write(
                                 self.style.WARNING(
-                                    f'Quotation {existing_quotation.id} still has no content to process'
+                                    f'No quotation found in updated message'
                                 )
                             )
-                    else:
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Quotation already exists and has data: {existing_quotation.quoted_amount} {existing_quotation.currency}'
-                            )
-                        )
-                    continue
 
-                # Parse timestamp
-                try:
-                    if isinstance(msg["timestamp"], str):
-                        timestamp_obj = parse_datetime(msg["timestamp"])
-                        if timestamp_obj is None:
-                            timestamp_obj = parsedate_to_datetime(msg["timestamp"])
-                    else:
-                        timestamp_obj = msg["timestamp"]
-                    
-                    if timestamp_obj.tzinfo is None:
-                        timestamp_obj = timezone.make_aware(timestamp_obj)
-                except Exception:
-                    timestamp_obj = timezone.now()
-
-                # Update the EmailMessage timestamp if it was just created
-                if created:
-                    email_message.timestamp = timestamp_obj
-                    email_message.save()
-
-                # Check if there's actual email content to process
-                email_content = msg.get('body', '').strip() or msg.get('subject', '').strip()
-                
-                if not email_content:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'Skipping message {msg.get("message_id", "unknown")} - no content to process'
-                        )
-                    )
-                    continue
-
-                # Parse quotation amount from email body using centralized LLM service
-                
-                quoted_amount, currency = extract_quotation_info(email_content)
-                
-                # Log LLM extraction results
-                if quoted_amount and currency:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'LLM extracted: {quoted_amount} {currency} from message {msg.get("message_id", "unknown")}'
-                        )
-                    )
+                    self.queue_extraction(email_content, update_quotation)
+                    return 1
                 else:
                     self.stdout.write(
                         self.style.WARNING(
-                            f'LLM found no quotation in message {msg.get("message_id", "unknown")}'
+                            f'Quotation {existing_quotation.id} still has no content to process'
                         )
                     )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Quotation already exists and has data: {existing_quotation.quoted_amount} {existing_quotation.currency}'
+                    )
+                )
+            return 0
+
+        # Parse timestamp
+        try:
+            if isinstance(msg["timestamp"], str):
+                timestamp_obj = parse_datetime(msg["timestamp"])
+                if timestamp_obj is None:
+                    timestamp_obj = parsedate_to_datetime(msg["timestamp"])
+            else:
+                timestamp_obj = msg["timestamp"]
+
+            if timestamp_obj.tzinfo is None:
+                timestamp_obj = timezone.make_aware(timestamp_obj)
+        except Exception:
+            timestamp_obj = timezone.now()
+
+        # Update the EmailMessage timestamp if it was just created
+        if created:
+            email_message.timestamp = timestamp_obj
+            email_message.save()
 
-                # Create VendorQuotation record
-                VendorQuotation.objects.create(
-                    sent_email=sent_email,
-                    email_message=email_message,
-                    subject=msg.get('subject', ''),
-                    body=msg.get('body', ''),
-                    quoted_amount=quoted_amount,
-                    currency=currency,
+        # Check if there's actual email content to process
+        email_content = msg.get('body', '').strip() or msg.get('subject', '').strip()
+
+        if not email_content:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Skipping message {msg.get("message_id", "unknown")} - no content to process'
                 )
+            )
+            return 0
 
-                new_quotations += 1
+        def create_quotation(extraction):
+            quoted_amount, currency = extraction.amount, extraction.currency
 
-            if new_quotations > 0:
+            # Log extraction results
+            if quoted_amount and currency:
                 self.stdout.write(
                     self.style.SUCCESS(
-                        f'Added {new_quotations} new quotation(s) from {sent_email.vendor_name_at_time}'
+                        f'Extracted ({extraction.path}, confidence {extraction.confidence}): '
+                        f'{quoted_amount} {currency} from message {msg.get("message_id", "unknown")}'
                     )
                 )
-
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(
-                    f'Failed to sync thread {thread_id}: {e}'
+            else:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'No quotation found in message {msg.get("message_id", "unknown")}'
+                    )
                 )
+
+            # Create VendorQuotation record
+            VendorQuotation.objects.create(
+                sent_email=sent_email,
+                email_message=email_message,
+                subject=msg.get('subject', ''),
+                body=msg.get('body', ''),
+                quoted_amount=quoted_amount,
+                currency=currency,
+                extraction_confidence=extraction.confidence,
+                extraction_path=extraction.path,
+                extraction_hash=settled_hash(extraction, quotation_content_hash(email_content)),
+                extractor_version=QUOTATION_EXTRACTOR_VERSION,
+                extracted_at=timezone.now(),
             )
+
+        # Parse quotation amount with the rest of this pass (deterministic fast path, batched LLM fallback)
+        self.queue_extraction(email_content, create_quotation)
+
+        return 1
@@ -1,4 +1,8 @@
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from gmail_service.models import GmailAccount
 from vendors.models import Vendor
 
@@ -11,6 +15,8 @@ class ChatSession(models.Model):
 
     title = models.CharField(max_length=255, default="New Chat") 
     draft_json = models.JSONField(default=dict)
+    # Bumped on every draft write; turn commits use it as an optimistic lock
+    draft_version = models.PositiveIntegerField(default=0)
 
     is_closed = models.BooleanField(default=False)   
     is_submitted = models.BooleanField(default=False)   
@@ -35,6 +41,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ["created_at"] 
+        indexes = [
+            models.Index(fields=["session", "created_at", "id"], name="chatmessage_session_order_idx"),
+        ]
 
     def __str__(self):
         return f"{self.role}: {self.content[:40]}"
@@ -54,10 +63,97 @@ class EmailTemplate(models.Model):
     generated_at = models.DateTimeField(auto_now_add=True)
     is_sent = models.BooleanField(default=False)
     sent_at = models.DateTimeField(null=True, blank=True)
+
+    # Quote collection lifecycle - replies are only synced while the RFP is open
+    response_window_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Days vendors have to reply. Falls back to deadline_days in the RFP draft."
+    )
+    response_deadline = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Vendor replies are no longer synced after this time"
+    )
+    is_closed_for_quotes = models.BooleanField(
+        default=False,
+        help_text="Explicitly closed: vendor replies are no longer synced"
+    )
+    closed_for_quotes_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_closed_for_quotes', 'response_deadline'], name='template_quote_window_idx'),
+        ]
     
     def __str__(self):
         return f"Email Template for Session {self.session.id}: {self.subject[:50]}"
 
+    @staticmethod
+    def accepting_quotes_q(prefix=''):
+        """
+        Q filter for templates whose response window is still open.
+        Use prefix='template__' when filtering related models (e.g. SentEmail).
+        """
+        now = timezone.now()
+        return Q(**{f'{prefix}is_closed_for_quotes': False}) & (
+            Q(**{f'{prefix}response_deadline__isnull': True}) |
+            Q(**{f'{prefix}response_deadline__gte': now})
+        )
+
+    def get_response_window_days(self):
+        """
+        Explicit window if set, else deadline_days from the RFP draft, else the default.
+        """
+        if self.response_window_days:
+            return self.response_window_days
+
+        deadline_days = (self.session.draft_json or {}).get('deadline_days')
+        try:
+            deadline_days = int(deadline_days)
+            if deadline_days > 0:
+                return deadline_days
+        except (TypeError, ValueError):
+            pass
+
+        return settings.RFP_DEFAULT_RESPONSE_WINDOW_DAYS
+
+    def open_response_window(self, started_at=None):
+        """
+        Mark the template as sent and fix its response deadline (first send only).
+        """
+        if self.response_deadline:
+            return
+
+        started_at = started_at or timezone.now()
+        self.is_sent = True
+        self.sent_at = self.sent_at or started_at
+        self.response_deadline = self.sent_at + timedelta(days=self.get_response_window_days())
+        self.save(update_fields=['is_sent', 'sent_at', 'response_deadline'])
+
+    def close_for_quotes(self):
+        self.is_closed_for_quotes = True
+        self.closed_for_quotes_at = timezone.now()
+        self.save(update_fields=['is_closed_for_quotes', 'closed_for_quotes_at'])
+
+    def reopen_for_quotes(self, window_days=None):
+        """
+        Reopen quote collection, optionally with a new window starting now.
+        A deadline that has already passed is always moved forward (by the
+        template's usual window when window_days is not given), otherwise
+        the sync would keep skipping the template.
+        """
+        self.is_closed_for_quotes = False
+        self.closed_for_quotes_at = None
+        if window_days:
+            self.response_window_days = window_days
+            self.response_deadline = timezone.now() + timedelta(days=window_days)
+        elif self.response_deadline and self.response_deadline < timezone.now():
+            self.response_deadline = timezone.now() + timedelta(days=self.get_response_window_days())
+        self.save(update_fields=[
+            'is_closed_for_quotes', 'closed_for_quotes_at', 'response_window_days', 'response_deadline'
+        ])
+
 
 class SentEmail(models.Model):
     """
@@ -87,6 +183,9 @@ class SentEmail(models.Model):
     class Meta:
         unique_together = ('template', 'vendor')
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['status', 'template'], name='sentemail_status_template_idx'),
+        ]
     
     def __str__(self):
         return f"Email: {self.template.subject[:30]} -> {self.vendor_name_at_time} ({self.status})"
@@ -108,6 +207,11 @@ class VendorQuotation(models.Model):
     body = models.TextField(blank=True)
     quoted_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, help_text="Extracted quotation amount")
     currency = models.CharField(max_length=10, null=True, blank=True, help_text="Currency code (USD, EUR, etc.)")
+    extraction_hash = models.CharField(max_length=64, blank=True, default='', help_text="Hash of the content last sent to the extractor")
+    extractor_version = models.CharField(max_length=20, blank=True, default='', help_text="Extractor version used for the last attempt")
+    extracted_at = models.DateTimeField(null=True, blank=True, help_text="When extraction was last attempted")
+    extraction_confidence = models.FloatField(null=True, blank=True, help_text="Extractor confidence (0-1)")
+    extraction_path = models.CharField(max_length=20, blank=True, default='', help_text="fast_path, llm, llm_cache, conflict, no_candidate or llm_error")
     is_reviewed = models.BooleanField(default=False)
     notes = models.TextField(null=True, blank=True, help_text="Admin notes about this quotation")
     parsed_at = models.DateTimeField(auto_now_add=True)
@@ -122,6 +226,41 @@ class VendorQuotation(models.Model):
     def received_at(self):
         return self.email_message.timestamp
 
+    def needs_extraction(self, content_hash, extractor_version):
+        """
+        True unless this exact content was already tried with this extractor.
+        """
+        return (
+            self.extraction_hash != content_hash
+            or self.extractor_version != extractor_version
+        )
+
+
+class CachedQuotationExtraction(models.Model):
+    """
+    Persistent tier of the LLM quotation extraction cache.
+    Keyed by normalized text hash + prompt version + model; "no quotation"
+    results are cached too so identical bodies never reach the model twice.
+    """
+    text_hash = models.CharField(max_length=64)
+    prompt_version = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    quoted_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=10, null=True, blank=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('text_hash', 'prompt_version', 'model')
+        indexes = [
+            models.Index(fields=['last_used_at'], name='quote_cache_lru_idx'),
+        ]
+
+    def __str__(self):
+        return f"Cached extraction {self.text_hash[:12]} ({self.model}): {self.quoted_amount} {self.currency}"
+
 
 class VendorScore(models.Model):
     """
@@ -134,6 +273,16 @@ class VendorScore(models.Model):
         related_name='vendor_score',
         help_text="Links to sent email (unique combination of template + vendor)"
     )
+    # Copy of sent_email.template so per-template ranking and top-K reads
+    # can use the (template, final_score) index without a join
+    template = models.ForeignKey(
+        EmailTemplate,
+        on_delete=models.CASCADE,
+        related_name='vendor_scores',
+        null=True,
+        blank=True,
+        editable=False,
+    )
     
     # Individual component scores (0-100)
     price_score = models.DecimalField(
@@ -199,6 +348,9 @@ class VendorScore(models.Model):
     
     class Meta:
         ordering = ['rank', '-final_score']
+        indexes = [
+            models.Index(fields=['template', '-final_score'], name='vendorscore_template_score_idx'),
+        ]
     
     def __str__(self):
         return f"Score for {self.sent_email.vendor_name_at_time} - Template {self.sent_email.template.id}: {self.final_score}/100"
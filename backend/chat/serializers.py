@@ -21,6 +21,31 @@ class ChatRequestSerializer(serializers.Serializer):
         required=False,
         help_text="Required for 'message' action. The user's message content."
     )
+    stream = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Optional for 'message' action. Stream assistant_reply deltas over the chat WebSocket."
+    )
+    mode = serializers.ChoiceField(
+        choices=['sync', 'async'],
+        required=False,
+        help_text="Optional for 'message' action. 'async' returns 202 with a turn_id and delivers the reply over the chat WebSocket."
+    )
+    since = serializers.CharField(
+        required=False,
+        help_text="Optional for 'history' action. Only messages after this cursor."
+    )
+    before = serializers.CharField(
+        required=False,
+        help_text="Optional for 'history' action. Only messages before this cursor."
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=500,
+        help_text="Optional for 'history' action. Page size."
+    )
     subject = serializers.CharField(
         required=False,
         help_text="Required for 'confirm' action. Email subject."
@@ -70,6 +95,17 @@ class ChatMessageSerializer(serializers.Serializer):
     message = serializers.CharField(
         help_text="The user's message content"
     )
+    stream = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        default=None,
+        help_text="Stream the assistant reply over the chat WebSocket while it is generated (defaults to CHAT_STREAMING)"
+    )
+    mode = serializers.ChoiceField(
+        choices=['sync', 'async'],
+        required=False,
+        help_text="'async' returns 202 with a turn_id right away; the reply is pushed over the chat WebSocket (defaults to CHAT_ASYNC_TURNS)"
+    )
 
 
 class ChatHistorySerializer(serializers.Serializer):
@@ -77,6 +113,25 @@ class ChatHistorySerializer(serializers.Serializer):
     session_id = serializers.IntegerField(
         help_text="The ID of the chat session to get history for"
     )
+    since = serializers.CharField(
+        required=False,
+        help_text="Only return messages after this cursor (since_cursor from an earlier response)"
+    )
+    before = serializers.CharField(
+        required=False,
+        help_text="Only return messages before this cursor (before_cursor from an earlier response)"
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=500,
+        help_text="Page size (default CHAT_HISTORY_PAGE_SIZE with a cursor; without limit and cursors the whole history is returned)"
+    )
+
+    def validate(self, attrs):
+        if attrs.get('since') and attrs.get('before'):
+            raise serializers.ValidationError("Use either 'since' or 'before', not both")
+        return attrs
 
 
 class SubmitChatSerializer(serializers.Serializer):
@@ -102,12 +157,25 @@ class ChatMessageResponseSerializer(serializers.Serializer):
     provider = serializers.CharField()
 
 
+class ChatTurnQueuedResponseSerializer(serializers.Serializer):
+    """Response when a message is sent in async mode"""
+    turn_id = serializers.IntegerField()
+    session_id = serializers.IntegerField()
+    status = serializers.CharField()
+
+
 class ChatHistoryResponseSerializer(serializers.Serializer):
     """Response when getting chat history"""
     session_id = serializers.IntegerField()
     title = serializers.CharField()
     messages = serializers.ListField()
+    has_more_before = serializers.BooleanField(allow_null=True)
+    has_more_after = serializers.BooleanField()
+    before_cursor = serializers.CharField(allow_null=True)
+    since_cursor = serializers.CharField(allow_null=True)
+    last_message_id = serializers.IntegerField(allow_null=True)
     draft_json = serializers.JSONField()
+    draft_version = serializers.IntegerField()
     is_closed = serializers.BooleanField()
     is_submitted = serializers.BooleanField()
     created_at = serializers.CharField()
@@ -141,7 +209,9 @@ class VendorSerializer(serializers.Serializer):
 class VendorSelectionResponseSerializer(serializers.Serializer):
     """Response for vendor selection"""
     vendors = VendorSerializer(many=True)
-    total = serializers.IntegerField()
+    total = serializers.IntegerField(help_text="Vendors matching the filters, across all pages")
+    next_cursor = serializers.CharField(allow_null=True, help_text="Pass as cursor to get the next page")
+    has_more = serializers.BooleanField()
 
 
 class SendTemplateEmailSerializer(serializers.Serializer):
@@ -178,3 +248,63 @@ class SendTemplateEmailResponseSerializer(serializers.Serializer):
     message_id = serializers.CharField(required=False)
     thread_id = serializers.CharField(required=False)
     error = serializers.CharField(required=False)
+
+
+class WhatIfWeightsSerializer(serializers.Serializer):
+    """One weighting for what-if scoring; omitted weights keep their current value"""
+    label = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    price = serializers.FloatField(
+        required=False, min_value=0, max_value=1,
+        help_text="Share of the final score given to price (0-1); quality gets the rest"
+    )
+    verification = serializers.FloatField(required=False, min_value=0)
+    rating = serializers.FloatField(required=False, min_value=0)
+    delivery = serializers.FloatField(required=False, min_value=0)
+    warranty = serializers.FloatField(required=False, min_value=0)
+    response = serializers.FloatField(required=False, min_value=0)
+
+    def validate(self, data):
+        quality_keys = ('verification', 'rating', 'delivery', 'warranty', 'response')
+        if all(key in data for key in quality_keys) and not any(data[key] for key in quality_keys):
+            raise serializers.ValidationError("At least one quality weight must be positive")
+        return data
+
+
+class SyncQuotationsSerializer(serializers.Serializer):
+    """Request for a manual quotation sync"""
+    template_id = serializers.IntegerField()
+    user_email = serializers.EmailField()
+    reextract = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Retry extraction on empty quotations even if unchanged"
+    )
+
+
+class QuotationWindowSerializer(serializers.Serializer):
+    """Request for closing or reopening quote collection"""
+    template_id = serializers.IntegerField()
+    user_email = serializers.EmailField()
+    closed = serializers.BooleanField(required=False, default=True)
+    response_window_days = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text="New window when reopening"
+    )
+
+
+class WhatIfScoringSerializer(serializers.Serializer):
+    """Request for ranking a scored template under custom weights"""
+    template_id = serializers.IntegerField()
+    user_email = serializers.EmailField()
+    weights = WhatIfWeightsSerializer(required=False, help_text="A single weighting")
+    weight_sets = WhatIfWeightsSerializer(
+        many=True, required=False, max_length=20,
+        help_text="Several weightings compared in one call"
+    )
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=1000)
+
+    def validate(self, data):
+        if 'weights' in data and 'weight_sets' in data:
+            raise serializers.ValidationError("Send either weights or weight_sets, not both")
+        if 'weights' not in data and not data.get('weight_sets'):
+            raise serializers.ValidationError("weights or weight_sets is required")
+        return data
@@ -0,0 +1,200 @@
+"""
+Background WebSocket broadcaster.
+
+Sync code (views, chat workers) used to call
+async_to_sync(channel_layer.group_send) for every event, bridging into an
+event loop from the request thread each time. publish() instead hands the
+event to one long-lived event loop thread and returns immediately.
+
+The loop drains its queue in short windows and sends one "chat_batch"
+event per group per window:
+
+- consecutive reply deltas of the same turn are merged into one
+- the batch is packed with msgpack into a single bytes field, so the
+  channel layer moves one opaque blob instead of nested JSON
+
+Each sent message is stamped with a per-group event_seq and kept in the
+replay buffer (see replay_buffer) so reconnecting clients can resume.
+
+ChatConsumer.chat_batch unpacks it and forwards each message to the
+client as JSON, or as msgpack for connections opened with ?format=msgpack.
+Repeated draft_json is dropped there, per connection, since only the
+connection knows which draft its client has already seen.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+
+import msgpack
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from chat.services import replay_buffer
+
+_lock = threading.Lock()
+_broadcaster = None
+
+
+def pack_messages(messages):
+    return msgpack.packb(messages, use_bin_type=True)
+
+
+def unpack_messages(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+
+def coalesce(messages):
+    """
+    Merge a burst of messages for one group.
+
+    Args:
+        messages (list): messages in publish order
+
+    Returns:
+        list: compacted messages, order preserved
+    """
+    compacted = []
+
+    for message in messages:
+        previous = compacted[-1] if compacted else None
+        if (
+            previous is not None
+            and message.get("event") == "assistant_reply_delta"
+            and previous.get("event") == "assistant_reply_delta"
+            and previous.get("turn_id") == message.get("turn_id")
+        ):
+            compacted[-1] = {
+                **previous,
+                "delta": previous["delta"] + message["delta"],
+                "seq": message.get("seq", previous.get("seq")),
+            }
+            continue
+
+        compacted.append(message)
+
+    return compacted
+
+
+class Broadcaster:
+    """
+    Event loop thread that owns all group sends for this process.
+    """
+
+    def __init__(self, channel_layer=None, flush_interval=None, max_batch=None):
+        self.channel_layer = channel_layer
+        self.flush_interval = flush_interval if flush_interval is not None else getattr(
+            settings, "CHAT_BROADCAST_FLUSH_SECONDS", 0.005
+        )
+        self.max_batch = max_batch or getattr(settings, "CHAT_BROADCAST_MAX_BATCH", 500)
+
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._ready = threading.Event()
+        self._loop = None
+        self._queue = None
+        # Loop the in-memory layer's consumers run on (see attach_consumer_loop)
+        self.consumer_loop = None
+        self._thread = threading.Thread(target=self._run, name="chat-broadcaster", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        if self.channel_layer is None:
+            self.channel_layer = get_channel_layer()
+        self._ready.set()
+        self._loop.run_until_complete(self._drain())
+
+    def publish(self, group, message):
+        """
+        Queue message for group. Thread-safe; never blocks on the channel layer.
+        """
+        with self._idle:
+            self._pending += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (group, message))
+
+    def attach_consumer_loop(self, loop):
+        """
+        The in-memory layer's queues are not thread-safe, so with that layer
+        group sends are handed to the loop the consumers run on.
+        """
+        from channels.layers import InMemoryChannelLayer
+
+        if isinstance(self.channel_layer, InMemoryChannelLayer) and loop is not self._loop:
+            self.consumer_loop = loop
+
+    async def _group_send(self, group, event):
+        loop = self.consumer_loop
+        if loop is None or loop.is_closed():
+            return await self.channel_layer.group_send(group, event)
+        future = asyncio.run_coroutine_threadsafe(self.channel_layer.group_send(group, event), loop)
+        return await asyncio.wrap_future(future)
+
+    def flush(self, timeout=None):
+        """
+        Block until everything published so far has been sent (benchmarks, tests, shutdown).
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    async def _drain(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+
+            # Collect the rest of the burst
+            if self.flush_interval:
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            by_group = OrderedDict()
+            for group, message in batch:
+                by_group.setdefault(group, []).append(message)
+
+            await asyncio.gather(*(
+                self._send(group, messages) for group, messages in by_group.items()
+            ))
+
+            with self._idle:
+                self._pending -= len(batch)
+                self._idle.notify_all()
+
+    async def _send(self, group, messages):
+        messages = coalesce(messages)
+
+        if replay_buffer.replay_enabled():
+            try:
+                messages = await replay_buffer.get_replay_buffer().append(group, messages)
+            except Exception as e:
+                # Still deliver live; these messages just cannot be replayed
+                print(f"WebSocket replay buffer error for {group}: {e}")
+
+        try:
+            await self._group_send(group, {
+                "type": "chat_batch",
+                "payload": pack_messages(messages),
+            })
+        except Exception as e:
+            print(f"WebSocket broadcast error for {group}: {e}")
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _lock:
+            if _broadcaster is None:
+                _broadcaster = Broadcaster()
+    return _broadcaster
+
+
+def publish(group, message):
+    """
+    Broadcast message to a chat group through the shared background broadcaster.
+    """
+    get_broadcaster().publish(group, message)
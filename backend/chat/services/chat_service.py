@@ -1,40 +1,101 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 from chat.models import ChatSession, ChatMessage
-from chat.services.llm import run_llm
+from chat.services import broadcaster, chat_worker
+from chat.services.draft_patch import apply_draft_patch
+from chat.services.llm import run_llm, run_llm_stream
 
 
 class ChatService:
     """
     Handles the complete chat flow:
-    1. Save user message to DB
-    2. Call LLM for response
-    3. Update session draft_json
-    4. Save assistant message to DB
-    5. Broadcast response via WebSocket
+    1. Call LLM for response
+    2. Commit the turn in one transaction: user + assistant messages
+       (bulk_create) and the new draft_json (version-checked update)
+    3. Broadcast response via WebSocket
+
+    In streaming mode the assistant reply is also pushed to the WebSocket
+    piece by piece while the LLM is still generating. In async mode
+    (enqueue_message) the user message is stored up front and the rest
+    runs on a background worker; the caller only gets a turn ID back.
     """
 
     @staticmethod
-    def process_message(session: ChatSession, user_text: str):
+    def process_message(session: ChatSession, user_text: str, stream: bool = None):
         """
         Main method to process a user message through the complete chat pipeline.
         
         Args:
             session (ChatSession): The chat session
             user_text (str): User's message content
+            stream (bool): Stream assistant_reply deltas over the WebSocket
+                (defaults to settings.CHAT_STREAMING)
             
         Returns:
             dict: LLM response with assistant_reply, updated_json, missing_fields
         """
 
-        ChatMessage.objects.create(
+        return ChatService._complete_turn(session, user_text, stream, store_user_message=True)
+
+    @staticmethod
+    def enqueue_message(session: ChatSession, user_text: str, stream: bool = None):
+        """
+        Async variant of process_message: store the user message and hand the
+        LLM call to the background worker pool. The result is broadcast to
+        chat_{session_id} tagged with the returned turn ID.
+
+        Returns:
+            int: turn ID (the ID of the stored user message)
+        """
+        user_message = ChatMessage.objects.create(
             session=session,
             role="user",
             content=user_text
         )
+        ChatService.submit_turn(session.id, user_text, user_message.id, stream)
+        return user_message.id
+
+    @staticmethod
+    def submit_turn(session_id: int, user_text: str, turn_id: int, stream: bool = None):
+        """
+        Queue the LLM part of a turn whose user message is already stored.
+        Safe to call from async code: it only schedules work.
+        """
+        def job():
+            # Reload: earlier turns of this session may have changed the draft
+            current_session = ChatSession.objects.get(id=session_id)
+            ChatService._complete_turn(current_session, user_text, stream, turn_id=turn_id)
+
+        chat_worker.submit(session_id, job)
+
+    @staticmethod
+    def _complete_turn(session: ChatSession, user_text: str, stream: bool = None,
+                       turn_id: int = None, store_user_message: bool = False):
+        """
+        Run the LLM for one turn, commit it and broadcast the result.
+        store_user_message is False when the user message was already
+        stored (async mode).
+        """
+        expected_version = session.draft_version
 
         try:
-            llm_result = run_llm(user_text, session.draft_json)
+            if stream is None:
+                stream = getattr(settings, "CHAT_STREAMING", False)
+
+            if stream:
+                llm_result = run_llm_stream(
+                    user_text,
+                    session.draft_json,
+                    ChatService._delta_broadcaster(session, turn_id)
+                )
+            else:
+                llm_result = run_llm(user_text, session.draft_json)
             
             assistant_reply = llm_result["assistant_reply"]
             updated_json = llm_result["updated_json"]
@@ -51,24 +112,100 @@ class ChatService:
                 "error": str(e)
             }
 
-        # 3️⃣ Update session state with new draft JSON
-        session.draft_json = updated_json
-        session.save()
-
-        # 4️⃣ Save assistant message to database
-        ChatMessage.objects.create(
-            session=session,
-            role="assistant",
-            content=assistant_reply
+        # 2️⃣ Messages + draft in one transaction
+        raw = llm_result.get("raw")
+        messages, conflict = ChatService.commit_turn(
+            session,
+            assistant_reply,
+            updated_json,
+            expected_version,
+            user_text=user_text if store_user_message else None,
+            draft_patch=raw.get("draft_patch") if isinstance(raw, dict) else None
         )
 
-        # 5️⃣ Broadcast message via WebSocket to connected clients
-        ChatService._broadcast_message(session, assistant_reply, updated_json, missing_fields)
+        if conflict:
+            llm_result["draft_conflict"] = True
+        llm_result["updated_json"] = session.draft_json
+
+        if store_user_message:
+            turn_id = messages[0].id
+
+        # 3️⃣ Broadcast message via WebSocket to connected clients
+        ChatService._broadcast_message(
+            session,
+            assistant_reply,
+            session.draft_json,
+            missing_fields,
+            turn_id=turn_id,
+            timestamp=messages[-1].created_at
+        )
 
         return llm_result
 
     @staticmethod
-    def _broadcast_message(session: ChatSession, assistant_reply: str, updated_json: dict, missing_fields: list):
+    def commit_turn(session: ChatSession, assistant_reply: str, updated_json: dict, expected_version: int,
+                    user_text: str = None, draft_patch=None):
+        """
+        Persist one turn in a single transaction: the message rows in one
+        bulk INSERT and draft_json with one UPDATE guarded by draft_version.
+        The draft is not written at all when the turn didn't change it.
+
+        If another turn changed the draft since expected_version was read,
+        the patch (when the model sent one) is re-applied to the current
+        draft; a full-draft response never overwrites the newer draft.
+
+        Returns:
+            tuple: (created messages in order, whether a version conflict
+            was hit). session.draft_json / draft_version are updated in place.
+        """
+        messages = []
+        if user_text is not None:
+            messages.append(ChatMessage(session=session, role="user", content=user_text))
+        messages.append(ChatMessage(session=session, role="assistant", content=assistant_reply))
+
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages)
+
+            if updated_json == session.draft_json and expected_version == session.draft_version:
+                return messages, False
+
+            draft_json, draft_version, conflict = ChatService._write_draft(
+                session.id, updated_json, expected_version, draft_patch
+            )
+
+        session.draft_json = draft_json
+        session.draft_version = draft_version
+        return messages, conflict
+
+    @staticmethod
+    def _write_draft(session_id: int, updated_json: dict, expected_version: int, draft_patch=None, attempts: int = 3):
+        conflict = False
+
+        for _ in range(attempts):
+            written = ChatSession.objects.filter(
+                id=session_id,
+                draft_version=expected_version
+            ).update(draft_json=updated_json, draft_version=F("draft_version") + 1)
+
+            if written:
+                return updated_json, expected_version + 1, conflict
+
+            conflict = True
+            current = ChatSession.objects.filter(id=session_id).values("draft_json", "draft_version").first()
+            if current is None:
+                raise ChatSession.DoesNotExist(f"Chat session {session_id} no longer exists")
+
+            if draft_patch is None:
+                return current["draft_json"], current["draft_version"], conflict
+
+            expected_version = current["draft_version"]
+            updated_json, _ = apply_draft_patch(current["draft_json"], draft_patch)
+
+        return current["draft_json"], current["draft_version"], conflict
+
+    @staticmethod
+    def _broadcast_message(session: ChatSession, assistant_reply: str, updated_json: dict, missing_fields: list,
+                           turn_id: int = None, timestamp=None):
         """
         Send message to WebSocket subscribers for real-time updates.
         
@@ -77,53 +214,192 @@ class ChatService:
             assistant_reply (str): Assistant's response text
             updated_json (dict): Updated RFP draft
             missing_fields (list): Fields that still need clarification
+            turn_id (int): Turn ID returned to the client in async mode
+            timestamp (datetime): created_at of the stored assistant message
         """
-        try:
-            channel_layer = get_channel_layer()
-            
-            # Send to WebSocket group for this session
-            async_to_sync(channel_layer.group_send)(
-                f"chat_{session.id}",
+        # Queued on the background broadcaster; never blocks the turn
+        broadcaster.publish(
+            f"chat_{session.id}",
+            {
+                "role": "assistant",
+                "content": assistant_reply,
+                "draft_json": updated_json,
+                "draft_version": session.draft_version,
+                "missing_fields": missing_fields,
+                "timestamp": str(timestamp),
+                "turn_id": turn_id
+            }
+        )
+
+    @staticmethod
+    def _delta_broadcaster(session: ChatSession, turn_id: int = None):
+        """
+        Build the on_delta callback used while streaming: each piece of the
+        assistant reply is sent to the session's WebSocket group with a
+        sequence number so clients can append in order. Deltas published
+        within one broadcaster window reach clients merged into one.
+        """
+        group = f"chat_{session.id}"
+        seq = 0
+
+        def on_delta(delta):
+            nonlocal seq
+            seq += 1
+            broadcaster.publish(
+                group,
                 {
-                    "type": "chat_message",
-                    "message": {
-                        "role": "assistant",
-                        "content": assistant_reply,
-                        "draft_json": updated_json,
-                        "missing_fields": missing_fields,
-                        "timestamp": str(session.messages.last().created_at)
-                    }
+                    "event": "assistant_reply_delta",
+                    "role": "assistant",
+                    "delta": delta,
+                    "seq": seq,
+                    "turn_id": turn_id
                 }
             )
-        except Exception as e:
-            # Log error but don't fail the main flow
-            print(f"WebSocket broadcast error: {e}")
+
+        return on_delta
 
     @staticmethod
-    def get_session_summary(session: ChatSession):
+    def encode_history_cursor(created_at, message_id):
         """
-        Get a summary of the chat session including messages and current draft.
-        
-        Args:
-            session (ChatSession): The chat session
-            
+        Opaque keyset cursor for a message: its (created_at, id) position.
+        """
+        raw = f"{created_at.isoformat()}|{message_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_history_cursor(cursor):
+        """
+        Inverse of encode_history_cursor. Raises ValueError on a bad cursor.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            created_at, message_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+            parsed = datetime.fromisoformat(created_at)
+            return parsed, int(message_id)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise ValueError("Invalid history cursor")
+
+    @staticmethod
+    def history_queryset(session_id: int, since: str = None, before: str = None, limit: int = None):
+        """
+        Keyset-paginated message rows (dicts, no model instances) on
+        (created_at, id), served by the chatmessage_session_order_idx index.
+
+        since: messages after this cursor, oldest first (catching up after a reconnect)
+        before: messages before this cursor, i.e. the previous page
+        only limit: the latest page
+        none of them: the whole history, oldest first
+
         Returns:
-            dict: Session summary with messages and draft_json
+            tuple: (queryset fetching limit + 1 rows, whether it is newest-first)
         """
+        queryset = ChatMessage.objects.filter(session_id=session_id).values("id", "role", "content", "created_at")
+        if not (since or before or limit):
+            return queryset.order_by("created_at", "id"), False
+
+        limit = limit or settings.CHAT_HISTORY_PAGE_SIZE
+
+        if since:
+            created_at, message_id = ChatService.decode_history_cursor(since)
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+            ).order_by("created_at", "id")
+            return queryset[:limit + 1], False
+
+        if before:
+            created_at, message_id = ChatService.decode_history_cursor(before)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+
+        return queryset.order_by("-created_at", "-id")[:limit + 1], True
+
+    @staticmethod
+    def history_page(rows: list, limit: int = None, newest_first: bool = False, since: str = None):
+        """
+        Turn the rows fetched by history_queryset into a page (oldest first)
+        with cursors for the next request.
+        """
+        if limit or since or newest_first:
+            limit = limit or settings.CHAT_HISTORY_PAGE_SIZE
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            # Whole history
+            has_more = False
+        if newest_first:
+            rows.reverse()
+
         messages = [
             {
-                "role": m.role,
-                "content": m.content,
-                "timestamp": str(m.created_at)
+                "id": row["id"],
+                "role": row["role"],
+                "content": row["content"],
+                "timestamp": str(row["created_at"])
             }
-            for m in session.messages.all()
+            for row in rows
         ]
 
+        first, last = (rows[0], rows[-1]) if rows else (None, None)
+        return {
+            "messages": messages,
+            # Older messages exist before this page
+            "has_more_before": has_more if newest_first else (None if since else False),
+            # More new messages are waiting after this page (since mode)
+            "has_more_after": has_more if not newest_first else False,
+            "before_cursor": ChatService.encode_history_cursor(first["created_at"], first["id"]) if first else None,
+            # Pass as 'since' to fetch only messages newer than this page
+            "since_cursor": ChatService.encode_history_cursor(last["created_at"], last["id"]) if last else since,
+            "last_message_id": last["id"] if last else None,
+        }
+
+    @staticmethod
+    def history_etag(session: ChatSession, last_message_id, since: str = None, before: str = None, limit: int = None):
+        """
+        ETag for a history response: changes when a message is added, the
+        draft or the session state (title, closed, submitted) changes, and
+        differs between pages (since/before/limit).
+        """
+        state = json.dumps([
+            session.id,
+            last_message_id,
+            session.draft_version,
+            session.title,
+            session.is_closed,
+            session.is_submitted,
+            since,
+            before,
+            limit,
+        ])
+        return f'W/"chat-{session.id}-{hashlib.sha1(state.encode()).hexdigest()[:16]}"'
+
+    @staticmethod
+    def get_session_summary(session: ChatSession, since: str = None, before: str = None, limit: int = None):
+        """
+        Get a summary of the chat session including a page of messages and the current draft.
+        
+        Args:
+            session (ChatSession): The chat session
+            since (str): Only messages after this cursor (since_cursor of an earlier response)
+            before (str): Only messages before this cursor (before_cursor of an earlier response)
+            limit (int): Page size (settings.CHAT_HISTORY_PAGE_SIZE when only a
+                cursor is given; the whole history when none of these are)
+            
+        Returns:
+            dict: Session summary with messages, cursors and draft_json
+
+        Raises:
+            ValueError: since/before is not a valid cursor
+        """
+        queryset, newest_first = ChatService.history_queryset(session.id, since, before, limit)
+        page = ChatService.history_page(list(queryset), limit, newest_first, since)
+
         return {
             "session_id": session.id,
             "title": session.title,
-            "messages": messages,
+            **page,
             "draft_json": session.draft_json,
+            "draft_version": session.draft_version,
             "is_closed": session.is_closed,
             "is_submitted": session.is_submitted,
             "created_at": str(session.created_at)
@@ -0,0 +1,70 @@
+"""
+Background worker pool for asynchronous chat turns.
+
+The HTTP request only stores the user message and returns; the LLM call
+runs here and its result is pushed to the session's WebSocket group.
+Turns of the same session run one at a time, in submission order, so
+each turn sees the draft the previous one produced.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_lock = threading.Lock()
+_executor = None
+# session id -> [lock, turns submitted and not finished]; dropped when the count reaches 0
+_session_locks = {}
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "CHAT_WORKER_THREADS", 8),
+                    thread_name_prefix="chat-turn"
+                )
+    return _executor
+
+
+def _acquire_session_lock(session_id):
+    with _lock:
+        entry = _session_locks.setdefault(session_id, [threading.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+
+def _release_session_lock(session_id):
+    with _lock:
+        entry = _session_locks[session_id]
+        entry[1] -= 1
+        if not entry[1]:
+            del _session_locks[session_id]
+
+
+def _run(session_id, lock, job):
+    # Worker threads outlive requests: drop stale connections around each turn
+    close_old_connections()
+    try:
+        with lock:
+            job()
+    except Exception as e:
+        print(f"Chat turn for session {session_id} failed: {e}")
+    finally:
+        _release_session_lock(session_id)
+        close_old_connections()
+
+
+def submit(session_id, job):
+    """
+    Run job() on the worker pool, after any earlier turn of the same session.
+    """
+    lock = _acquire_session_lock(session_id)
+    try:
+        return _get_executor().submit(_run, session_id, lock, job)
+    except Exception:
+        _release_session_lock(session_id)
+        raise
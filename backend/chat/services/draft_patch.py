@@ -0,0 +1,195 @@
+"""
+Patch protocol for RFP draft updates.
+
+Instead of echoing the whole merged draft on every turn, the model returns
+a short list of operations against the stored draft_json:
+
+    {"op": "set", "path": "budget", "value": 50000}
+    {"op": "append", "path": "items", "value": {"name": "monitors", "quantity": 5}}
+    {"op": "remove", "path": "warranty"}
+
+Paths are dot separated; list elements are addressed by index
+("items.0.quantity"). Operations are applied in order to a copy of the
+draft. Operations with a bad path or a value of the wrong type are skipped
+and reported, so one bad operation never loses the rest of the turn.
+"""
+import copy
+import numbers
+
+PATCH_OPS = ("set", "append", "remove")
+
+# Expected types for the top-level RFP fields (see RFP_PROMPT)
+DRAFT_FIELD_TYPES = {
+    "project_title": str,
+    "budget": numbers.Number,
+    "deadline_days": numbers.Number,
+    "items": list,
+    "payment_terms": str,
+    "warranty": str,
+    "other_requirements": str,
+}
+
+ITEM_FIELD_TYPES = {
+    "name": str,
+    "quantity": numbers.Number,
+    "specs": dict,
+}
+
+
+class DraftPatchError(ValueError):
+    """A single patch operation could not be applied."""
+
+
+def _split_path(path):
+    if not isinstance(path, str) or not path.strip():
+        raise DraftPatchError("path must be a non-empty string")
+
+    parts = []
+    for part in path.split("."):
+        if not part:
+            raise DraftPatchError(f"invalid path '{path}'")
+        parts.append(int(part) if part.isdigit() else part)
+    return parts
+
+
+def _check_type(value, expected, where):
+    # bool is a Number subclass but never a valid amount or count
+    if expected is numbers.Number and isinstance(value, bool):
+        raise DraftPatchError(f"{where} must be a number")
+    if not isinstance(value, expected):
+        name = "number" if expected is numbers.Number else expected.__name__
+        raise DraftPatchError(f"{where} must be a {name}")
+
+
+def _validate_item(item, where):
+    _check_type(item, dict, where)
+    for key, expected in ITEM_FIELD_TYPES.items():
+        if key in item and item[key] is not None:
+            _check_type(item[key], expected, f"{where}.{key}")
+
+
+def _validate_value(parts, value):
+    """
+    Type-check a value being written at parts. Only the known RFP fields
+    (and the shape of items) are checked; free-form fields are accepted.
+    """
+    field = parts[0]
+    if field not in DRAFT_FIELD_TYPES or value is None:
+        return
+
+    if len(parts) == 1:
+        _check_type(value, DRAFT_FIELD_TYPES[field], field)
+        if field == "items":
+            for index, item in enumerate(value):
+                _validate_item(item, f"items.{index}")
+    elif field == "items" and len(parts) == 2:
+        _validate_item(value, f"items.{parts[1]}")
+    elif field == "items" and len(parts) == 3 and parts[2] in ITEM_FIELD_TYPES:
+        _check_type(value, ITEM_FIELD_TYPES[parts[2]], f"items.{parts[1]}.{parts[2]}")
+
+
+def _resolve_parent(draft, parts, create):
+    node = draft
+    for index, part in enumerate(parts[:-1]):
+        if isinstance(node, list):
+            if not isinstance(part, int) or part >= len(node):
+                raise DraftPatchError(f"index {part} out of range")
+            node = node[part]
+        elif isinstance(node, dict):
+            if part not in node or node[part] is None:
+                if not create:
+                    raise DraftPatchError(f"'{part}' does not exist")
+                next_part = parts[index + 1]
+                node[part] = [] if isinstance(next_part, int) else {}
+            node = node[part]
+        else:
+            raise DraftPatchError(f"cannot descend into '{part}'")
+    return node
+
+
+def apply_operation(draft, operation):
+    """
+    Apply one operation to draft in place. Raises DraftPatchError.
+    """
+    if not isinstance(operation, dict):
+        raise DraftPatchError("operation must be an object")
+
+    op = operation.get("op")
+    if op not in PATCH_OPS:
+        raise DraftPatchError(f"unknown op '{op}'")
+
+    parts = _split_path(operation.get("path"))
+
+    if op == "remove":
+        parent = _resolve_parent(draft, parts, create=False)
+        last = parts[-1]
+        if isinstance(parent, list) and isinstance(last, int) and last < len(parent):
+            parent.pop(last)
+        elif isinstance(parent, dict) and last in parent:
+            del parent[last]
+        else:
+            raise DraftPatchError(f"'{operation['path']}' does not exist")
+        return
+
+    if "value" not in operation:
+        raise DraftPatchError(f"'{op}' needs a value")
+    value = operation["value"]
+
+    if op == "append":
+        parent = _resolve_parent(draft, parts, create=True)
+        target = parent.get(parts[-1]) if isinstance(parent, dict) else None
+        if target is None and isinstance(parent, dict):
+            target = parent[parts[-1]] = []
+        if not isinstance(target, list):
+            raise DraftPatchError(f"'{operation['path']}' is not a list")
+        new_items = value if isinstance(value, list) else [value]
+        for offset, item in enumerate(new_items):
+            _validate_value(parts + [len(target) + offset], item)
+        target.extend(new_items)
+        return
+
+    # set
+    _validate_value(parts, value)
+    parent = _resolve_parent(draft, parts, create=True)
+    last = parts[-1]
+    if isinstance(parent, list):
+        if not isinstance(last, int) or last > len(parent):
+            raise DraftPatchError(f"index {last} out of range")
+        if last == len(parent):
+            parent.append(value)
+        else:
+            parent[last] = value
+    elif isinstance(parent, dict):
+        parent[last] = value
+    else:
+        raise DraftPatchError(f"cannot set '{operation['path']}'")
+
+
+def apply_draft_patch(draft_json, operations):
+    """
+    Apply a list of patch operations to a copy of draft_json.
+
+    Returns:
+        tuple: (updated draft, list of "op path: reason" strings for skipped operations)
+    """
+    updated = copy.deepcopy(draft_json or {})
+    errors = []
+
+    if isinstance(operations, dict):
+        operations = [operations]
+    if not isinstance(operations, list):
+        return updated, ["draft_patch must be a list of operations"]
+
+    for operation in operations:
+        # Work on a copy so a failing operation leaves no partial write behind
+        candidate = copy.deepcopy(updated)
+        try:
+            apply_operation(candidate, operation)
+        except DraftPatchError as e:
+            label = operation.get("op", "?") if isinstance(operation, dict) else "?"
+            path = operation.get("path", "?") if isinstance(operation, dict) else "?"
+            errors.append(f"{label} {path}: {e}")
+            continue
+        updated = candidate
+
+    return updated, errors
@@ -1,14 +1,14 @@
 import json
 import logging
-from mistralai import Mistral
-import requests
 from django.conf import settings
+from chat.services import llm_router
+from chat.services.llm_clients import hf_generate, hf_model_url, mistral_complete
 
 logger = logging.getLogger(__name__)
 
 # Constants
 MISTRAL_MODEL = "mistral-small-latest"
-HF_MODEL_URL = "https://api-inference.huggingface.co/models/meta-llama/Llama-3.2-3B-Instruct"
+HF_EMAIL_MODEL = "meta-llama/Llama-3.2-3B-Instruct"
 
 def parse_email_response(raw_response):
     """
@@ -77,32 +77,57 @@ def parse_email_response(raw_response):
             "template_body": "Dear {{vendor_name}},\n\nWe would like to request a proposal for our project requirements.\n\nBest regards,\n{{contact_person}}"
         }
 
-def mistral_generate_email(rfp_json, user_email):
-    """
-    Generate email template using Mistral API.
-    """
-    client = Mistral(api_key=settings.MISTRAL_API_KEY)
-
-    prompt = settings.EMAIL_GENERATION_PROMPT.format(
+def _email_prompt(rfp_json, user_email):
+    return settings.EMAIL_GENERATION_PROMPT.format(
         rfp_json=json.dumps(rfp_json, indent=2),
         user_email=user_email
     )
 
-    try:
-        response = client.chat.complete(
-            model=MISTRAL_MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        )
 
-        raw = response.choices[0].message.content
-        parsed = parse_email_response(raw)
+def mistral_email(rfp_json, user_email, timeout=None):
+    """
+    Generate email template with Mistral. Raises on failure.
+    """
+    raw = mistral_complete(_email_prompt(rfp_json, user_email), MISTRAL_MODEL, timeout=timeout)
+    parsed = parse_email_response(raw)
+
+    return {
+        "provider": "mistral",
+        "subject": parsed.get("subject", "RFP Request"),
+        "template_body": parsed.get("template_body", "Please find our RFP requirements attached."),
+        "raw": raw
+    }
 
-        return {
-            "provider": "mistral",
-            "subject": parsed.get("subject", "RFP Request"),
-            "template_body": parsed.get("template_body", "Please find our RFP requirements attached."),
-            "raw": raw
-        }
+
+def hf_email(rfp_json, user_email, timeout=None):
+    """
+    Generate email template with HuggingFace. Raises on failure.
+    """
+    prompt = _email_prompt(rfp_json, user_email)
+    result = hf_generate(hf_model_url(HF_EMAIL_MODEL), prompt, max_new_tokens=500, timeout=timeout)
+    if isinstance(result, list) and len(result) > 0:
+        raw = result[0].get("generated_text", "")
+        # Remove the original prompt from response
+        raw = raw.replace(prompt, "").strip()
+    else:
+        raw = str(result)
+
+    parsed = parse_email_response(raw)
+
+    return {
+        "provider": "hf",
+        "subject": parsed.get("subject", "RFP Request"),
+        "template_body": parsed.get("template_body", "Please find our RFP requirements attached."),
+        "raw": raw
+    }
+
+
+def mistral_generate_email(rfp_json, user_email):
+    """
+    Generate email template using Mistral API.
+    """
+    try:
+        return mistral_email(rfp_json, user_email)
     except Exception as e:
         logger.error(f"Mistral email generation error: {e}")
         return {
@@ -116,63 +141,52 @@ def hf_generate_email(rfp_json, user_email):
     """
     Generate email template using HuggingFace API.
     """
-    prompt = settings.EMAIL_GENERATION_PROMPT.format(
-        rfp_json=json.dumps(rfp_json, indent=2),
-        user_email=user_email
-    )
+    try:
+        return hf_email(rfp_json, user_email)
+    except Exception as e:
+        logger.error(f"HuggingFace email generation error: {e}")
+        return {
+            "provider": "hf",
+            "subject": "RFP Request - Please Review",
+            "template_body": "Dear {{vendor_name}},\n\nWe would like to request a proposal for our project requirements.\n\nBest regards,\n{{contact_person}}",
+            "raw": {"error": str(e)}
+        }
 
-    headers = {
-        "Authorization": f"Bearer {settings.HF_API_KEY}",
-        "Content-Type": "application/json"
-    }
+def _routed_email(rfp_json, user_email):
+    deadline = llm_router.call_deadline()
+    email_calls = {"mistral": mistral_email, "hf": hf_email}
 
-    payload = {
-        "inputs": prompt,
-        "parameters": {"max_new_tokens": 500}
+    calls = {
+        name: (lambda fn=email_calls[name]: fn(rfp_json, user_email, timeout=deadline))
+        for name in llm_router.configured_providers()
+        if name in email_calls
     }
 
     try:
-        response = requests.post(
-            HF_MODEL_URL,
-            headers=headers,
-            json=payload
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        if isinstance(result, list) and len(result) > 0:
-            raw = result[0].get("generated_text", "")
-            # Remove the original prompt from response
-            raw = raw.replace(prompt, "").strip()
-        else:
-            raw = str(result)
-
-        parsed = parse_email_response(raw)
-
-        return {
-            "provider": "hf",
-            "subject": parsed.get("subject", "RFP Request"),
-            "template_body": parsed.get("template_body", "Please find our RFP requirements attached."),
-            "raw": raw
-        }
-    except Exception as e:
-        logger.error(f"HuggingFace email generation error: {e}")
+        _, result = llm_router.route(calls, deadline=deadline)
+        return result
+    except llm_router.LLMUnavailableError as e:
+        logger.error(f"Email generation failed on all providers: {e}")
         return {
-            "provider": "hf",
+            "provider": "router",
             "subject": "RFP Request - Please Review",
             "template_body": "Dear {{vendor_name}},\n\nWe would like to request a proposal for our project requirements.\n\nBest regards,\n{{contact_person}}",
             "raw": {"error": str(e)}
         }
 
+
 def generate_email_template(rfp_json, user_email):
     """
     Main entry point for email template generation.
-    Uses the same provider as chat LLM (CHAT_LLM_PROVIDER setting).
+    Uses the same provider as chat LLM (CHAT_LLM_PROVIDER setting), through
+    the provider router when LLM_ROUTING is on.
     Returns: {"subject": str, "body": str}
     """
     provider = getattr(settings, "CHAT_LLM_PROVIDER", "mistral")
 
-    if provider == "mistral":
+    if llm_router.routing_enabled():
+        result = _routed_email(rfp_json, user_email)
+    elif provider == "mistral":
         result = mistral_generate_email(rfp_json, user_email)
     elif provider == "hf":
         result = hf_generate_email(rfp_json, user_email)
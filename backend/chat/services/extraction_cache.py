@@ -0,0 +1,165 @@
+"""
+Two-tier cache for LLM quotation extractions.
+
+Tier 1 is an in-process TTL/LRU cache; tier 2 is the
+CachedQuotationExtraction table, shared by every worker and by the sync
+command. Keys combine the normalized text hash with the prompt version and
+model, so a prompt or model change never serves stale answers. Both tiers
+expire entries after QUOTATION_CACHE_TTL_SECONDS; the table is additionally
+trimmed to QUOTATION_CACHE_MAX_ROWS least-recently-used rows by prune().
+"""
+import threading
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+CacheKey = namedtuple("CacheKey", ["text_hash", "prompt_version", "model"])
+
+_lock = threading.Lock()
+_local = None
+_stats = Counter()
+
+
+def _ttl_seconds():
+    return getattr(settings, "QUOTATION_CACHE_TTL_SECONDS", 30 * 24 * 3600)
+
+
+def _local_cache():
+    global _local
+    if _local is None:
+        _local = TTLCache(
+            maxsize=getattr(settings, "QUOTATION_CACHE_LOCAL_SIZE", 1024),
+            ttl=_ttl_seconds()
+        )
+    return _local
+
+
+def make_key(text_hash, prompt_version, model):
+    return CacheKey(text_hash, prompt_version, model)
+
+
+def get(key):
+    """
+    Look the key up in memory, then in the table.
+
+    Returns:
+        tuple: (hit, (amount, currency))
+    """
+    from chat.models import CachedQuotationExtraction
+
+    with _lock:
+        value = _local_cache().get(key)
+    if value is not None:
+        _stats["local_hits"] += 1
+        return True, value
+
+    now = timezone.now()
+    row = CachedQuotationExtraction.objects.filter(
+        text_hash=key.text_hash,
+        prompt_version=key.prompt_version,
+        model=key.model,
+        expires_at__gt=now
+    ).values_list('id', 'quoted_amount', 'currency').first()
+
+    if row is None:
+        _stats["misses"] += 1
+        return False, (None, None)
+
+    row_id, amount, currency = row
+    CachedQuotationExtraction.objects.filter(id=row_id).update(
+        hit_count=F('hit_count') + 1,
+        last_used_at=now
+    )
+
+    value = (amount, currency)
+    with _lock:
+        _local_cache()[key] = value
+    _stats["persistent_hits"] += 1
+    return True, value
+
+
+def store(key, value):
+    """
+    Store an (amount, currency) result in both tiers.
+    """
+    from chat.models import CachedQuotationExtraction
+
+    amount, currency = value
+    now = timezone.now()
+
+    with _lock:
+        _local_cache()[key] = value
+
+    try:
+        CachedQuotationExtraction.objects.update_or_create(
+            text_hash=key.text_hash,
+            prompt_version=key.prompt_version,
+            model=key.model,
+            defaults={
+                "quoted_amount": amount,
+                "currency": currency,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=_ttl_seconds()),
+            }
+        )
+    except IntegrityError:
+        # Another worker stored the same key first
+        pass
+
+
+def prune():
+    """
+    Delete expired rows and trim the table to the configured size (LRU).
+
+    Returns:
+        int: rows deleted
+    """
+    from chat.models import CachedQuotationExtraction
+
+    deleted, _ = CachedQuotationExtraction.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    max_rows = getattr(settings, "QUOTATION_CACHE_MAX_ROWS", 50000)
+    cutoff = list(
+        CachedQuotationExtraction.objects.order_by('-last_used_at').values_list(
+            'last_used_at', flat=True
+        )[max_rows:max_rows + 1]
+    )
+
+    if cutoff:
+        cutoff = cutoff[0]
+        trimmed, _ = CachedQuotationExtraction.objects.filter(last_used_at__lte=cutoff).delete()
+        deleted += trimmed
+
+    return deleted
+
+
+def stats():
+    """
+    Hit/miss counters for this process since start (or the last reset).
+    """
+    local_hits = _stats["local_hits"]
+    persistent_hits = _stats["persistent_hits"]
+    misses = _stats["misses"]
+    lookups = local_hits + persistent_hits + misses
+
+    return {
+        "local_hits": local_hits,
+        "persistent_hits": persistent_hits,
+        "misses": misses,
+        "hit_rate": round((local_hits + persistent_hits) / lookups, 3) if lookups else None,
+    }
+
+
+def clear_local():
+    """
+    Drop the in-process tier and reset counters (tests, benchmarks).
+    """
+    global _local
+    with _lock:
+        _local = None
+        _stats.clear()
@@ -0,0 +1,163 @@
+"""
+Event-driven incremental rescoring.
+
+Instead of waiting for CalculateVendorScoresView to rescore a whole
+template, model signals (see chat/signals.py) mark what changed:
+
+- a VendorQuotation was created or saved -> its sent email
+- a Vendor's rating, delivery rate or verification flags changed -> that
+  vendor's sent emails (saved one by one, or written through
+  VendorQuerySet.update() / bulk_update())
+
+Marks are collected after the surrounding transaction commits and
+flushed once no new mark has arrived for CHAT_RESCORE_DEBOUNCE_SECONDS, so
+a sync that stores fifty quotations rescores each template once. A flush
+recomputes only the marked rows (ScoringService.rescore_sent_emails) and
+rewrites ranks that moved. Only templates that have been scored before
+are kept up to date.
+
+Readers that must not see stale scores call flush() first; it does the
+pending work inline, which is cheap because it is incremental. Short-lived
+processes (sync_quotations --once) call it before exiting, since the
+debounce timer would never fire.
+"""
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from chat.models import EmailTemplate, SentEmail, VendorScore
+from chat.services.scoring_service import ScoringService
+from vendors import quality
+
+# Vendor fields that feed the quality score
+SCORED_VENDOR_FIELDS = quality.SOURCE_FIELDS
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_pending_sent_emails = set()
+_pending_vendors = set()
+_timer = None
+
+
+def rescoring_enabled():
+    return getattr(settings, "CHAT_INCREMENTAL_RESCORING", True)
+
+
+def _debounce_seconds():
+    return getattr(settings, "CHAT_RESCORE_DEBOUNCE_SECONDS", 2.0)
+
+
+def mark_sent_emails_changed(sent_email_ids):
+    _mark(sent_email_ids=sent_email_ids)
+
+
+def mark_vendors_changed(vendor_ids):
+    """
+    Called by the Vendor signals and VendorQuerySet's bulk writes, which
+    send no signals.
+    """
+    _mark(vendor_ids=vendor_ids)
+
+
+def _mark(sent_email_ids=(), vendor_ids=()):
+    if not rescoring_enabled():
+        return
+
+    sent_email_ids = set(sent_email_ids)
+    vendor_ids = set(vendor_ids)
+
+    def add():
+        with _lock:
+            _pending_sent_emails.update(sent_email_ids)
+            _pending_vendors.update(vendor_ids)
+        _schedule()
+
+    # Rolled back changes must not trigger a rescore
+    transaction.on_commit(add)
+
+
+def _schedule():
+    global _timer
+    delay = _debounce_seconds()
+
+    if not delay:
+        flush()
+        return
+
+    with _lock:
+        # Every new mark pushes the flush back (trailing debounce)
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(delay, _flush_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_in_background():
+    close_old_connections()
+    try:
+        flush()
+    except Exception as e:
+        print(f"Incremental rescoring error: {e}")
+    finally:
+        close_old_connections()
+
+
+def _template_budget(template):
+    budget = (template.session.draft_json or {}).get('budget')
+    if not budget:
+        return None
+    try:
+        return Decimal(str(budget))
+    except InvalidOperation:
+        return None
+
+
+def flush():
+    """
+    Rescore everything marked so far.
+
+    Returns:
+        int: Number of VendorScore rows written
+    """
+    global _timer
+
+    with _flush_lock:
+        with _lock:
+            sent_email_ids = set(_pending_sent_emails)
+            vendor_ids = set(_pending_vendors)
+            _pending_sent_emails.clear()
+            _pending_vendors.clear()
+            if _timer is not None:
+                _timer.cancel()
+                _timer = None
+
+        if not sent_email_ids and not vendor_ids:
+            return 0
+
+        # Affected sent emails of templates that have been scored before
+        by_template = {}
+        for template_id, sent_email_id in SentEmail.objects.filter(
+            Q(id__in=sent_email_ids) | Q(vendor_id__in=vendor_ids),
+            status='sent',
+            template_id__in=VendorScore.objects.values('sent_email__template_id'),
+        ).values_list('template_id', 'id'):
+            by_template.setdefault(template_id, set()).add(sent_email_id)
+
+        written = 0
+        templates = EmailTemplate.objects.filter(id__in=by_template).select_related('session')
+        for template in templates:
+            budget = _template_budget(template)
+            if budget is None:
+                continue
+
+            try:
+                written += ScoringService.rescore_sent_emails(template, budget, by_template[template.id])
+            except Exception as e:
+                # Keep going; the next full calculation repairs this template
+                print(f"Incremental rescoring error for template {template.id}: {e}")
+
+        return written
@@ -1,11 +1,39 @@
+import hashlib
 import json
-import requests
+import time
 from django.conf import settings
-from mistralai import Mistral
 from decimal import Decimal
+from chat.services import extraction_cache, llm_router
+from chat.services.draft_patch import apply_draft_patch
+from chat.services.llm_clients import hf_generate, hf_model_url, mistral_complete, mistral_stream
+from chat.services.quotation_parser import QuotationExtraction, fast_extract_quotation
+from chat.services.stream_parser import ReplyStreamParser
 
 MISTRAL_MODEL = "mistral-large-latest"
 
+# Read timeout the direct HF calls had before the pooled clients; shorter
+# than LLM_TIMEOUT_SECONDS so a stalled HF request fails fast
+HF_TIMEOUT_SECONDS = 20
+
+# Bump whenever the quotation prompt or parsing rules change so that
+# previously "empty" extractions are retried against the new extractor.
+QUOTATION_EXTRACTOR_VERSION = "2"
+
+# Confidence recorded for amounts that came back from the LLM
+LLM_QUOTATION_CONFIDENCE = 0.8
+
+# Bump when QUOTATION_PROMPT changes; cached LLM extractions are keyed on it
+QUOTATION_PROMPT_VERSION = "1"
+
+
+def quotation_content_hash(text):
+    """
+    Stable hash of the text handed to the quotation extractor.
+    Whitespace is collapsed so re-wrapped bodies hash the same.
+    """
+    normalized = " ".join((text or "").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
 
 def parse_llm_response(raw_text):
     """
@@ -25,104 +53,114 @@ def parse_llm_response(raw_text):
         # Fallback response if no valid JSON found
         return {
             "assistant_reply": "I'm sorry, I had trouble processing your request. Could you please rephrase?",
-            "updated_json": {},
+            # An empty patch keeps the stored draft instead of wiping it
+            "draft_patch": [],
             "missing_fields": []
         }
 
 
-def mistral_parse(message, draft_json):
+def draft_patches_enabled():
+    return getattr(settings, "CHAT_DRAFT_PATCHES", True)
+
+
+def build_rfp_prompt(message, draft_json):
     """
-    Send message to Mistral API and return structured response.
+    Chat prompt for one turn. With draft patches enabled the draft is sent
+    as compact JSON and the model answers with a patch instead of the
+    whole merged draft, so tokens per turn don't grow with the RFP.
     """
-    client = Mistral(api_key=settings.MISTRAL_API_KEY)
+    if draft_patches_enabled():
+        return settings.RFP_PATCH_PROMPT.format(
+            user_message=message,
+            draft_json=json.dumps(draft_json, separators=(",", ":"), ensure_ascii=False)
+        )
 
-    prompt = settings.RFP_PROMPT.format(
+    return settings.RFP_PROMPT.format(
         user_message=message,
         draft_json=json.dumps(draft_json, indent=2)
     )
 
-    try:
-        response = client.chat.complete(
-            model=MISTRAL_MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        )
 
-        raw = response.choices[0].message.content
-        parsed = parse_llm_response(raw)
+def resolve_updated_json(parsed, draft_json):
+    """
+    The new draft for a parsed chat response: the stored draft with
+    draft_patch applied, or updated_json when the model sent a full draft.
+    """
+    if "draft_patch" in parsed:
+        updated_json, errors = apply_draft_patch(draft_json, parsed["draft_patch"])
+        for error in errors:
+            print(f"Skipped draft patch operation: {error}")
+        return updated_json
 
-        return {
-            "provider": "mistral",
-            "assistant_reply": parsed.get("assistant_reply", "I processed your message."),
-            "updated_json": parsed.get("updated_json", draft_json),
-            "missing_fields": parsed.get("missing_fields", []),
-            "raw": parsed
-        }
-    except Exception as e:
-        return {
-            "provider": "mistral",
-            "assistant_reply": f"I encountered an error: {str(e)}. Please try again.",
-            "updated_json": draft_json,
-            "missing_fields": [],
-            "raw": {"error": str(e)}
-        }
+    return parsed.get("updated_json", draft_json)
 
 
-def hf_parse(message, draft_json):
-    """
-    Send message to HuggingFace API and return structured response.
-    """
-    prompt = settings.RFP_PROMPT.format(
-        user_message=message,
-        draft_json=json.dumps(draft_json, indent=2)
-    )
+def _chat_result(provider, raw, draft_json):
+    parsed = parse_llm_response(raw)
 
-    headers = {
-        "Authorization": f"Bearer {settings.HF_API_KEY}",
-        "Content-Type": "application/json"
+    return {
+        "provider": provider,
+        "assistant_reply": parsed.get("assistant_reply", "I processed your message."),
+        "updated_json": resolve_updated_json(parsed, draft_json),
+        "missing_fields": parsed.get("missing_fields", []),
+        "raw": parsed
     }
 
-    payload = {
-        "inputs": prompt,
-        "parameters": {"max_new_tokens": 400}
+
+def _chat_error_result(provider, error, draft_json):
+    return {
+        "provider": provider,
+        "assistant_reply": f"I encountered an error: {str(error)}. Please try again.",
+        "updated_json": draft_json,
+        "missing_fields": [],
+        "raw": {"error": str(error)}
     }
 
-    try:
-        response = requests.post(
-            f"https://api-inference.huggingface.co/models/{settings.HF_MODEL}",
-            headers=headers,
-            json=payload,
-            timeout=20
-        )
-        response.raise_for_status()
 
-        raw_output = response.json()[0].get("generated_text", "")
-        parsed = parse_llm_response(raw_output)
+def mistral_chat(message, draft_json, timeout=None):
+    """
+    One chat turn against Mistral. Raises on failure.
+    """
+    prompt = build_rfp_prompt(message, draft_json)
+    raw = mistral_complete(prompt, MISTRAL_MODEL, timeout=timeout)
+    return _chat_result("mistral", raw, draft_json)
 
-        return {
-            "provider": "huggingface",
-            "assistant_reply": parsed.get("assistant_reply", "I processed your message."),
-            "updated_json": parsed.get("updated_json", draft_json),
-            "missing_fields": parsed.get("missing_fields", []),
-            "raw": parsed
-        }
+
+def hf_chat(message, draft_json, timeout=None):
+    """
+    One chat turn against the HuggingFace inference API. Raises on failure.
+    """
+    prompt = build_rfp_prompt(message, draft_json)
+    result = hf_generate(
+        hf_model_url(settings.HF_MODEL),
+        prompt,
+        max_new_tokens=400,
+        timeout=timeout
+    )
+    return _chat_result("huggingface", result[0].get("generated_text", ""), draft_json)
+
+
+def mistral_parse(message, draft_json):
+    """
+    Send message to Mistral API and return structured response.
+    """
+    try:
+        return mistral_chat(message, draft_json)
     except Exception as e:
-        return {
-            "provider": "huggingface",
-            "assistant_reply": f"I encountered an error: {str(e)}. Please try again.",
-            "updated_json": draft_json,
-            "missing_fields": [],
-            "raw": {"error": str(e)}
-        }
+        return _chat_error_result("mistral", e, draft_json)
 
 
-def extract_quotation_info(text):
+def hf_parse(message, draft_json):
     """
-    Extract quoted amount and currency from email text using LLM service.
+    Send message to HuggingFace API and return structured response.
     """
-    if not text:
-        return None, None
+    try:
+        return hf_chat(message, draft_json, timeout=HF_TIMEOUT_SECONDS)
+    except Exception as e:
+        return _chat_error_result("huggingface", e, draft_json)
 
-    quotation_prompt = """
+
+_QUOTATION_INTRO = """
     You are an expert at extracting and standardizing financial quotation information from vendor email replies.
     
     Analyze the following email text from a vendor responding to a business inquiry and extract any quoted amounts.
@@ -130,7 +168,10 @@ def extract_quotation_info(text):
     Email text:
     {email_text}
     
-    IMPORTANT: Look for various ways vendors might express pricing:
+"""
+
+# Shared by the single and batch prompts (no format fields)
+QUOTATION_EXTRACTION_RULES = """    IMPORTANT: Look for various ways vendors might express pricing:
     - Direct amounts: "$5000", "USD 5000", "5000 dollars"
     - Indian Rupees: "₹40000", "40000 INR", "40000 rupees"
     - Chinese Yuan: "¥3000", "3000 yuan", "3000 CNY", "3000 RMB"
@@ -154,7 +195,9 @@ def extract_quotation_info(text):
     - If no currency symbol/mention is found, assume USD
     - Round USD values to 2 decimal places
     
-    Please return your response in the following JSON format:
+"""
+
+_QUOTATION_SINGLE_FORMAT = """    Please return your response in the following JSON format:
     {{
         "quotations": [
             {{
@@ -192,70 +235,339 @@ def extract_quotation_info(text):
     Return ONLY the JSON. No explanation, no commentary, no markdown.
     """
 
-    try:
-        provider = getattr(settings, "CHAT_LLM_PROVIDER", "mistral")
-        
-        if provider == "mistral":
-            client = Mistral(api_key=settings.MISTRAL_API_KEY)
-            
-            response = client.chat.complete(
-                model=MISTRAL_MODEL,
-                messages=[{
-                    "role": "user", 
-                    "content": quotation_prompt.format(email_text=text)
-                }]
-            )
-            
-            raw = response.choices[0].message.content
-            parsed = parse_llm_response(raw)
-            
-        elif provider == "hf":
-            headers = {
-                "Authorization": f"Bearer {settings.HF_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "inputs": quotation_prompt.format(email_text=text),
-                "parameters": {"max_new_tokens": 300}
-            }
-            
-            response = requests.post(
-                f"https://api-inference.huggingface.co/models/{settings.HF_MODEL}",
-                headers=headers,
-                json=payload,
-                timeout=20
-            )
-            response.raise_for_status()
-            
-            raw_output = response.json()[0].get("generated_text", "")
-            parsed = parse_llm_response(raw_output)
-            
+QUOTATION_PROMPT = _QUOTATION_INTRO + QUOTATION_EXTRACTION_RULES + _QUOTATION_SINGLE_FORMAT
+
+QUOTATION_BATCH_PROMPT = """
+    You are an expert at extracting and standardizing financial quotation information from vendor email replies.
+    
+    Below are several independent vendor emails, each starting with a line "=== EMAIL <id> ===".
+    Analyze EACH email on its own and extract its quoted amounts. Never mix amounts between emails.
+    
+""" + QUOTATION_EXTRACTION_RULES + """    Return one result per email, using the email's id, in this JSON format:
+    {{
+        "results": [
+            {{
+                "id": "0",
+                "primary_quotation": {{
+                    "amount": "480.00",
+                    "currency": "USD"
+                }}
+            }},
+            {{
+                "id": "1",
+                "primary_quotation": null
+            }}
+        ]
+    }}
+    
+    Rules:
+    - For primary_quotation, use the LARGEST USD amount in that email
+    - primary_quotation currency should ALWAYS be "USD"; use null when the email has no quotation
+    - Include every id exactly once
+    
+    Return ONLY the JSON. No explanation, no commentary, no markdown.
+    
+    {emails}
+    """
+
+
+def extract_quotation(text):
+    """
+    Extract the primary quotation from email text.
+    Runs the deterministic parser first and only calls the LLM when it finds
+    no candidate or several conflicting ones.
+
+    Returns:
+        QuotationExtraction: amount (USD Decimal or None), currency, confidence
+        and the path that produced it ('fast_path', 'llm', 'llm_cache',
+        'conflict', 'no_candidate', or 'llm_error' when the LLM call failed)
+    """
+    if not text:
+        return QuotationExtraction(None, None, 0.0, "no_candidate")
+
+    fast = fast_extract_quotation(text)
+    if fast.path == "fast_path":
+        return fast
+
+    value, cached = _cached_llm_extract_quotation(text)
+    return _llm_extraction(fast, value, cached)
+
+
+def extract_quotations(texts):
+    """
+    Batch version of extract_quotation.
+    The fast path runs per email; everything it can't settle is sent to
+    the LLM in shared batches instead of one round trip per email.
+
+    Args:
+        texts (dict): item id -> email text
+
+    Returns:
+        dict: item id -> QuotationExtraction
+    """
+    results = {}
+    fallbacks = {}
+
+    for item_id, text in texts.items():
+        fast = fast_extract_quotation(text)
+        if fast.path == "fast_path":
+            results[item_id] = fast
         else:
-            return None, None
-        
-        # Extract primary quotation
-        primary = parsed.get("primary_quotation")
-        if primary and primary.get("amount") and primary.get("currency"):
-            try:
-                amount = Decimal(str(primary["amount"]).replace(',', ''))
-                currency = primary["currency"]
-                return amount, currency
-            except (ValueError, TypeError):
-                pass
-        
-        return None, None
-        
+            fallbacks[item_id] = fast
+
+    if not fallbacks:
+        return results
+
+    llm_results = _cached_llm_extract_quotation_batch({item_id: texts[item_id] for item_id in fallbacks})
+
+    for item_id, fast in fallbacks.items():
+        value, cached = llm_results[item_id]
+        results[item_id] = _llm_extraction(fast, value, cached)
+
+    return results
+
+
+def _llm_extraction(fast, value, cached):
+    """
+    QuotationExtraction for an email the fast path left open, given the
+    LLM's (amount, currency), or None when the call failed.
+
+    When the LLM gives nothing back, the result stays unresolved. A conflicting
+    candidate is not stored: picking the largest of several amounts is a guess,
+    and a stored amount is never re-extracted. A failed call is reported
+    as 'llm_error' so that the caller retries it instead of settling it.
+    """
+    if value is None:
+        return QuotationExtraction(None, None, 0.0, "llm_error")
+
+    amount, currency = value
+    if amount is not None and currency:
+        return QuotationExtraction(amount, currency, LLM_QUOTATION_CONFIDENCE, "llm_cache" if cached else "llm")
+
+    return QuotationExtraction(None, None, 0.0, fast.path)
+
+
+def extract_quotation_info(text):
+    """
+    Extract quoted amount and currency from email text.
+    Returns (amount, currency); see extract_quotation for confidence and path.
+    """
+    extraction = extract_quotation(text)
+    return extraction.amount, extraction.currency
+
+
+def quotation_model():
+    """
+    (provider, model) used for quotation extraction; part of the cache key.
+    """
+    provider = getattr(settings, "CHAT_LLM_PROVIDER", "mistral")
+    model = settings.HF_MODEL if provider == "hf" else MISTRAL_MODEL
+    return provider, model
+
+
+def parse_primary_quotation(parsed):
+    """
+    (amount, currency) from the LLM's primary_quotation, or (None, None).
+    """
+    primary = parsed.get("primary_quotation")
+    if isinstance(primary, dict) and primary.get("amount") and primary.get("currency"):
+        try:
+            amount = Decimal(str(primary["amount"]).replace(',', ''))
+            currency = primary["currency"]
+            return amount, currency
+        except (ValueError, TypeError, ArithmeticError):
+            pass
+
+    return None, None
+
+
+def _llm_extract_quotation(text, provider):
+    """
+    One uncached extraction call. Raises on provider errors and malformed
+    output so that failures are never cached as "no quotation".
+    """
+    prompt = QUOTATION_PROMPT.format(email_text=text)
+
+    if provider == "mistral":
+        raw = mistral_complete(prompt, MISTRAL_MODEL)
+    elif provider == "hf":
+        result = hf_generate(
+            hf_model_url(settings.HF_MODEL),
+            prompt,
+            max_new_tokens=300,
+            timeout=HF_TIMEOUT_SECONDS
+        )
+        raw = result[0].get("generated_text", "")
+    else:
+        raise ValueError(f"Invalid LLM provider '{provider}' in settings.CHAT_LLM_PROVIDER")
+
+    parsed = parse_llm_response(raw)
+    if "primary_quotation" not in parsed:
+        raise ValueError("LLM returned no quotation JSON")
+
+    return parse_primary_quotation(parsed)
+
+
+def llm_extract_quotation_info(text):
+    """
+    Extract quoted amount and currency from email text using LLM service.
+    Results are cached by normalized text, prompt version and model, so
+    identical inputs never reach the model twice.
+    """
+    value, _ = _cached_llm_extract_quotation(text)
+    return value or (None, None)
+
+
+def _cached_llm_extract_quotation(text):
+    """
+    Returns ((amount, currency), served_from_cache); the value is None when
+    the LLM call failed.
+    """
+    if not text:
+        return (None, None), False
+
+    provider, model = quotation_model()
+    key = extraction_cache.make_key(quotation_content_hash(text), QUOTATION_PROMPT_VERSION, model)
+
+    hit, value = extraction_cache.get(key)
+    if hit:
+        return value, True
+
+    return _extract_and_store(text, key, provider), False
+
+
+def _extract_and_store(text, key, provider):
+    """
+    Uncached extraction, cached on success. Returns None when the call
+    failed; failures are not cached.
+    """
+    try:
+        value = _llm_extract_quotation(text, provider)
     except Exception as e:
         print(f"Error extracting quotation with LLM: {e}")
-        return None, None
+        return None
+
+    extraction_cache.store(key, value)
+    return value
+
+
+def _llm_extract_quotation_batch(items, provider):
+    """
+    One LLM call for several emails.
+
+    Args:
+        items (dict): item id (str) -> email text
+
+    Returns:
+        dict: item id -> (amount, currency) for every item the model answered
+        in a well-formed way. Missing or malformed items are left out so the
+        caller can retry just those.
+    """
+    emails = "\n\n".join(f"=== EMAIL {item_id} ===\n{text}" for item_id, text in items.items())
+    prompt = QUOTATION_BATCH_PROMPT.format(emails=emails)
+
+    if provider == "mistral":
+        raw = mistral_complete(prompt, MISTRAL_MODEL)
+    elif provider == "hf":
+        result = hf_generate(
+            hf_model_url(settings.HF_MODEL),
+            prompt,
+            max_new_tokens=120 * len(items)
+        )
+        raw = result[0].get("generated_text", "")
+    else:
+        raise ValueError(f"Invalid LLM provider '{provider}' in settings.CHAT_LLM_PROVIDER")
+
+    parsed = parse_llm_response(raw)
+
+    answers = {}
+    for entry in parsed.get("results") or []:
+        if not isinstance(entry, dict) or "primary_quotation" not in entry:
+            continue
+        if entry["primary_quotation"] is not None and not isinstance(entry["primary_quotation"], dict):
+            continue
+        item_id = str(entry.get("id"))
+        if item_id in items:
+            answers[item_id] = parse_primary_quotation(entry)
+
+    return answers
+
+
+def _cached_llm_extract_quotation_batch(texts):
+    """
+    LLM extraction for many emails at once. Cached bodies are answered from
+    the cache, identical bodies are sent once, the rest go out in batches of
+    QUOTATION_BATCH_SIZE, and only items a batch failed to answer are retried
+    one by one.
+
+    Args:
+        texts (dict): item id -> email text
+
+    Returns:
+        dict: item id -> ((amount, currency), served_from_cache), the value
+        None for items whose single retry failed as well
+    """
+    provider, model = quotation_model()
+    batch_size = max(1, getattr(settings, "QUOTATION_BATCH_SIZE", 8))
+
+    results = {}
+    pending = {}  # cache key -> (text, [item ids])
+
+    for item_id, text in texts.items():
+        if not text:
+            results[item_id] = ((None, None), False)
+            continue
+
+        key = extraction_cache.make_key(quotation_content_hash(text), QUOTATION_PROMPT_VERSION, model)
+        if key in pending:
+            pending[key][1].append(item_id)
+            continue
+
+        hit, value = extraction_cache.get(key)
+        if hit:
+            results[item_id] = (value, True)
+        else:
+            pending[key] = (text, [item_id])
+
+    keys = list(pending)
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+
+        answers = {}
+        if len(chunk) > 1:
+            try:
+                answers = _llm_extract_quotation_batch(
+                    {str(i): pending[key][0] for i, key in enumerate(chunk)},
+                    provider
+                )
+            except Exception as e:
+                print(f"Error extracting quotation batch with LLM: {e}")
+
+        for i, key in enumerate(chunk):
+            text, item_ids = pending[key]
+
+            if str(i) in answers:
+                value = answers[str(i)]
+                extraction_cache.store(key, value)
+            else:
+                value = _extract_and_store(text, key, provider)
+
+            for item_id in item_ids:
+                results[item_id] = (value, False)
+
+    return results
 
 
 def run_llm(message, draft_json):
     """
     Main entry point for all chat LLM calls.
-    Reads provider from settings.CHAT_LLM_PROVIDER.
+    With LLM_ROUTING on, the call goes through the provider router
+    (deadline, circuit breaker, failover, optional hedging); otherwise it
+    uses the single provider from settings.CHAT_LLM_PROVIDER.
     """
+    if llm_router.routing_enabled():
+        return _routed_chat(message, draft_json)
+
     provider = getattr(settings, "CHAT_LLM_PROVIDER", "mistral")
 
     if provider == "mistral":
@@ -265,3 +577,104 @@ def run_llm(message, draft_json):
         return hf_parse(message, draft_json)
 
     raise ValueError(f"Invalid LLM provider '{provider}' in settings.CHAT_LLM_PROVIDER")
+
+
+def _routed_chat(message, draft_json):
+    deadline = llm_router.call_deadline()
+    chat_calls = {"mistral": mistral_chat, "hf": hf_chat}
+
+    calls = {
+        provider: (lambda fn=chat_calls[provider]: fn(message, draft_json, timeout=deadline))
+        for provider in llm_router.configured_providers()
+        if provider in chat_calls
+    }
+
+    try:
+        _, result = llm_router.route(calls, deadline=deadline)
+        return result
+    except llm_router.LLMUnavailableError as e:
+        return _chat_error_result("router", e, draft_json)
+
+
+def mistral_parse_stream(message, draft_json, on_delta):
+    """
+    Streaming variant of mistral_parse.
+    on_delta(text) is called with each new piece of assistant_reply while the
+    completion is still arriving; the full response is parsed at the end.
+    """
+    prompt = build_rfp_prompt(message, draft_json)
+
+    reply_parser = ReplyStreamParser()
+    chunks = []
+
+    try:
+        for chunk in mistral_stream(prompt, MISTRAL_MODEL):
+            chunks.append(chunk)
+            delta = reply_parser.feed(chunk)
+            if delta:
+                on_delta(delta)
+
+        parsed = parse_llm_response("".join(chunks))
+
+        return {
+            "provider": "mistral",
+            "assistant_reply": parsed.get("assistant_reply", reply_parser.text or "I processed your message."),
+            "updated_json": resolve_updated_json(parsed, draft_json),
+            "missing_fields": parsed.get("missing_fields", []),
+            "raw": parsed
+        }
+    except Exception as e:
+        return {
+            "provider": "mistral",
+            "assistant_reply": f"I encountered an error: {str(e)}. Please try again.",
+            "updated_json": draft_json,
+            "missing_fields": [],
+            "raw": {"error": str(e)}
+        }
+
+
+def run_llm_stream(message, draft_json, on_delta):
+    """
+    Streaming entry point for chat LLM calls.
+    Same return value as run_llm. Providers without a streaming client
+    (HuggingFace inference API) deliver the whole reply as one delta.
+    """
+    provider = getattr(settings, "CHAT_LLM_PROVIDER", "mistral")
+
+    routing = llm_router.routing_enabled()
+    if routing:
+        # Stream only while Mistral is healthy; otherwise fail over without
+        # streaming. A stream that breaks after its first delta is not failed over.
+        health = llm_router.get_health("mistral")
+        if "mistral" in llm_router.configured_providers() and health.allow_request():
+            streamed = []
+
+            def track_delta(delta):
+                streamed.append(delta)
+                on_delta(delta)
+
+            started = time.monotonic()
+            result = mistral_parse_stream(message, draft_json, track_delta)
+            if "error" not in result["raw"]:
+                health.record_success(time.monotonic() - started)
+                return result
+
+            health.record_failure(time.monotonic() - started)
+            if streamed:
+                # The client already shows part of this reply; a fallback
+                # reply would be appended to it under the same turn
+                return result
+
+        result = _routed_chat(message, draft_json)
+        on_delta(result["assistant_reply"])
+        return result
+
+    if provider == "mistral":
+        return mistral_parse_stream(message, draft_json, on_delta)
+
+    if provider == "hf":
+        result = hf_parse(message, draft_json)
+        on_delta(result["assistant_reply"])
+        return result
+
+    raise ValueError(f"Invalid LLM provider '{provider}' in settings.CHAT_LLM_PROVIDER")
@@ -0,0 +1,205 @@
+"""
+Process-wide registry of LLM provider clients.
+
+Creating a Mistral client or a bare requests.post per call means a new
+connection (and TLS handshake) for every LLM call. The registry keeps one
+keep-alive pool per provider and per process. After a fork (gunicorn /
+uvicorn workers, management commands spawning workers) the child drops the
+inherited clients and lazily builds its own, so sockets are never shared
+between processes.
+"""
+import os
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from mistralai import Mistral
+from requests.adapters import HTTPAdapter
+
+_lock = threading.Lock()
+_clients = {}
+_owner_pid = os.getpid()
+
+
+def _reset_after_fork():
+    """
+    Forget clients inherited from the parent. They are not closed here:
+    the parent still owns those sockets.
+    """
+    global _lock, _clients, _owner_pid
+    _lock = threading.Lock()
+    _clients = {}
+    _owner_pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pooling_enabled():
+    return getattr(settings, "LLM_CLIENT_POOLING", True)
+
+
+def request_timeout():
+    """
+    (connect, read) timeout in seconds for LLM HTTP calls.
+    """
+    return (
+        getattr(settings, "LLM_CONNECT_TIMEOUT_SECONDS", 5),
+        getattr(settings, "LLM_TIMEOUT_SECONDS", 30),
+    )
+
+
+def _pool_size():
+    return getattr(settings, "LLM_POOL_MAXSIZE", 10)
+
+
+def _get_or_create(name, factory):
+    if os.getpid() != _owner_pid:
+        # Fork without register_at_fork support
+        _reset_after_fork()
+
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def _build_mistral_client(pooled=True):
+    connect_timeout, read_timeout = request_timeout()
+    kwargs = {
+        "api_key": settings.MISTRAL_API_KEY,
+        "timeout_ms": int(read_timeout * 1000),
+    }
+
+    server_url = getattr(settings, "MISTRAL_SERVER_URL", "")
+    if server_url:
+        kwargs["server_url"] = server_url
+
+    if pooled:
+        pool_size = _pool_size()
+        kwargs["client"] = httpx.Client(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=getattr(settings, "LLM_KEEPALIVE_SECONDS", 60),
+            ),
+        )
+
+    return Mistral(**kwargs)
+
+
+def _build_hf_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_pool_size())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {settings.HF_API_KEY}",
+        "Content-Type": "application/json",
+    })
+    return session
+
+
+def get_mistral_client():
+    """
+    Shared Mistral client backed by a keep-alive connection pool.
+    """
+    if not pooling_enabled():
+        return _build_mistral_client(pooled=False)
+    return _get_or_create("mistral", _build_mistral_client)
+
+
+def get_hf_session():
+    """
+    Shared requests.Session for the HuggingFace inference API.
+    """
+    if not pooling_enabled():
+        return _build_hf_session()
+    return _get_or_create("huggingface", _build_hf_session)
+
+
+def mistral_complete(prompt, model, timeout=None):
+    """
+    Single-prompt chat completion. Returns the message text; raises on failure.
+    timeout (seconds) overrides LLM_TIMEOUT_SECONDS for this call.
+    """
+    client = get_mistral_client()
+    response = client.chat.complete(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        timeout_ms=int(timeout * 1000) if timeout else None
+    )
+    return response.choices[0].message.content
+
+
+def mistral_stream(prompt, model):
+    """
+    Streaming chat completion. Yields text deltas as they arrive; raises on failure.
+    """
+    client = get_mistral_client()
+    with client.chat.stream(
+        model=model,
+        messages=[{"role": "user", "content": prompt}]
+    ) as events:
+        for event in events:
+            choices = event.data.choices
+            if not choices:
+                continue
+            content = choices[0].delta.content
+            if isinstance(content, str) and content:
+                yield content
+
+
+def hf_model_url(model):
+    """
+    Inference endpoint for a HuggingFace model. HF_INFERENCE_URL can point
+    at a local stand-in (see chat/services/llm_standin.py).
+    """
+    base_url = getattr(settings, "HF_INFERENCE_URL", "https://api-inference.huggingface.co")
+    return f"{base_url.rstrip('/')}/models/{model}"
+
+
+def hf_generate(url, prompt, max_new_tokens, timeout=None):
+    """
+    POST a text-generation request to the HF inference API.
+    Returns the decoded JSON body; raises on HTTP errors.
+    timeout (seconds) overrides the read timeout for this call.
+    """
+    connect_timeout, read_timeout = request_timeout()
+    session = get_hf_session()
+    response = session.post(
+        url,
+        json={
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": max_new_tokens}
+        },
+        timeout=(min(connect_timeout, timeout or connect_timeout), timeout or read_timeout)
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def close_clients():
+    """
+    Close pooled connections (used on shutdown and by benchmarks).
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        try:
+            if isinstance(client, Mistral):
+                if client.sdk_configuration.client is not None:
+                    client.sdk_configuration.client.close()
+            else:
+                client.close()
+        except Exception:
+            pass
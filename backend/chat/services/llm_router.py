@@ -0,0 +1,296 @@
+"""
+Routing across LLM providers: deadlines, circuit breaking, EWMA-based
+preference and optional hedging.
+
+Callers hand route() one zero-argument callable per provider. Providers
+are tried fastest-healthy-first (EWMA latency, ties broken by
+CHAT_LLM_PROVIDER). A provider whose breaker is open is skipped until its
+cool-down has passed; after that one trial call decides whether it closes
+again. With hedging on, a second provider is started once the first has
+run past its own p95 latency, and the first good answer wins. The whole
+call is bounded by a deadline, so a provider brownout costs at most that
+long instead of a hung request thread.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailableError(Exception):
+    """No provider produced an answer before the deadline."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ProviderHealth:
+    """
+    Latency statistics and breaker state for one provider.
+    Slow calls count as failures for the breaker, so a provider that
+    answers but too slowly is taken out of rotation as well.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.ewma_latency = None
+        self.samples = deque(maxlen=200)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def p95(self):
+        with self._lock:
+            if len(self.samples) < _setting("LLM_HEDGE_MIN_SAMPLES", 20):
+                return None
+            ordered = sorted(self.samples)
+        return ordered[max(0, int(len(ordered) * 0.95) - 1)]
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN:
+                cooldown = _setting("LLM_BREAKER_COOLDOWN_SECONDS", 30)
+                if time.monotonic() - self.opened_at < cooldown:
+                    return False
+                self.state = HALF_OPEN
+                self.trial_in_flight = False
+
+            # Half-open: let exactly one trial call through
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self, latency):
+        alpha = _setting("LLM_EWMA_ALPHA", 0.2)
+        slow = latency > _setting("LLM_BREAKER_SLOW_CALL_SECONDS", 15)
+
+        with self._lock:
+            self.samples.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+        if slow:
+            self._record_failure()
+        else:
+            with self._lock:
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                self.trial_in_flight = False
+
+    def record_failure(self, latency=None):
+        if latency is not None:
+            with self._lock:
+                # Failures still tell us how long the provider made us wait
+                self.samples.append(latency)
+        self._record_failure()
+
+    def _record_failure(self):
+        threshold = _setting("LLM_BREAKER_FAILURE_THRESHOLD", 5)
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+                "consecutive_failures": self.consecutive_failures,
+                "samples": len(self.samples),
+            }
+
+
+_health = {}
+_health_lock = threading.Lock()
+_executor = None
+
+
+def get_health(provider):
+    health = _health.get(provider)
+    if health is None:
+        with _health_lock:
+            health = _health.setdefault(provider, ProviderHealth(provider))
+    return health
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _health_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_setting("LLM_ROUTER_MAX_WORKERS", 16),
+                    thread_name_prefix="llm-router"
+                )
+    return _executor
+
+
+def routing_enabled():
+    return _setting("LLM_ROUTING", True)
+
+
+def call_deadline():
+    return _setting("LLM_CALL_DEADLINE_SECONDS", 20)
+
+
+def configured_providers():
+    """
+    Providers from LLM_PROVIDERS that have credentials, preferred one first.
+    """
+    preferred = _setting("CHAT_LLM_PROVIDER", "mistral")
+    keys = {"mistral": _setting("MISTRAL_API_KEY", ""), "hf": _setting("HF_API_KEY", "")}
+
+    providers = [p for p in _setting("LLM_PROVIDERS", ["mistral", "hf"]) if keys.get(p)]
+    if preferred in providers:
+        providers.remove(preferred)
+        providers.insert(0, preferred)
+    return providers
+
+
+def order_providers(providers):
+    """
+    Healthy providers by EWMA latency, then providers without latency
+    data yet (in config order), then providers whose breaker is open, as a
+    last resort.
+    """
+    def key(item):
+        index, provider = item
+        health = get_health(provider)
+        ewma = health.ewma_latency
+        return (health.state == OPEN, ewma if ewma is not None else float("inf"), index)
+
+    return [provider for _, provider in sorted(enumerate(providers), key=key)]
+
+
+def route(calls, deadline=None, hedge=None):
+    """
+    Run one logical LLM call across providers.
+
+    Args:
+        calls (dict): provider name -> zero-argument callable returning the
+            result and raising on failure. Insertion order is the fallback order.
+        deadline (float): seconds for the whole call (LLM_CALL_DEADLINE_SECONDS)
+        hedge (bool): start the next provider once the current one passes its p95,
+            or LLM_HEDGE_DEFAULT_DELAY_SECONDS before there is one (LLM_HEDGING)
+
+    Returns:
+        tuple: (provider name, result)
+
+    Raises:
+        LLMUnavailableError: every provider failed, was circuit-broken, or the
+        deadline passed first.
+    """
+    deadline = deadline if deadline is not None else call_deadline()
+    hedge = hedge if hedge is not None else _setting("LLM_HEDGING", False)
+    expires_at = time.monotonic() + deadline
+
+    pending_providers = deque(order_providers(list(calls)))
+    running = {}
+    errors = []
+
+    def start_next():
+        while pending_providers:
+            provider = pending_providers.popleft()
+            health = get_health(provider)
+            if not health.allow_request():
+                errors.append(f"{provider}: circuit open")
+                continue
+
+            started = time.monotonic()
+            future = _get_executor().submit(calls[provider])
+            running[future] = (provider, started)
+            return provider
+        return None
+
+    start_next()
+
+    while running:
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            break
+
+        timeout = remaining
+        if hedge and pending_providers and len(running) == 1:
+            (provider, started), = running.values()
+            # Until there are enough samples for a p95, hedge after a fixed delay
+            hedge_after = get_health(provider).p95() or _setting("LLM_HEDGE_DEFAULT_DELAY_SECONDS", 2)
+            timeout = max(0.0, min(remaining, started + hedge_after - time.monotonic()))
+
+        done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            if time.monotonic() < expires_at and hedge and pending_providers:
+                start_next()
+            continue
+
+        for future in done:
+            provider, started = running.pop(future)
+            latency = time.monotonic() - started
+            health = get_health(provider)
+            try:
+                result = future.result()
+            except Exception as e:
+                health.record_failure(latency)
+                errors.append(f"{provider}: {e}")
+                continue
+
+            health.record_success(latency)
+            _abandon(running)
+            return provider, result
+
+        if not running:
+            start_next()
+
+    # Deadline passed: calls still running are abandoned and count as failures
+    _abandon(running, deadline_passed=True)
+    for provider, _ in running.values():
+        errors.append(f"{provider}: no answer within {deadline}s")
+
+    raise LLMUnavailableError("; ".join(errors) or "no LLM provider configured")
+
+
+def _abandon(running, deadline_passed=False):
+    """
+    Stop waiting on calls that lost a hedge race or ran out of time.
+    Their outcome is still recorded when they eventually finish.
+    """
+    for future, (provider, started) in running.items():
+        if future.cancel():
+            continue
+
+        health = get_health(provider)
+        if deadline_passed:
+            health.record_failure(time.monotonic() - started)
+            continue
+
+        def record(f, health=health, started=started):
+            latency = time.monotonic() - started
+            if f.exception() is None:
+                health.record_success(latency)
+            else:
+                health.record_failure(latency)
+
+        future.add_done_callback(record)
+
+
+def health_snapshot():
+    """Current breaker state and EWMA latency per provider."""
+    return {provider: health.snapshot() for provider, health in list(_health.items())}
@@ -0,0 +1,383 @@
+"""
+Local stand-in for the LLM providers, for offline tests and benchmarks.
+
+Serves the two APIs the LLM layer calls:
+
+    POST /v1/chat/completions      Mistral chat completions (incl. "stream": true SSE)
+    POST /models/<org>/<model>     HuggingFace text-generation inference
+
+Point the app at it with MISTRAL_SERVER_URL=http://127.0.0.1:<port> and
+HF_INFERENCE_URL=http://127.0.0.1:<port>; start it with
+`python manage.py llm_standin`.
+
+Responses are rule-based by default: the prompt is recognised (chat turn,
+single or batched quotation extraction, email template) and answered in
+the format the app expects, using the deterministic quotation parser for
+amounts. A script file can override this with canned responses matched by
+regex. Latency, error rate and malformed-JSON injection are configurable
+and seeded so runs are reproducible.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chat.services.draft_patch import apply_draft_patch
+from chat.services.quotation_parser import fast_extract_quotation
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "exponential", "lognormal")
+
+_AMOUNT_WORDS = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k)?\b", re.IGNORECASE)
+_BATCH_EMAIL = re.compile(r"=== EMAIL (\S+) ===\n(.*?)(?=\n=== EMAIL \S+ ===\n|\Z)", re.DOTALL)
+_SINGLE_EMAIL = re.compile(r"Email text:\n(.*?)\n\s*\n\s*IMPORTANT:", re.DOTALL)
+_BUDGET = re.compile(r"budget[^\d$]*\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k)?", re.IGNORECASE)
+_DEADLINE = re.compile(r"(\d+)\s*days?", re.IGNORECASE)
+_ITEM = re.compile(r"\b(\d+)\s+([A-Za-z][A-Za-z-]+)")
+_DRAFT_MARKERS = ("Current RFP JSON:", "Take the existing RFP JSON:")
+
+
+@dataclass
+class StandInConfig:
+    """Behaviour knobs; the defaults answer instantly and never fail."""
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    latency_distribution: str = "fixed"
+    stream_chunk_chars: int = 8
+    stream_chunk_delay_ms: float = 0.0
+    error_rate: float = 0.0
+    malformed_rate: float = 0.0
+    seed: int = None
+    script: list = field(default_factory=list)
+
+
+class StandInBehaviour:
+    """Seeded random decisions shared by all request threads."""
+
+    def __init__(self, config):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._script = [
+            (re.compile(rule["match"], re.IGNORECASE | re.DOTALL), rule["response"])
+            for rule in config.script
+        ]
+
+    def _draw(self, fn):
+        with self._lock:
+            return fn(self._random)
+
+    def latency_seconds(self):
+        """
+        One latency sample. latency_ms is the mean (median for lognormal);
+        latency_jitter_ms is the half-width (uniform) or standard deviation
+        (normal) or the log-space sigma x 1000 (lognormal).
+        """
+        config = self.config
+        mean = config.latency_ms
+        jitter = config.latency_jitter_ms
+        dist = config.latency_distribution
+
+        if mean <= 0:
+            return 0.0
+        if dist == "uniform":
+            sample = self._draw(lambda r: r.uniform(mean - jitter, mean + jitter))
+        elif dist == "normal":
+            sample = self._draw(lambda r: r.gauss(mean, jitter))
+        elif dist == "exponential":
+            sample = self._draw(lambda r: r.expovariate(1.0 / mean))
+        elif dist == "lognormal":
+            sample = self._draw(lambda r: mean * r.lognormvariate(0.0, jitter / 1000.0))
+        else:
+            sample = mean
+        return max(0.0, sample) / 1000.0
+
+    def should_fail(self):
+        return self._draw(lambda r: r.random()) < self.config.error_rate
+
+    def failure_status(self):
+        return self._draw(lambda r: r.choice((429, 500, 503)))
+
+    def should_malform(self):
+        return self._draw(lambda r: r.random()) < self.config.malformed_rate
+
+    def malform(self, text):
+        """Break the JSON the way real models do: truncation, prose, or code fences."""
+        kind = self._draw(lambda r: r.randrange(3))
+        if kind == 0:
+            return text[: max(1, len(text) // 2)]
+        if kind == 1:
+            return "Sure! Here is the result:\n" + text.replace('"', "'", 2)
+        return "```json\n" + text + "\n```"
+
+    def respond(self, prompt):
+        for pattern, response in self._script:
+            if pattern.search(prompt):
+                text = response if isinstance(response, str) else json.dumps(response)
+                break
+        else:
+            text = rule_based_response(prompt)
+
+        if self.should_malform():
+            text = self.malform(text)
+        return text
+
+
+def _usd_amount(text):
+    """Largest amount in text as a USD string, or None."""
+    extraction = fast_extract_quotation(text)
+    if extraction.amount is not None:
+        return f"{extraction.amount:.2f}"
+
+    # Casual mentions without a currency ("can do 40k") are taken as USD
+    amounts = []
+    for number, k in _AMOUNT_WORDS.findall(text):
+        try:
+            value = float(number.replace(",", "")) * (1000 if k else 1)
+        except ValueError:
+            continue
+        if value >= 10:
+            amounts.append(value)
+    return f"{max(amounts):.2f}" if amounts else None
+
+
+def _primary_quotation(text):
+    amount = _usd_amount(text)
+    return {"amount": amount, "currency": "USD"} if amount else None
+
+
+def _embedded_draft(prompt):
+    for marker in _DRAFT_MARKERS:
+        index = prompt.find(marker)
+        if index >= 0:
+            start = prompt.find("{", index)
+            try:
+                draft, _ = json.JSONDecoder().raw_decode(prompt[start:])
+                return draft
+            except (ValueError, IndexError):
+                return {}
+    return {}
+
+
+def _user_message(prompt):
+    for marker in ("User message:", "Extract any NEW information from user message:"):
+        index = prompt.find(marker)
+        if index >= 0:
+            return prompt[index + len(marker):].split("\n", 1)[0].strip()
+    return ""
+
+
+def _chat_operations(message):
+    operations = []
+
+    budget = _BUDGET.search(message)
+    if budget:
+        value = float(budget.group(1).replace(",", "")) * (1000 if budget.group(2) else 1)
+        operations.append({"op": "set", "path": "budget", "value": value})
+
+    deadline = _DEADLINE.search(message)
+    if deadline:
+        operations.append({"op": "set", "path": "deadline_days", "value": int(deadline.group(1))})
+
+    if not budget:
+        for quantity, name in _ITEM.findall(message):
+            if name.lower().startswith("day"):
+                continue
+            operations.append({
+                "op": "append",
+                "path": "items",
+                "value": {"name": name.lower(), "quantity": int(quantity), "specs": {}}
+            })
+
+    return operations
+
+
+def _chat_response(prompt):
+    message = _user_message(prompt)
+    operations = _chat_operations(message)
+    reply = "Got it, I've updated the RFP." if operations else "Could you share more details about what you need?"
+
+    if "draft_patch" in prompt:
+        body = {"assistant_reply": reply, "draft_patch": operations}
+    else:
+        updated, _ = apply_draft_patch(_embedded_draft(prompt), operations)
+        body = {"assistant_reply": reply, "updated_json": updated}
+
+    body["missing_fields"] = [
+        name for name in ("project_title", "budget", "deadline_days", "items")
+        if name not in _embedded_draft(prompt) and not any(op["path"] == name for op in operations)
+    ]
+    return json.dumps(body)
+
+
+def rule_based_response(prompt):
+    """Answer a prompt in the format its caller expects."""
+    if "=== EMAIL" in prompt and '"results"' in prompt:
+        emails = prompt[prompt.find("=== EMAIL"):]
+        return json.dumps({
+            "results": [
+                {"id": item_id, "primary_quotation": _primary_quotation(text)}
+                for item_id, text in _BATCH_EMAIL.findall(emails)
+            ]
+        })
+
+    if "primary_quotation" in prompt:
+        match = _SINGLE_EMAIL.search(prompt)
+        primary = _primary_quotation(match.group(1) if match else "")
+        return json.dumps({"quotations": [primary] if primary else [], "primary_quotation": primary})
+
+    if "assistant_reply" in prompt:
+        return _chat_response(prompt)
+
+    if "template_body" in prompt or "subject" in prompt.lower():
+        return json.dumps({
+            "subject": "Request for Proposal",
+            "template_body": "Dear {{vendor_name}},\n\nPlease send us your best quotation for the attached requirements.\n\nBest regards,\n{{contact_person}}"
+        })
+
+    return json.dumps({"text": "ok"})
+
+
+def _completion_body(model, content, prompt):
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": uuid.uuid4().hex,
+        "object": "chat.completion",
+        "model": model,
+        "created": int(time.time()),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk_body(completion_id, model, content, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "model": model,
+        "created": int(time.time()),
+        "choices": [{
+            "index": 0,
+            "delta": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    behaviour = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return None
+
+    def do_POST(self):
+        body = self._read_json()
+        if body is None:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+
+        behaviour = self.behaviour
+        time.sleep(behaviour.latency_seconds())
+
+        if behaviour.should_fail():
+            status = behaviour.failure_status()
+            self._send_json(status, {"error": "injected failure", "status": status})
+            return
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._chat_completions(body)
+        elif path.startswith("/models/"):
+            self._hf_generate(body)
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def _chat_completions(self, body):
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+        model = body.get("model", "stand-in")
+        content = self.behaviour.respond(prompt)
+
+        if not body.get("stream"):
+            self._send_json(200, _completion_body(model, content, prompt))
+            return
+
+        config = self.behaviour.config
+        step = max(1, config.stream_chunk_chars)
+        completion_id = uuid.uuid4().hex
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        for start in range(0, len(content), step):
+            chunk = _chunk_body(completion_id, model, content[start:start + step])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if config.stream_chunk_delay_ms:
+                time.sleep(config.stream_chunk_delay_ms / 1000.0)
+
+        final = _chunk_body(completion_id, model, "", finish_reason="stop")
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _hf_generate(self, body):
+        # Completion only, as with return_full_text=False
+        content = self.behaviour.respond(str(body.get("inputs", "")))
+        self._send_json(200, [{"generated_text": content}])
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients giving up (deadlines, lost hedges) close the socket mid-response
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(host="127.0.0.1", port=8765, config=None):
+    """
+    Build (but don't start) a threaded stand-in server. Use
+    server.serve_forever() or run it in a thread for tests.
+    """
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {
+        "behaviour": StandInBehaviour(config or StandInConfig()),
+    })
+    return StandInServer((host, port), handler)
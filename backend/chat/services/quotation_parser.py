@@ -0,0 +1,231 @@
+"""
+Deterministic fast path for quotation extraction.
+
+Most vendor replies state their price plainly ("Our price is USD 12,500",
+"₹4.5 lakh", "$3k-$4k"). Those are parsed here with compiled regexes and
+only ambiguous emails (no candidate, or several different amounts) are
+sent to the LLM. Amounts are converted to USD with the same rates the LLM
+prompt uses, so both paths store comparable values.
+"""
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+QuotationExtraction = namedtuple(
+    "QuotationExtraction",
+    ["amount", "currency", "confidence", "path"]
+)
+
+# Mirrors the conversion table in the LLM quotation prompt
+USD_RATES = {
+    "USD": Decimal("1"),
+    "INR": Decimal("0.012"),
+    "CNY": Decimal("0.14"),
+    "EUR": Decimal("1.1"),
+    "GBP": Decimal("1.27"),
+    "JPY": Decimal("0.0067"),
+    "AED": Decimal("0.27"),
+    "CAD": Decimal("0.72"),
+    "AUD": Decimal("0.65"),
+}
+
+CURRENCY_ALIASES = {
+    "$": "USD", "us$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD",
+    "₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "rupee": "INR", "rupees": "INR",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "£": "GBP", "gbp": "GBP", "pound": "GBP", "pounds": "GBP",
+    "¥": "CNY", "cny": "CNY", "rmb": "CNY", "yuan": "CNY",
+    "jpy": "JPY", "yen": "JPY",
+    "aed": "AED", "dirham": "AED", "dirhams": "AED",
+    "c$": "CAD", "cad": "CAD",
+    "a$": "AUD", "aud": "AUD",
+}
+
+# A lone "m" is left out: "USD 10 m" is as likely metres or minutes as millions
+MULTIPLIERS = {
+    "k": Decimal("1000"),
+    "mn": Decimal("1000000"), "million": Decimal("1000000"),
+    "lakh": Decimal("100000"), "lakhs": Decimal("100000"),
+    "lac": Decimal("100000"), "lacs": Decimal("100000"),
+    "cr": Decimal("10000000"), "crore": Decimal("10000000"), "crores": Decimal("10000000"),
+}
+
+# 12 500 / 1 234,56 (space grouping) /
+# 1.234,56 / 1.234.567 (European grouping, decimal comma) /
+# 12,500 / 1,00,000 (Indian grouping) / 12500.50 / 4.5 / 12,50 (decimal comma)
+_GROUP_SPACE = "[ \u00a0\u202f]"
+_NUMBER = (
+    rf"\d{{1,3}}(?:{_GROUP_SPACE}\d{{3}})+(?:[.,]\d{{1,2}})?(?![\d.,])"
+    r"|\d{1,3}(?:\.\d{3})+,\d{1,2}(?!\d)|\d{1,3}(?:\.\d{3}){2,}(?![\d,])"
+    r"|\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:[.,]\d+)?"
+)
+_SUFFIX = r"k|mn|million|lakhs?|lacs?|crores?|cr"
+_SYMBOL = r"US\$|C\$|A\$|[$₹€£¥]"
+_CODE = r"USD|INR|EUR|GBP|CNY|RMB|JPY|AED|CAD|AUD|Rs\.?"
+_WORD = r"dollars?|rupees?|euros?|pounds?|yuan|yen|dirhams?"
+
+# Quantity or time units: "USD 10 m", "$100 - 200 units" and "$5/unit" may
+# not be the quoted total, so amounts followed by one go to the LLM
+_UNIT = (
+    r"m|units?|pcs|pc|pieces?|items?|nos|sets?|kgs?|g|mt|tons?|tonnes?|lbs?|km|cm|mm|ft|sq\.?\s*ft|sqft"
+    r"|meters?|metres?|liters?|litres?|l|hours?|hrs?|h|days?|weeks?|months?|years?|yrs?|each|ea|per"
+)
+UNIT_AFTER_PATTERN = re.compile(rf"\s*(?:/|(?:{_UNIT})\b)", re.IGNORECASE)
+
+
+def _amount(index):
+    return rf"(?P<num{index}>{_NUMBER})(?:\s*(?P<suf{index}>{_SUFFIX})\b)?"
+
+
+_RANGE_SEP = r"\s*(?:-|–|to)\s*"
+
+# "$12,500", "USD 12,500", "Rs. 4.5 lakh", "$3k - $4k", "€5000 to 8000"
+PREFIX_PATTERN = re.compile(
+    rf"(?<![\w$])(?P<cur>{_SYMBOL}|\b(?:{_CODE})(?![A-Za-z]))\s*{_amount(1)}"
+    rf"(?:{_RANGE_SEP}(?:{_SYMBOL}|(?:{_CODE})(?![A-Za-z]))?\s*{_amount(2)})?",
+    re.IGNORECASE
+)
+
+# "12,500 USD", "40k rupees", "5000-8000 USD"
+SUFFIX_PATTERN = re.compile(
+    rf"(?<![\w.,$₹€£¥]){_amount(1)}(?:{_RANGE_SEP}{_amount(2)})?\s*(?P<cur>\b(?:{_CODE}|{_WORD})\b)",
+    re.IGNORECASE
+)
+
+FAST_PATH_CONFIDENCE = 0.95
+RANGE_CONFIDENCE = 0.85
+FALLBACK_CONFIDENCE = 0.5
+
+
+class AmbiguousAmount(ValueError):
+    """
+    The amount allows two readings: its separators ("1.234": 1.234 or
+    1234), a unit after it ("USD 10 m") or differing units on a range.
+    """
+
+
+def _parse_number(number):
+    """
+    Read grouping and decimal separators. Space groups are dropped first
+    ("12 500,50" -> "12500,50"). Whichever of ',' and '.' comes
+    last is the decimal point when both appear; a lone separator followed
+    by exactly three digits is a thousands group, except for a single
+    '.' ("1.234"), which is ambiguous.
+    """
+    number = re.sub(_GROUP_SPACE, "", number)
+    if "," in number and "." in number:
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number:
+        groups = number.split(",")
+        if len(groups[-1]) == 3 or len(groups) > 2:
+            number = number.replace(",", "")
+        else:
+            number = number.replace(",", ".")
+    elif number.count(".") > 1:
+        number = number.replace(".", "")
+    elif "." in number and len(number.split(".")[1]) == 3 and not number.startswith("0"):
+        raise AmbiguousAmount(number)
+
+    return Decimal(number)
+
+
+def _to_decimal(number, suffix):
+    try:
+        value = _parse_number(number)
+    except InvalidOperation:
+        return None
+    if suffix:
+        value *= MULTIPLIERS[suffix.lower()]
+    return value
+
+
+def _normalize_currency(token):
+    return CURRENCY_ALIASES.get(token.strip().lower())
+
+
+def _to_usd(amount, currency):
+    return (amount * USD_RATES[currency]).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def find_quotation_candidates(text):
+    """
+    All currency-qualified amounts in the text as (usd_amount, is_range) pairs.
+    Ranges contribute their upper bound, matching the LLM's "largest amount" rule.
+
+    Raises:
+        AmbiguousAmount: an amount could be read two ways (see AmbiguousAmount)
+    """
+    candidates = []
+    taken = []
+
+    for pattern in (PREFIX_PATTERN, SUFFIX_PATTERN):
+        for match in pattern.finditer(text):
+            start, end = match.span()
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+
+            currency = _normalize_currency(match.group("cur"))
+            if not currency:
+                continue
+
+            if UNIT_AFTER_PATTERN.match(text, end):
+                raise AmbiguousAmount(match.group(0))
+
+            low = _to_decimal(match.group("num1"), match.group("suf1"))
+            high = None
+            if match.group("num2"):
+                # "3k - 4 lakh": ends in different units
+                multipliers = {
+                    MULTIPLIERS[match.group(group).lower()] for group in ("suf1", "suf2") if match.group(group)
+                }
+                if len(multipliers) > 1:
+                    raise AmbiguousAmount(match.group(0))
+                # "3-4k": the suffix on the upper bound applies to both
+                high = _to_decimal(match.group("num2"), match.group("suf2"))
+                if low is not None and not match.group("suf1") and match.group("suf2"):
+                    low = _to_decimal(match.group("num1"), match.group("suf2"))
+
+            amounts = [a for a in (low, high) if a is not None and a > 0]
+            if not amounts:
+                continue
+
+            taken.append((start, end))
+            candidates.append((_to_usd(max(amounts), currency), high is not None))
+
+    return candidates
+
+
+def fast_extract_quotation(text):
+    """
+    Deterministic extraction. Path is 'fast_path' when exactly one distinct
+    amount is found, 'no_candidate' when none is, and 'conflict' when there
+    are several or an amount is ambiguous - the caller should ask the LLM
+    for the last two. A conflict between several amounts carries the
+    largest one as a low-confidence hint.
+    """
+    if not text:
+        return QuotationExtraction(None, None, 0.0, "no_candidate")
+
+    try:
+        candidates = find_quotation_candidates(text)
+    except AmbiguousAmount:
+        # Let the LLM read the number in context
+        return QuotationExtraction(None, None, 0.0, "conflict")
+    if not candidates:
+        return QuotationExtraction(None, None, 0.0, "no_candidate")
+
+    distinct = {amount for amount, _ in candidates}
+    if len(distinct) > 1:
+        return QuotationExtraction(max(distinct), "USD", FALLBACK_CONFIDENCE, "conflict")
+
+    amount = distinct.pop()
+    is_range = any(is_range for _, is_range in candidates)
+    return QuotationExtraction(
+        amount,
+        "USD",
+        RANGE_CONFIDENCE if is_range else FAST_PATH_CONFIDENCE,
+        "fast_path"
+    )
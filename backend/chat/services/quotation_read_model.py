@@ -0,0 +1,214 @@
+"""
+Read model behind VendorQuotationsView.
+
+A page of respondents is assembled in a fixed number of queries however
+many vendors replied:
+
+1. the sent emails of the page, joined with their vendor and VendorScore
+   (select_related), ranked by ScoringService.rank_window() over the rows
+   after the cursor
+2. after a cursor, the scores before it (one aggregate), which turn
+   those page ranks into template-wide ranks
+3. their quotations with the inbound message timestamps (prefetch)
+4. the template-wide contacted / responded counts (one aggregate)
+
+Rows are ordered best score first, unscored vendors last, ties newest
+send first. Pages are keyset paginated on (final_score, id): pass
+next_cursor back as cursor. Without a limit every row is returned.
+
+render_json() then streams the response body row by row instead of
+building the whole document in one string.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, F, Prefetch, Q
+
+from chat.models import SentEmail, VendorQuotation
+from chat.services.scoring_service import ScoringService
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sent_email):
+    """
+    Cursor after sent_email: "<final_score>:<id>", score left empty when unscored.
+    """
+    vendor_score = getattr(sent_email, 'vendor_score', None)
+    score = '' if vendor_score is None else str(vendor_score.final_score)
+    return f"{score}:{sent_email.id}"
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (final_score Decimal or None, sent email id)
+
+    Raises:
+        ValueError: cursor was not made by encode_cursor()
+    """
+    score, separator, sent_email_id = cursor.partition(':')
+    if not separator:
+        raise ValueError("Invalid cursor")
+    try:
+        return (Decimal(score) if score else None), int(sent_email_id)
+    except InvalidOperation:
+        raise ValueError("Invalid cursor")
+
+
+def _after_cursor_q(cursor):
+    score, sent_email_id = decode_cursor(cursor)
+    unscored = Q(vendor_score__isnull=True)
+    if score is None:
+        return unscored & Q(id__lt=sent_email_id)
+    return (
+        Q(vendor_score__final_score__lt=score)
+        | Q(vendor_score__final_score=score, id__lt=sent_email_id)
+        | unscored
+    )
+
+
+def _rank_offsets(sent_emails, cursor):
+    """
+    What to add to a rank taken over the rows after cursor to get the
+    template-wide RANK(), as (for ties with the cursor's score, for lower
+    scores). Rows tied with the cursor rank first after it, so they are
+    offset by the scores strictly above; lower rows by every scored row
+    before the page.
+    """
+    if not cursor:
+        return 0, 0
+    score, sent_email_id = decode_cursor(cursor)
+    if score is None:
+        # Past the scored rows; nothing on the page has a rank to show
+        return 0, 0
+
+    counts = sent_emails.aggregate(
+        higher=Count('id', filter=Q(vendor_score__final_score__gt=score)),
+        tied_before=Count('id', filter=Q(vendor_score__final_score=score, id__gte=sent_email_id)),
+    )
+    return counts['higher'], counts['higher'] + counts['tied_before']
+
+
+def sent_email_page(template, cursor=None, limit=None):
+    """
+    One page of the template's sent emails in ranked order.
+
+    Args:
+        template (EmailTemplate): RFP template
+        cursor (str, optional): next_cursor of the previous page
+        limit (int, optional): Page size; None returns every row
+
+    Returns:
+        tuple: (list of SentEmail with vendor, vendor_score, quotations and
+        live_rank loaded, next_cursor or None)
+
+    Raises:
+        ValueError: Invalid cursor
+    """
+    respondents = SentEmail.objects.filter(template=template, status='sent')
+    tied_offset, lower_offset = _rank_offsets(respondents, cursor)
+
+    sent_emails = (
+        respondents
+        .select_related('vendor', 'vendor_score')
+        .order_by(F('vendor_score__final_score').desc(nulls_last=True), '-id')
+        .prefetch_related(
+            Prefetch('quotations', queryset=VendorQuotation.objects.select_related('email_message'))
+        )
+    )
+    if cursor:
+        sent_emails = sent_emails.filter(_after_cursor_q(cursor))
+    # The window runs after the cursor filter and before LIMIT: ranks
+    # among the rows from here on, shifted by _rank_offsets()
+    sent_emails = sent_emails.annotate(page_rank=ScoringService.rank_window('vendor_score__final_score'))
+
+    next_cursor = None
+    if limit is None:
+        rows = list(sent_emails)
+    else:
+        rows = list(sent_emails[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1])
+
+    cursor_score = decode_cursor(cursor)[0] if cursor else None
+    for row in rows:
+        vendor_score = getattr(row, 'vendor_score', None)
+        tied = vendor_score is not None and vendor_score.final_score == cursor_score
+        row.live_rank = row.page_rank + (tied_offset if tied else lower_offset)
+    return rows, next_cursor
+
+
+def template_counts(template):
+    """
+    Vendors contacted and vendors that replied at least once, in one query.
+    """
+    return SentEmail.objects.filter(template=template, status='sent').aggregate(
+        contacted=Count('id', distinct=True),
+        responded=Count('id', filter=Q(quotations__isnull=False), distinct=True),
+    )
+
+
+def vendor_row(sent_email):
+    """
+    Response dict for one sent email loaded by sent_email_page().
+    """
+    vendor_data = {
+        "vendor_id": sent_email.vendor.id,
+        "vendor_name": sent_email.vendor_name_at_time,
+        "vendor_email": sent_email.vendor_email_at_time,
+        "vendor_company": sent_email.vendor_company_at_time,
+        "email_sent_at": sent_email.sent_at.isoformat(),
+        "thread_id": sent_email.thread_id,
+        "quotations": []
+    }
+
+    for quotation in sent_email.quotations.all():
+        vendor_data["quotations"].append({
+            "id": quotation.id,
+            "message_id": quotation.email_message.message_id,
+            "subject": quotation.subject,
+            "body": quotation.body,
+            "quoted_amount": float(quotation.quoted_amount) if quotation.quoted_amount else None,
+            "currency": quotation.currency,
+            "received_at": quotation.received_at.isoformat(),
+            "is_reviewed": quotation.is_reviewed,
+            "notes": quotation.notes
+        })
+
+    # The reverse one-to-one is cached by select_related, None when unscored
+    vendor_score = getattr(sent_email, 'vendor_score', None)
+    if vendor_score is not None:
+        vendor_data["score"] = {
+            "final_score": float(vendor_score.final_score),
+            "rank": sent_email.live_rank,
+            "price_score": float(vendor_score.price_score),
+            "vendor_quality_score": float(vendor_score.vendor_quality_score),
+            "breakdown": {
+                "verification": float(vendor_score.verification_score),
+                "rating": float(vendor_score.rating_score),
+                "delivery": float(vendor_score.delivery_score),
+                "warranty": float(vendor_score.warranty_score),
+                "response": float(vendor_score.response_score)
+            }
+        }
+    else:
+        vendor_data["score"] = None
+
+    return vendor_data
+
+
+def render_json(header, rows, trailer):
+    """
+    Yield a JSON object in chunks: the keys of header, then
+    "vendors_with_quotations" one row (vendor_row() dict) at a time, then
+    the keys of trailer. Rows are built before streaming starts, so errors
+    surface in the view rather than in a truncated body.
+    """
+    yield json.dumps(header)[:-1]
+    yield ', "vendors_with_quotations": ['
+    for index, row in enumerate(rows):
+        yield (", " if index else "") + json.dumps(row)
+    yield "], " + json.dumps(trailer)[1:]
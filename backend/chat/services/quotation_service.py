@@ -7,7 +7,11 @@ from gmail_service.services.gmail import GmailService
 from gmail_service.views import SyncSingleThreadView
 from django.http import HttpRequest
 from rest_framework.request import Request
-from chat.services.llm import extract_quotation_info
+from chat.services.llm import (
+    QUOTATION_EXTRACTOR_VERSION,
+    extract_quotations,
+    quotation_content_hash,
+)
 
 
 class QuotationService:
@@ -60,18 +64,24 @@ class QuotationService:
                 id__in=VendorQuotation.objects.values_list('email_message_id', flat=True)
             )
             
-            new_quotations = 0
-            
+            pending = []
             for message in inbound_messages:
                 # Get message content from Gmail if not stored locally
                 subject, body = QuotationService.get_message_content(
                     sent_email.sender, 
                     message.message_id
                 )
-                
-                # Extract quotation info using LLM service
-                
-                quoted_amount, currency = extract_quotation_info(f"{subject} {body}")
+                pending.append((message, subject, body, f"{subject} {body}"))
+
+            # Extract all replies together (fast path first, batched LLM fallback)
+            extractions = extract_quotations({
+                str(index): content for index, (_, _, _, content) in enumerate(pending)
+            })
+
+            new_quotations = 0
+
+            for index, (message, subject, body, content) in enumerate(pending):
+                extraction = extractions[str(index)]
                 
                 # Create quotation record
                 VendorQuotation.objects.create(
@@ -79,8 +89,13 @@ class QuotationService:
                     email_message=message,
                     subject=subject,
                     body=body,
-                    quoted_amount=quoted_amount,
-                    currency=currency
+                    quoted_amount=extraction.amount,
+                    currency=extraction.currency,
+                    extraction_confidence=extraction.confidence,
+                    extraction_path=extraction.path,
+                    extraction_hash=quotation_content_hash(content),
+                    extractor_version=QUOTATION_EXTRACTOR_VERSION,
+                    extracted_at=timezone.now()
                 )
                 
                 new_quotations += 1
@@ -0,0 +1,253 @@
+"""
+Per-group replay buffer for WebSocket resume.
+
+The broadcaster stamps every message it sends with an event_seq that
+increases per chat group and appends the packed message to a bounded,
+TTL-expiring buffer (CHAT_REPLAY_BUFFER_SIZE messages, CHAT_REPLAY_TTL_SECONDS).
+A client that reconnects with ?last_seq=N gets the buffered messages
+after N replayed before live traffic, instead of refetching history.
+Clients can also ack the last event_seq they rendered under a client id;
+the ack is kept with the buffer (same TTL) and is where a reconnect with
+?client_id= but no last_seq resumes from.
+Only the messages expire; the per-group counter is kept, so event_seq
+keeps increasing across idle periods.
+
+With the Redis channel layer the buffer lives in Redis next to it, so any
+process can replay what another process broadcast:
+
+    chat_replay:<group>:seq   counter (INCRBY)
+    chat_replay:<group>       sorted set, member = packed message, score = event_seq
+    chat_replay:<group>:ack:<client_id>   last acked event_seq
+
+With the in-memory layer (single node, tests) it is an LRU of at most
+CHAT_REPLAY_MAX_GROUPS groups, each a counter and a deque. A group evicted
+from the LRU restarts its counter above every counter evicted before it,
+so connected clients never mistake new events for ones they have seen,
+and reconnecting clients get resync_required.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+
+import msgpack
+from cachetools import LRUCache
+from django.conf import settings
+
+_lock = threading.Lock()
+_buffer = None
+
+
+def _buffer_size():
+    return getattr(settings, "CHAT_REPLAY_BUFFER_SIZE", 200)
+
+
+def _ttl():
+    return getattr(settings, "CHAT_REPLAY_TTL_SECONDS", 300)
+
+
+def _max_groups():
+    return getattr(settings, "CHAT_REPLAY_MAX_GROUPS", 10000)
+
+
+def replay_enabled():
+    return getattr(settings, "CHAT_REPLAY_BUFFER", True)
+
+
+class _GroupCache(LRUCache):
+    """
+    LRU of group entries that remembers the highest event_seq it evicted.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.evicted_seq = 0
+
+    def popitem(self):
+        group, entry = super().popitem()
+        self.evicted_seq = max(self.evicted_seq, entry["seq"])
+        return group, entry
+
+
+class MemoryReplayBuffer:
+    """
+    In-process buffer. Events and acks older than the TTL are dropped on
+    access; the per-group counter stays until the group is evicted from
+    the LRU, so event_seq never goes backwards.
+    """
+
+    def __init__(self):
+        self._groups = _GroupCache(_max_groups())
+        self._lock = threading.Lock()
+
+    def _entry(self, group, now):
+        entry = self._groups.get(group)
+        if entry is None:
+            entry = self._groups[group] = {
+                "seq": self._groups.evicted_seq,
+                "events": deque(maxlen=_buffer_size()),
+                "acks": {},
+                "touched": now,
+            }
+        return entry
+
+    def _expire(self, group, now):
+        entry = self._groups.get(group)
+        if entry and now - entry["touched"] > _ttl():
+            entry["events"].clear()
+            entry["acks"].clear()
+
+    async def append(self, group, messages):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(group, now)
+            entry = self._entry(group, now)
+            seq = entry["seq"]
+            stamped = []
+            for message in messages:
+                seq += 1
+                stamped.append({**message, "event_seq": seq})
+            entry["seq"] = seq
+            entry["events"].extend(stamped)
+            entry["touched"] = now
+        return stamped
+
+    async def read(self, group, after_seq):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(group, now)
+            entry = self._groups.get(group)
+            # An unknown or evicted group reads as counter 0, so any
+            # last_seq a client still holds is treated as lost
+            seq = entry["seq"] if entry else 0
+            events = list(entry["events"]) if entry else []
+            oldest = events[0]["event_seq"] if events else seq + 1
+            return seq, oldest, [m for m in events if m["event_seq"] > after_seq]
+
+    async def ack(self, group, client_id, event_seq):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(group, now)
+            acks = self._entry(group, now)["acks"]
+            acks[client_id] = max(event_seq, acks.get(client_id, 0))
+
+    async def acked_seq(self, group, client_id):
+        with self._lock:
+            self._expire(group, time.monotonic())
+            entry = self._groups.get(group)
+            return entry["acks"].get(client_id) if entry else None
+
+
+class RedisReplayBuffer:
+    """
+    Buffer shared by all processes through Redis. One client per event
+    loop, since redis.asyncio connections are bound to the loop they were
+    opened on (the broadcaster thread and the ASGI server have their own).
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        import redis.asyncio as redis
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = redis.Redis.from_url(self.url)
+        return client
+
+    @staticmethod
+    def _keys(group):
+        return f"chat_replay:{group}", f"chat_replay:{group}:seq"
+
+    async def append(self, group, messages):
+        client = self._client()
+        buffer_key, seq_key = self._keys(group)
+        ttl = _ttl()
+
+        last = await client.incrby(seq_key, len(messages))
+        first = last - len(messages) + 1
+        stamped = [{**message, "event_seq": first + offset} for offset, message in enumerate(messages)]
+
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zadd(buffer_key, {
+                msgpack.packb(message, use_bin_type=True): message["event_seq"] for message in stamped
+            })
+            pipe.zremrangebyrank(buffer_key, 0, -(_buffer_size() + 1))
+            # Only the events expire; the counter must never restart, or
+            # connected clients would drop new events as already seen
+            pipe.expire(buffer_key, ttl)
+            await pipe.execute()
+        return stamped
+
+    async def read(self, group, after_seq):
+        client = self._client()
+        buffer_key, seq_key = self._keys(group)
+
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.get(seq_key)
+            pipe.zrange(buffer_key, 0, 0, withscores=True)
+            pipe.zrangebyscore(buffer_key, f"({after_seq}", "+inf")
+            last, oldest, packed = await pipe.execute()
+
+        last = int(last or 0)
+        oldest = int(oldest[0][1]) if oldest else last + 1
+        return last, oldest, [msgpack.unpackb(item, raw=False) for item in packed]
+
+    async def ack(self, group, client_id, event_seq):
+        buffer_key, _ = self._keys(group)
+        await self._client().set(f"{buffer_key}:ack:{client_id}", event_seq, ex=_ttl())
+
+    async def acked_seq(self, group, client_id):
+        buffer_key, _ = self._keys(group)
+        value = await self._client().get(f"{buffer_key}:ack:{client_id}")
+        return int(value) if value is not None else None
+
+
+def get_replay_buffer():
+    global _buffer
+    if _buffer is None:
+        with _lock:
+            if _buffer is None:
+                if getattr(settings, "CHANNEL_LAYER_BACKEND", "redis") == "memory":
+                    _buffer = MemoryReplayBuffer()
+                else:
+                    _buffer = RedisReplayBuffer(settings.CHANNEL_REDIS_URL)
+    return _buffer
+
+
+async def replay_since(group, last_seq):
+    """
+    Buffered messages for group after last_seq.
+
+    Returns:
+        tuple: (messages, complete) where complete is False when some
+        missed messages already fell out of the buffer or expired (or the
+        counter was lost), so the client has to resync from history instead.
+    """
+    last, oldest, messages = await get_replay_buffer().read(group, last_seq)
+
+    if last_seq > last:
+        # Counter lost (Redis flushed or the process restarted); nothing
+        # buffered can be trusted as "after"
+        return messages, False
+    complete = last_seq >= oldest - 1
+    return messages, complete
+
+
+async def ack(group, client_id, event_seq):
+    """
+    Record that client_id has rendered every broadcast of group up to event_seq.
+    """
+    await get_replay_buffer().ack(group, client_id, event_seq)
+
+
+async def acked_seq(group, client_id):
+    """
+    Last event_seq acked by client_id in group, or None when it never
+    acked or the ack expired with the buffer.
+    """
+    return await get_replay_buffer().acked_seq(group, client_id)
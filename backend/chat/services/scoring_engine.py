@@ -0,0 +1,353 @@
+"""
+Batch scoring engine used by ScoringService.calculate_scores_for_template.
+
+Scores a whole RFP template at once instead of vendor by vendor:
+
+1. load_template_inputs() reads every sent email with its vendor's quality
+   snapshot (vendors.quality) in one query and the latest quotation per
+   sent email in a second one.
+2. compute_scores() evaluates each component, the quality and final
+   scores and the rank as NumPy array operations.
+3. to_decimal_rows() turns the arrays back into Decimal values only when
+   they are about to be persisted.
+
+The formulas are the ones in ScoringService.calculate_*; components are
+rounded to 2 decimals before they are combined, as there.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+import numpy as np
+
+from chat.models import SentEmail, VendorQuotation, VendorScore
+from vendors import quality
+
+COMPONENTS = (
+    'price_score',
+    'verification_score',
+    'rating_score',
+    'delivery_score',
+    'warranty_score',
+    'response_score',
+)
+
+SCORE_FIELDS = COMPONENTS + ('vendor_quality_score', 'final_score')
+
+# Quality components in the order of ScoringService's *_WEIGHT constants
+QUALITY_COMPONENTS = (
+    'verification_score',
+    'rating_score',
+    'delivery_score',
+    'warranty_score',
+    'response_score',
+)
+
+
+@dataclass
+class ScoringInputs:
+    """
+    Column arrays for the sent emails of one template, one row per sent email.
+    The vendor components come from the vendor quality snapshot.
+    Missing quotations have NaN quoted_amount / response_hours.
+    """
+    sent_email_ids: np.ndarray
+    verification_score: np.ndarray
+    rating_score: np.ndarray
+    delivery_score: np.ndarray
+    quoted_amount: np.ndarray
+    response_hours: np.ndarray
+
+    def __len__(self):
+        return len(self.sent_email_ids)
+
+
+def load_template_inputs(template, sent_email_ids=None):
+    """
+    Read everything needed to score a template in two queries.
+    Rows keep SentEmail's default ordering (-sent_at), which decides ties in rank.
+    Pass sent_email_ids to load only those rows (incremental rescoring).
+    """
+    sent_emails = SentEmail.objects.filter(template=template, status='sent')
+    quotations_qs = VendorQuotation.objects.filter(sent_email__template=template, sent_email__status='sent')
+    if sent_email_ids is not None:
+        sent_emails = sent_emails.filter(id__in=sent_email_ids)
+        quotations_qs = quotations_qs.filter(sent_email_id__in=sent_email_ids)
+
+    rows = list(
+        sent_emails.values_list(
+            'id',
+            'sent_at',
+            'vendor__quality_verification_score',
+            'vendor__quality_rating_score',
+            'vendor__quality_delivery_score',
+            'vendor__quality_version',
+            *[f'vendor__{field}' for field in quality.SOURCE_FIELDS],
+        )
+    )
+
+    # Latest quotation per sent email (VendorQuotation's default ordering)
+    quotations = {}
+    for sent_email_id, amount, received_at in (
+        quotations_qs.order_by('sent_email_id', '-email_message__timestamp')
+        .values_list('sent_email_id', 'quoted_amount', 'email_message__timestamp')
+    ):
+        quotations.setdefault(sent_email_id, (amount, received_at))
+
+    count = len(rows)
+    quoted_amount = np.full(count, np.nan)
+    response_hours = np.full(count, np.nan)
+
+    for index, row in enumerate(rows):
+        quotation = quotations.get(row[0])
+        if quotation is None:
+            continue
+        amount, received_at = quotation
+        if amount is not None:
+            quoted_amount[index] = float(amount)
+        if row[1] and received_at:
+            response_hours[index] = (received_at - row[1]).total_seconds() / 3600
+
+    components = np.empty((count, 3))
+    for index, row in enumerate(rows):
+        if row[5] == quality.QUALITY_SNAPSHOT_VERSION:
+            components[index] = row[2:5]
+        else:
+            # Snapshot missing or from an older formula version
+            email_verified, phone_verified, business_verified, rating, delivery = row[6:11]
+            components[index] = (
+                quality.verification_score(email_verified, phone_verified, business_verified),
+                quality.rating_score(rating),
+                quality.delivery_score(delivery),
+            )
+
+    return ScoringInputs(
+        sent_email_ids=np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        verification_score=components[:, 0],
+        rating_score=components[:, 1],
+        delivery_score=components[:, 2],
+        quoted_amount=quoted_amount,
+        response_hours=response_hours,
+    )
+
+
+# Largest cent amounts for which the exact integer path cannot overflow int64
+_MAX_EXACT_CENTS = 10 ** 14
+
+
+def _div_round_half_even(numerator, denominator):
+    """
+    numerator / denominator rounded half-to-even, on int64 arrays, the way
+    Decimal rounds (round(Decimal, 2)). Float math would put exact ties
+    like 7.415 on either side.
+    """
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice = remainder * 2
+    round_up = (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def _to_cents(values):
+    return np.rint(values * 100).astype(np.int64)
+
+
+def price_scores(quoted_amount, budget):
+    budget = Decimal(str(budget or 0))
+    if budget <= 0:
+        return np.zeros_like(quoted_amount)
+
+    # NaN (no quotation) and 0 score 0, like calculate_price_score
+    quoted = np.nan_to_num(quoted_amount, nan=0.0)
+    budget_cents = budget * 100
+
+    if budget_cents == budget_cents.to_integral_value() and max(
+        int(budget_cents), float(np.abs(quoted).max(initial=0)) * 100
+    ) < _MAX_EXACT_CENTS:
+        # Exact: score in cents = (budget - quoted) * 10000 / budget, rounded half-even
+        budget_cents = int(budget_cents)
+        quoted_cents = _to_cents(quoted)
+        within = _div_round_half_even((budget_cents - quoted_cents) * 10000, budget_cents)
+        over = np.maximum(0, _div_round_half_even(
+            5000 * budget_cents - (quoted_cents - budget_cents) * 10000, budget_cents
+        ))
+        scores = np.where(quoted_cents <= budget_cents, within, over) / 100
+    else:
+        budget = float(budget)
+        within = (budget - quoted) / budget * 100
+        over = np.maximum(0, 50 - (quoted - budget) / budget * 100)
+        scores = np.round(np.where(quoted <= budget, within, over), 2)
+
+    return np.where(quoted != 0, scores, 0.0)
+
+
+def warranty_scores(count, warranty_years=None):
+    if not warranty_years:
+        return np.full(count, 50.0)
+    years = float(warranty_years)
+    score = 100.0 if years >= 3 else 75.0 if years >= 2 else 50.0 if years >= 1 else 25.0
+    return np.full(count, score)
+
+
+def response_scores(response_hours):
+    hours = response_hours
+    scores = np.select(
+        [hours <= 24, hours <= 48, hours <= 72],
+        [100.0, 80.0, 60.0],
+        default=np.maximum(40, 100 - (hours / 24) * 5),
+    )
+    return np.round(np.where(np.isnan(hours), 50.0, scores), 2)
+
+
+def _weight_scale(weights):
+    """
+    Power of ten that turns every weight into an integer, or None when the
+    weights have too many decimals for exact int64 math.
+    """
+    places = max((-Decimal(str(weight)).normalize().as_tuple().exponent for weight in weights), default=0)
+    places = max(places, 0)
+    return 10 ** places if places <= 9 else None
+
+
+def quality_scores(components, weights):
+    """
+    Weighted sum of the (rows x 5) quality component matrix, rounded to 2
+    decimals. Components are 2-decimal values and weights short decimals,
+    so the sum is computed exactly in integers and rounded half-even, as
+    calculate_vendor_quality_score does with Decimal.
+    """
+    scale = _weight_scale(weights)
+    if scale is None:
+        return np.round(components @ np.asarray(weights, dtype=np.float64), 2)
+
+    integer_weights = np.array([int(Decimal(str(weight)) * scale) for weight in weights], dtype=np.int64)
+    total = _to_cents(components) @ integer_weights
+    return _div_round_half_even(total, scale) / 100
+
+
+def compute_scores(inputs, budget, quality_weights, warranty_years=None):
+    """
+    Score every row of inputs.
+
+    Args:
+        inputs (ScoringInputs): columns from load_template_inputs()
+        budget (Decimal): RFP budget
+        quality_weights (sequence): weights for QUALITY_COMPONENTS
+        warranty_years (float, optional): warranty period offered
+
+    Returns:
+        dict: field name -> float array for SCORE_FIELDS, plus 'rank' (int array, 1 = best)
+    """
+    count = len(inputs)
+
+    scores = {
+        'price_score': price_scores(inputs.quoted_amount, budget),
+        'verification_score': inputs.verification_score,
+        'rating_score': inputs.rating_score,
+        'delivery_score': inputs.delivery_score,
+        'warranty_score': warranty_scores(count, warranty_years),
+        'response_score': response_scores(inputs.response_hours),
+    }
+
+    scores['vendor_quality_score'] = quality_scores(
+        np.column_stack([scores[name] for name in QUALITY_COMPONENTS]) if count else np.empty((0, 5)),
+        quality_weights,
+    )
+    # 50% price + 50% quality, half-even on exact cents like calculate_final_score
+    scores['final_score'] = _div_round_half_even(
+        _to_cents(scores['price_score']) + _to_cents(scores['vendor_quality_score']), 2
+    ) / 100
+
+    scores['rank'] = rank_scores(scores['final_score'])
+    return scores
+
+
+def rank_scores(final_scores):
+    """
+    1-based rank per row, highest score first. The sort is stable, so equal
+    scores keep input order (-sent_at from load_template_inputs).
+    """
+    order = np.argsort(-_to_cents(np.asarray(final_scores, dtype=np.float64)), kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(1, len(order) + 1)
+    return rank
+
+
+def to_decimal_rows(inputs, scores):
+    """
+    Yield (sent_email_id, field values) per row, scores as 2-decimal Decimals.
+    Scores take few distinct values (0.00-100.00), so each Decimal is built once.
+    """
+    decimals = {}
+
+    def to_decimal(cents):
+        value = decimals.get(cents)
+        if value is None:
+            value = decimals[cents] = Decimal(cents).scaleb(-2)
+        return value
+
+    columns = {name: _to_cents(scores[name]).tolist() for name in SCORE_FIELDS}
+    ranks = scores['rank'].tolist()
+
+    for index, sent_email_id in enumerate(inputs.sent_email_ids.tolist()):
+        values = {name: to_decimal(columns[name][index]) for name in SCORE_FIELDS}
+        values['rank'] = ranks[index]
+        yield sent_email_id, values
+
+
+@dataclass
+class StoredComponents:
+    """
+    Component scores already stored in VendorScore for one template,
+    the input of what-if scoring. components columns follow COMPONENTS.
+    """
+    sent_email_ids: np.ndarray
+    vendor_names: list
+    stored_ranks: list
+    components: np.ndarray
+
+    def __len__(self):
+        return len(self.sent_email_ids)
+
+
+def load_stored_components(template):
+    """
+    Read the stored component scores of a template in one query, in the
+    tie-break order of the scoring run (-sent_at).
+    """
+    rows = list(
+        VendorScore.objects.filter(template=template)
+        .order_by('-sent_email__sent_at')
+        .values_list('sent_email_id', 'sent_email__vendor_name_at_time', 'rank', *COMPONENTS)
+    )
+    count = len(rows)
+    components = np.empty((count, len(COMPONENTS)))
+    for index, row in enumerate(rows):
+        components[index] = row[3:]
+
+    return StoredComponents(
+        sent_email_ids=np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        vendor_names=[row[1] for row in rows],
+        stored_ranks=[row[2] for row in rows],
+        components=components,
+    )
+
+
+def what_if_scores(stored, quality_weights, price_shares):
+    """
+    Final scores for several weightings at once.
+
+    Args:
+        stored (StoredComponents): from load_stored_components()
+        quality_weights (array): k x 5 weights for QUALITY_COMPONENTS
+        price_shares (array): k price shares; quality gets 1 - share
+
+    Returns:
+        tuple: (quality scores, final scores), each rows x k
+    """
+    quality_weights = np.asarray(quality_weights, dtype=np.float64)
+    price_shares = np.asarray(price_shares, dtype=np.float64)
+
+    price = stored.components[:, :1]
+    quality_columns = [COMPONENTS.index(name) for name in QUALITY_COMPONENTS]
+    quality_values = np.round(stored.components[:, quality_columns] @ quality_weights.T, 2)
+    final = np.round(price * price_shares + quality_values * (1 - price_shares), 2)
+    return quality_values, final
@@ -1,7 +1,12 @@
 from decimal import Decimal
 from datetime import datetime
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When, Window
+from django.db.models.functions import Cast, Rank
 from django.utils import timezone
 from chat.models import VendorScore, SentEmail, VendorQuotation
+from chat.services import scoring_engine
+from vendors import quality
 from vendors.models import Vendor
 
 
@@ -17,6 +22,9 @@ class ScoringService:
     DELIVERY_WEIGHT = 0.143      # 10/70
     WARRANTY_WEIGHT = 0.143      # 10/70
     RESPONSE_WEIGHT = 0.071      # 5/70
+
+    # Same weights in scoring_engine.QUALITY_COMPONENTS order
+    QUALITY_WEIGHTS = (VERIFICATION_WEIGHT, RATING_WEIGHT, DELIVERY_WEIGHT, WARRANTY_WEIGHT, RESPONSE_WEIGHT)
     
     @staticmethod
     def calculate_price_score(quoted_price, budget):
@@ -57,16 +65,11 @@ class ScoringService:
         Returns:
             Decimal: Verification score (0-100)
         """
-        score = Decimal('0.00')
-        
-        if vendor.is_email_verified:
-            score += Decimal('33.33')
-        if vendor.is_phone_verified:
-            score += Decimal('33.33')
-        if vendor.is_business_verified:
-            score += Decimal('33.34')
-        
-        return score
+        return quality.verification_score(
+            vendor.is_email_verified,
+            vendor.is_phone_verified,
+            vendor.is_business_verified
+        )
     
     @staticmethod
     def calculate_rating_score(vendor):
@@ -79,10 +82,7 @@ class ScoringService:
         Returns:
             Decimal: Rating score (0-100)
         """
-        # Convert 1-5 rating to 0-100 scale
-        rating = Decimal(str(vendor.overall_rating))
-        score = (rating / Decimal('5.00')) * 100
-        return Decimal(str(round(score, 2)))
+        return quality.rating_score(vendor.overall_rating)
     
     @staticmethod
     def calculate_delivery_score(vendor):
@@ -95,7 +95,7 @@ class ScoringService:
         Returns:
             Decimal: Delivery score (0-100)
         """
-        return Decimal(str(vendor.on_time_delivery_rate))
+        return quality.delivery_score(vendor.on_time_delivery_rate)
     
     @staticmethod
     def calculate_warranty_score(warranty_years):
@@ -242,6 +242,69 @@ class ScoringService:
             'final_score': final_score
         }
     
+    @staticmethod
+    def ranked_scores(template=None):
+        """
+        VendorScores with live_rank computed by the database at read time
+        (RANK() over final_score, per template), so ranks are never stale
+        after an incremental rescore. Equal scores share a rank.
+
+        Args:
+            template (EmailTemplate, optional): Limit to one template
+
+        Returns:
+            QuerySet: VendorScore rows annotated with live_rank
+        """
+        queryset = VendorScore.objects.all()
+        if template is not None:
+            queryset = queryset.filter(template=template)
+
+        return queryset.annotate(
+            live_rank=ScoringService.rank_window(partition_by=[F('template')])
+        ).order_by('template_id', 'live_rank')
+
+    @staticmethod
+    def rank_window(score='final_score', partition_by=None):
+        """
+        RANK() over a final_score column, best first and unscored rows
+        last. Every live rank (ranked_scores, the vendor quotations read
+        model) is computed with this window.
+
+        Args:
+            score (str): Path to the final_score column
+            partition_by (list, optional): Expressions to rank within
+
+        Returns:
+            Window: Expression to annotate with
+        """
+        order = F(score)
+        if connection.vendor == 'sqlite':
+            # Django 4.2 emits invalid SQL on SQLite for a DecimalField in a
+            # window ORDER BY; the float cast avoids that and ranks the same
+            order = Cast(score, FloatField())
+
+        return Window(
+            expression=Rank(),
+            partition_by=partition_by,
+            order_by=order.desc(nulls_last=True),
+        )
+
+    @classmethod
+    def top_scores(cls, templates, k):
+        """
+        Best k VendorScores of each template, served from the
+        (template, final_score) index.
+
+        Args:
+            templates (iterable): EmailTemplate instances or IDs
+            k (int): Rows per template (ties at the cut-off are all kept)
+
+        Returns:
+            QuerySet: VendorScore rows annotated with live_rank
+        """
+        template_ids = [getattr(template, 'id', template) for template in templates]
+        return cls.ranked_scores().filter(template_id__in=template_ids, live_rank__lte=k)
+
     @classmethod
     def calculate_scores_for_template(cls, template, budget):
         """
@@ -254,30 +317,92 @@ class ScoringService:
         Returns:
             list: Created/updated VendorScore instances
         """
-        # Get all sent emails with quotations for this template
-        sent_emails = SentEmail.objects.filter(
-            template=template,
-            status='sent'
-        ).select_related('vendor')
-        
-        vendor_scores = []
-        
-        for sent_email in sent_emails:
-            # Calculate scores
-            scores = cls.calculate_score_for_vendor(sent_email, budget)
-            
-            # Create or update VendorScore
-            vendor_score, created = VendorScore.objects.update_or_create(
-                sent_email=sent_email,
-                defaults=scores
+        # Two queries for all inputs, array math for all scores and ranks
+        inputs = scoring_engine.load_template_inputs(template)
+        scores = scoring_engine.compute_scores(inputs, budget, cls.QUALITY_WEIGHTS)
+
+        vendor_scores = [
+            VendorScore(sent_email_id=sent_email_id, template_id=template.id, **values)
+            for sent_email_id, values in scoring_engine.to_decimal_rows(inputs, scores)
+        ]
+
+        # One upsert for every row, rank included
+        with transaction.atomic():
+            VendorScore.objects.bulk_create(
+                vendor_scores,
+                update_conflicts=True,
+                unique_fields=['sent_email'],
+                update_fields=list(scoring_engine.SCORE_FIELDS) + ['rank', 'template', 'updated_at'],
             )
-            
-            vendor_scores.append(vendor_score)
-        
-        # Rank vendors by final score
-        vendor_scores.sort(key=lambda x: x.final_score, reverse=True)
-        for rank, score in enumerate(vendor_scores, start=1):
-            score.rank = rank
-            score.save()
-        
+
+        vendor_scores.sort(key=lambda x: x.rank)
         return vendor_scores
+
+    @classmethod
+    def rescore_sent_emails(cls, template, budget, sent_email_ids):
+        """
+        Recompute the scores of some sent emails of a template and re-rank
+        the template without rescoring the other rows.
+
+        Sent emails of the template that have no VendorScore yet are scored
+        too. Only the affected rows are upserted; other rows are written
+        only when their rank moved.
+
+        Args:
+            template (EmailTemplate): The email template/RFP
+            budget (Decimal): RFP budget
+            sent_email_ids (iterable): IDs of the SentEmails whose inputs changed
+
+        Returns:
+            int: Number of VendorScore rows written
+        """
+        # Current standing of every row, in the tie-break order of the full path
+        standing = list(
+            SentEmail.objects.filter(template=template, status='sent').values_list(
+                'id', 'vendor_score__final_score', 'vendor_score__rank'
+            )
+        )
+        if not standing:
+            return 0
+
+        affected = set(sent_email_ids) | {row[0] for row in standing if row[1] is None}
+        inputs = scoring_engine.load_template_inputs(template, sent_email_ids=affected)
+        scores = scoring_engine.compute_scores(inputs, budget, cls.QUALITY_WEIGHTS)
+        new_rows = {
+            sent_email_id: values
+            for sent_email_id, values in scoring_engine.to_decimal_rows(inputs, scores)
+        }
+
+        final_scores = [
+            new_rows[row[0]]['final_score'] if row[0] in new_rows else row[1]
+            for row in standing
+        ]
+        ranks = scoring_engine.rank_scores([float(score) for score in final_scores]).tolist()
+
+        upserts = []
+        rank_updates = []
+        for (sent_email_id, _, old_rank), rank in zip(standing, ranks):
+            if sent_email_id in new_rows:
+                upserts.append(VendorScore(
+                    sent_email_id=sent_email_id, template_id=template.id, **{**new_rows[sent_email_id], 'rank': rank}
+                ))
+            elif old_rank != rank:
+                rank_updates.append((sent_email_id, rank))
+
+        with transaction.atomic():
+            if upserts:
+                VendorScore.objects.bulk_create(
+                    upserts,
+                    update_conflicts=True,
+                    unique_fields=['sent_email'],
+                    update_fields=list(scoring_engine.SCORE_FIELDS) + ['rank', 'template', 'updated_at'],
+                )
+            if rank_updates:
+                VendorScore.objects.filter(
+                    sent_email_id__in=[sent_email_id for sent_email_id, _ in rank_updates]
+                ).update(rank=Case(
+                    *[When(sent_email_id=sent_email_id, then=Value(rank)) for sent_email_id, rank in rank_updates],
+                    output_field=IntegerField(),
+                ))
+
+        return len(upserts) + len(rank_updates)
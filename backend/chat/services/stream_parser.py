@@ -0,0 +1,133 @@
+"""
+Incremental extraction of one top-level string field from a JSON object
+that is still being streamed.
+
+The chat prompt makes the model answer with
+{"assistant_reply": "...", "updated_json": {...}, "missing_fields": [...]}.
+While tokens arrive, ReplyStreamParser.feed() returns the newly decoded
+part of assistant_reply so it can be shown before the object is complete.
+The full response is still parsed with parse_llm_response() at the end.
+"""
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+
+class ReplyStreamParser:
+    """
+    Character-level scanner that tracks nesting, keys and string escapes.
+    Anything before the first '{' (prose, code fences) is ignored.
+    """
+
+    def __init__(self, field="assistant_reply"):
+        self.field = field
+        self.done = False
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = None
+        self._high_surrogate = None
+        self._string = []
+        self._key = None
+        self._after_colon = False
+        self._streaming = False
+        self._text = []
+
+    @property
+    def text(self):
+        """Everything decoded from the field so far."""
+        return "".join(self._text)
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of raw model output.
+        Returns the newly decoded field text ('' if none).
+        """
+        out = []
+        for ch in chunk:
+            if self._in_string:
+                self._consume_string_char(ch, out)
+            else:
+                self._consume_structural_char(ch)
+
+        delta = "".join(out)
+        if delta:
+            self._text.append(delta)
+        return delta
+
+    def _consume_structural_char(self, ch):
+        if ch in "{[":
+            self._depth += 1
+            self._after_colon = False
+        elif self._depth == 0:
+            return
+        elif ch in "}]":
+            self._depth -= 1
+        elif ch == '"':
+            self._in_string = True
+            self._string = []
+            self._streaming = (
+                not self.done
+                and self._depth == 1
+                and self._after_colon
+                and self._key == self.field
+            )
+        elif self._depth == 1 and ch == ":":
+            self._after_colon = True
+        elif self._depth == 1 and ch == ",":
+            self._after_colon = False
+            self._key = None
+
+    def _consume_string_char(self, ch, out):
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape[0] == "u":
+                if len(self._escape) == 5:
+                    self._emit_code_point(int(self._escape[1:], 16), out)
+                    self._escape = None
+            else:
+                self._emit(_SIMPLE_ESCAPES.get(ch, ch), out)
+                self._escape = None
+        elif ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._end_string()
+        else:
+            self._emit(ch, out)
+
+    def _emit_code_point(self, code, out):
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+
+        try:
+            self._emit(chr(code), out)
+        except ValueError:
+            pass
+
+    def _emit(self, text, out):
+        if self._streaming:
+            out.append(text)
+        else:
+            self._string.append(text)
+
+    def _end_string(self):
+        self._in_string = False
+        if self._streaming:
+            self._streaming = False
+            self.done = True
+        elif self._depth == 1 and not self._after_colon:
+            self._key = "".join(self._string)
+        self._string = []
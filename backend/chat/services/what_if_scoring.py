@@ -0,0 +1,122 @@
+"""
+What-if scoring: rank a template's vendors under other weightings without
+touching VendorScore.
+
+The component scores stored by the last scoring run are loaded once per
+template into an in-process cache (revalidated with a cheap
+count/updated_at fingerprint) and every requested weighting is applied
+to them as one matrix product, so trying a new weighting costs
+milliseconds even for large RFPs.
+"""
+import threading
+import time
+
+import numpy as np
+from cachetools import LRUCache
+from django.db.models import Count, Max
+
+from chat.models import VendorScore
+from chat.services import scoring_engine
+from chat.services.scoring_service import ScoringService
+
+WEIGHT_KEYS = ('price', 'verification', 'rating', 'delivery', 'warranty', 'response')
+
+# Current weights, as used by calculate_scores_for_template
+DEFAULT_WEIGHTS = {
+    'price': 0.5,
+    'verification': ScoringService.VERIFICATION_WEIGHT,
+    'rating': ScoringService.RATING_WEIGHT,
+    'delivery': ScoringService.DELIVERY_WEIGHT,
+    'warranty': ScoringService.WARRANTY_WEIGHT,
+    'response': ScoringService.RESPONSE_WEIGHT,
+}
+
+_lock = threading.Lock()
+_components = LRUCache(maxsize=32)
+
+
+def _fingerprint(template):
+    stats = VendorScore.objects.filter(template=template).aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    )
+    return stats['count'], stats['updated']
+
+
+def stored_components(template):
+    """
+    Component scores of template, from the cache while they are current.
+    """
+    fingerprint = _fingerprint(template)
+    with _lock:
+        cached = _components.get(template.id)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    stored = scoring_engine.load_stored_components(template)
+    with _lock:
+        _components[template.id] = (fingerprint, stored)
+    return stored
+
+
+def normalize_weights(weights):
+    """
+    Fill missing keys with the current weights and scale the five quality
+    weights to sum to 1. 'price' is the price share of the final score
+    (0-1); quality gets the rest.
+    """
+    merged = {key: float(weights.get(key, DEFAULT_WEIGHTS[key])) for key in WEIGHT_KEYS}
+    quality_total = sum(merged[key] for key in WEIGHT_KEYS[1:])
+    if quality_total <= 0:
+        raise ValueError("At least one quality weight must be positive")
+    for key in WEIGHT_KEYS[1:]:
+        merged[key] = round(merged[key] / quality_total, 6)
+    return merged
+
+
+def rank_with_weights(template, weight_sets, limit=20):
+    """
+    Rank template's vendors under each weighting.
+
+    Args:
+        template (EmailTemplate): A template that has been scored
+        weight_sets (list): dicts with any of WEIGHT_KEYS and an optional 'label'
+        limit (int): Vendors returned per weighting
+
+    Returns:
+        dict: vendors_scored, results (one per weighting, best first), computed_in_ms
+    """
+    started = time.perf_counter()
+    stored = stored_components(template)
+
+    normalized = [normalize_weights(weights) for weights in weight_sets]
+    quality_weights = [[weights[key] for key in WEIGHT_KEYS[1:]] for weights in normalized]
+    price_shares = [weights['price'] for weights in normalized]
+    quality_values, final = scoring_engine.what_if_scores(stored, quality_weights, price_shares)
+
+    price_scores = stored.components[:, 0]
+    results = []
+    for column, weights in enumerate(normalized):
+        ranks = scoring_engine.rank_scores(final[:, column])
+        top = np.argsort(ranks)[:limit]
+        results.append({
+            "label": weight_sets[column].get('label') or f"weights_{column + 1}",
+            "weights": weights,
+            "rankings": [
+                {
+                    "rank": int(ranks[index]),
+                    "stored_rank": stored.stored_ranks[index],
+                    "sent_email_id": int(stored.sent_email_ids[index]),
+                    "vendor_name": stored.vendor_names[index],
+                    "final_score": float(final[index, column]),
+                    "price_score": float(price_scores[index]),
+                    "vendor_quality_score": float(quality_values[index, column]),
+                }
+                for index in top
+            ],
+        })
+
+    return {
+        "vendors_scored": len(stored),
+        "results": results,
+        "computed_in_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from chat.models import VendorQuotation
+from chat.services import incremental_scoring
+from vendors.models import Vendor
+
+
+@receiver(post_save, sender=VendorQuotation)
+def quotation_saved(sender, instance, **kwargs):
+    incremental_scoring.mark_sent_emails_changed([instance.sent_email_id])
+
+
+@receiver(post_init, sender=Vendor)
+def remember_scored_vendor_fields(sender, instance, **kwargs):
+    # Deferred fields are left out so loading them is not forced here
+    deferred = instance.get_deferred_fields()
+    instance._scored_fields = {
+        field: getattr(instance, field)
+        for field in incremental_scoring.SCORED_VENDOR_FIELDS
+        if field not in deferred
+    }
+
+
+@receiver(post_save, sender=Vendor)
+def vendor_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_scored_fields', {})
+    current = {field: getattr(instance, field) for field in previous}
+
+    # A new vendor has no scores yet
+    if not created and current != previous:
+        incremental_scoring.mark_vendors_changed([instance.pk])
+
+    instance._scored_fields = {field: getattr(instance, field) for field in incremental_scoring.SCORED_VENDOR_FIELDS}
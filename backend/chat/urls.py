@@ -7,7 +7,9 @@ from .views import (
     UserTemplatesView,
     VendorQuotationsView,
     SyncQuotationsView,
-    CalculateVendorScoresView
+    CalculateVendorScoresView,
+    QuotationWindowView,
+    WhatIfScoringView
 )
 
 urlpatterns = [
@@ -19,4 +21,6 @@ urlpatterns = [
     path("quotations/", VendorQuotationsView.as_view(), name="vendor-quotations"),
     path("sync-quotations/", SyncQuotationsView.as_view(), name="sync-quotations"),
     path("calculate-scores/", CalculateVendorScoresView.as_view(), name="calculate-vendor-scores"),
+    path("quotation-window/", QuotationWindowView.as_view(), name="quotation-window"),
+    path("what-if-scores/", WhatIfScoringView.as_view(), name="what-if-scores"),
 ]
\ No newline at end of file
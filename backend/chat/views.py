@@ -2,7 +2,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiExample
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.db.models import Count, F, FilteredRelation, Q
 from django.core.management import call_command
 from io import StringIO
 from chat.services.quotation_service import QuotationService
@@ -21,15 +24,20 @@ from .serializers import (
     SubmitChatSerializer,
     ChatStartResponseSerializer,
     ChatMessageResponseSerializer,
+    ChatTurnQueuedResponseSerializer,
     ChatHistoryResponseSerializer,
     ChatSubmitResponseSerializer,
     EmailTemplateGenerationSerializer,
     VendorSelectionResponseSerializer,
     SendTemplateEmailSerializer,
-    SendTemplateEmailResponseSerializer
+    SendTemplateEmailResponseSerializer,
+    QuotationWindowSerializer,
+    SyncQuotationsSerializer,
+    WhatIfScoringSerializer
 )
 from .services.chat_service import ChatService
 from .services.email_service import generate_email_template
+from .services import incremental_scoring, quotation_read_model, what_if_scoring
 from .services.scoring_service import ScoringService
 from django.core.management import call_command
 
@@ -50,6 +58,7 @@ class ChatView(APIView):
         request=ChatRequestSerializer,
         responses={
             200: ChatMessageResponseSerializer,
+            202: ChatTurnQueuedResponseSerializer,
             400: OpenApiExample("Error", value={"error": "Invalid request"}),
             404: OpenApiExample("Not Found", value={"error": "Session not found"}),
             500: OpenApiExample("Server Error", value={"error": "Internal error"})
@@ -72,6 +81,16 @@ class ChatView(APIView):
                     "message": "I need 10 laptops for my office"
                 }
             ),
+            OpenApiExample(
+                name="Send Message (async)",
+                description="Queue a message; the reply arrives over ws/chat/<session_id>/ tagged with turn_id",
+                value={
+                    "action": "message",
+                    "session_id": 1,
+                    "message": "I need 10 laptops for my office",
+                    "mode": "async"
+                }
+            ),
             OpenApiExample(
                 name="Get History",
                 description="Get chat conversation history",
@@ -149,8 +168,34 @@ class ChatView(APIView):
         if session.is_closed:
             return Response({"error": "Chat is closed."}, status=400)
 
+        mode = serializer.validated_data.get("mode") or (
+            "async" if getattr(settings, "CHAT_ASYNC_TURNS", False) else "sync"
+        )
+
+        if mode == "async":
+            try:
+                turn_id = ChatService.enqueue_message(
+                    session,
+                    user_msg,
+                    stream=serializer.validated_data.get("stream")
+                )
+            except Exception as e:
+                return Response({
+                    "error": f"Failed to queue message: {str(e)}"
+                }, status=500)
+
+            return Response({
+                "turn_id": turn_id,
+                "session_id": session.id,
+                "status": "queued"
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
-            llm_response = ChatService.process_message(session, user_msg)
+            llm_response = ChatService.process_message(
+                session,
+                user_msg,
+                stream=serializer.validated_data.get("stream")
+            )
             
             return Response({
                 "assistant_reply": llm_response["assistant_reply"],
@@ -173,9 +218,28 @@ class ChatView(APIView):
         except ChatSession.DoesNotExist:
             return Response({"error": "Chat session not found."}, status=404)
 
-        session_summary = ChatService.get_session_summary(session)
-        
-        return Response(session_summary)
+        data = serializer.validated_data
+        try:
+            session_summary = ChatService.get_session_summary(
+                session,
+                since=data.get("since"),
+                before=data.get("before"),
+                limit=data.get("limit")
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        etag = ChatService.history_etag(
+            session,
+            session_summary["last_message_id"],
+            since=data.get("since"),
+            before=data.get("before"),
+            limit=data.get("limit")
+        )
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return Response(session_summary, headers={"ETag": etag})
 
     def submit(self, request):
         serializer = SubmitChatSerializer(data=request.data)
@@ -274,7 +338,8 @@ class ChatView(APIView):
         # Mark session as submitted and closed
         session.is_closed = True
         session.is_submitted = True
-        session.save()
+        # Don't rewrite draft_json: a queued turn may have updated it meanwhile
+        session.save(update_fields=['is_closed', 'is_submitted'])
 
         return Response({
             "status": "confirmed",
@@ -376,96 +441,162 @@ class EmailTemplateView(APIView):
 
 class VendorSelectionView(APIView):
     """
-    Get vendors for email template sending, filtering out already sent vendors
+    Get vendors for email template sending, filtering out already sent vendors.
+
+    The page is one query: each vendor's send status for the template comes
+    from a FilteredRelation join (SentEmail is unique per template and
+    vendor), and the counts come from one conditional aggregate. Pages are
+    keyset paginated on vendor id when limit or cursor is given: pass
+    next_cursor back as cursor. Without them the whole list is returned.
     """
+
+    VENDOR_FIELDS = ("id", "name", "email", "company", "phone")
+    SEND_STATUSES = ("not_sent", "sent", "failed", "pending")
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
     
     @extend_schema(
         summary="Get Available Vendors",
-        description="Get list of vendors to send RFP emails to, excluding those already sent the selected template",
+        description=(
+            "Get list of vendors to send RFP emails to, excluding those already sent the selected template "
+            "unless status=sent is requested"
+        ),
+        parameters=[
+            {"name": "template_id", "in": "query", "required": False, "schema": {"type": "integer"},
+             "description": "Template whose send status is reported"},
+            {"name": "user_email", "in": "query", "required": False, "schema": {"type": "string", "format": "email"}},
+            {"name": "status", "in": "query", "required": False,
+             "schema": {"type": "string", "enum": ["not_sent", "sent", "failed", "pending"]},
+             "description": "Only vendors with this send status for the template"},
+            {"name": "name", "in": "query", "required": False, "schema": {"type": "string"},
+             "description": "Case-insensitive substring of the vendor name"},
+            {"name": "company", "in": "query", "required": False, "schema": {"type": "string"},
+             "description": "Case-insensitive substring of the vendor company"},
+            {"name": "fields", "in": "query", "required": False, "schema": {"type": "string"},
+             "description": "Comma-separated vendor fields to return (id, name, email, company, phone)"},
+            {"name": "cursor", "in": "query", "required": False, "schema": {"type": "string"},
+             "description": "next_cursor from the previous page"},
+            {"name": "limit", "in": "query", "required": False, "schema": {"type": "integer"},
+             "description": "Page size (max 500; default 50 when only cursor is given). "
+                            "Without limit and cursor every vendor is returned"},
+        ],
         responses={200: VendorSelectionResponseSerializer}
     )
     def get(self, request):
         try:
             template_id = request.GET.get('template_id')
-            user_email = request.GET.get('user_email')
-            
+            status_filter = request.GET.get('status')
+            name = request.GET.get('name')
+            company = request.GET.get('company')
+
+            try:
+                template_id = int(template_id) if template_id else None
+                after_id = int(request.GET.get('cursor') or 0)
+                limit = request.GET.get('limit')
+                paginated = bool(limit or request.GET.get('cursor'))
+                limit = min(int(limit or self.DEFAULT_PAGE_SIZE), self.MAX_PAGE_SIZE) if paginated else None
+            except ValueError:
+                return Response({"error": "template_id, cursor and limit must be integers"}, status=400)
+            if paginated and limit < 1:
+                return Response({"error": "limit must be positive"}, status=400)
+
+            fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+            unknown = [field for field in fields if field not in self.VENDOR_FIELDS]
+            if unknown:
+                return Response({"error": f"Unknown fields: {', '.join(unknown)}"}, status=400)
+            fields = fields or list(self.VENDOR_FIELDS)
+            if "id" not in fields:
+                fields.insert(0, "id")
+
+            if status_filter and status_filter not in self.SEND_STATUSES:
+                return Response({"error": f"status must be one of {', '.join(self.SEND_STATUSES)}"}, status=400)
+            if status_filter and not template_id:
+                return Response({"error": "status filter needs template_id"}, status=400)
+
             vendors = Vendor.objects.all()
-            
-            # If template_id is provided, filter out vendors that already received this template
+            # Filters shared by the page query and the stats aggregate
+            matching = Q()
+            if name:
+                matching &= Q(name__icontains=name)
+            if company:
+                matching &= Q(company__icontains=company)
+
+            send_fields = []
             if template_id:
-                try:
-                    email_template = EmailTemplate.objects.get(id=template_id)
-                    
-                    # Get vendors that have already been sent this template
-                    sent_vendor_ids = SentEmail.objects.filter(
-                        template=email_template,
-                        status='sent'  # Only exclude successfully sent emails
-                    ).values_list('vendor_id', flat=True)
-                    
-                    # Exclude vendors that already received the email
-                    vendors = vendors.exclude(id__in=sent_vendor_ids)
-                    
-                except EmailTemplate.DoesNotExist:
-                    pass  # If template doesn't exist, show all vendors
-            
+                vendors = vendors.annotate(
+                    template_send=FilteredRelation(
+                        'received_emails',
+                        condition=Q(received_emails__template_id=template_id)
+                    ),
+                    send_status=F('template_send__status'),
+                    send_sent_at=F('template_send__sent_at'),
+                    send_error=F('template_send__error_message'),
+                )
+                send_fields = ['send_status', 'send_sent_at', 'send_error']
+
+                if status_filter == 'not_sent':
+                    matching &= Q(template_send__isnull=True)
+                elif status_filter:
+                    matching &= Q(send_status=status_filter)
+                else:
+                    # Vendors that already received this template are not offered again
+                    matching &= ~Q(send_status='sent') | Q(template_send__isnull=True)
+
+            rows = vendors.filter(matching, id__gt=after_id).order_by('id').values(*fields, *send_fields)
+            if paginated:
+                rows = list(rows[:limit + 1])
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+            else:
+                rows = list(rows)
+                has_more = False
+
             vendor_list = []
-            for vendor in vendors:
-                vendor_data = {
-                    "id": vendor.id,
-                    "name": vendor.name,
-                    "email": vendor.email,
-                    "company": vendor.company,
-                    "phone": vendor.phone
-                }
-                
+            for row in rows:
+                vendor_data = {field: row[field] for field in fields}
+
                 # Add sent status if template_id is provided
                 if template_id:
-                    sent_email = SentEmail.objects.filter(
-                        template_id=template_id,
-                        vendor=vendor
-                    ).first()
-                    
-                    if sent_email:
+                    if row['send_status']:
                         vendor_data["email_status"] = {
-                            "status": sent_email.status,
-                            "sent_at": sent_email.sent_at.isoformat() if sent_email.sent_at else None,
-                            "error": sent_email.error_message
+                            "status": row['send_status'],
+                            "sent_at": row['send_sent_at'].isoformat() if row['send_sent_at'] else None,
+                            "error": row['send_error']
                         }
                     else:
                         vendor_data["email_status"] = {"status": "not_sent"}
-                
+
                 vendor_list.append(vendor_data)
-            
-            # If template_id is provided, also return send statistics
+
+            stats = vendors.aggregate(
+                total=Count('id', filter=matching),
+                **({
+                    "total_vendors": Count('id'),
+                    "sent_count": Count('id', filter=Q(send_status='sent')),
+                    "failed_count": Count('id', filter=Q(send_status='failed')),
+                } if template_id else {})
+            )
+
             response_data = {
                 "vendors": vendor_list,
-                "total": len(vendor_list)
+                "total": stats["total"],
+                "next_cursor": str(rows[-1]["id"]) if has_more else None,
+                "has_more": has_more
             }
             
+            # If template_id is provided, also return send statistics
             if template_id:
-                try:
-                    email_template = EmailTemplate.objects.get(id=template_id)
-                    sent_count = SentEmail.objects.filter(
-                        template=email_template,
-                        status='sent'
-                    ).count()
-                    
-                    failed_count = SentEmail.objects.filter(
-                        template=email_template,
-                        status='failed'
-                    ).count()
-                    
-                    total_vendors = Vendor.objects.count()
-                    
+                template_subject = EmailTemplate.objects.filter(id=template_id).values_list(
+                    'subject', flat=True
+                ).first()
+                if template_subject is not None:
                     response_data["email_stats"] = {
-                        "sent_count": sent_count,
-                        "failed_count": failed_count,
-                        "remaining_count": len(vendor_list),
-                        "total_vendors": total_vendors,
-                        "template_subject": email_template.subject
+                        "sent_count": stats["sent_count"],
+                        "failed_count": stats["failed_count"],
+                        "remaining_count": stats["total_vendors"] - stats["sent_count"],
+                        "total_vendors": stats["total_vendors"],
+                        "template_subject": template_subject
                     }
-                except EmailTemplate.DoesNotExist:
-                    pass
             
             return Response(response_data)
             
@@ -557,6 +688,9 @@ class SendTemplateEmailView(APIView):
                     thread_id=result.get("thread_id"),
                     status='sent'
                 )
+
+                # First successful send starts the vendor response window
+                email_template.open_response_window()
                 
                 return Response({
                     "success": True,
@@ -666,7 +800,8 @@ class UserTemplatesView(APIView):
 
 class VendorQuotationsView(APIView):
     """
-    Get vendor quotations/replies for a specific template
+    Get vendor quotations/replies for a specific template, one page at a time
+    (see chat/services/quotation_read_model.py)
     """
     
     @extend_schema(
@@ -685,6 +820,21 @@ class VendorQuotationsView(APIView):
                 "description": "User email address",
                 "required": True,
                 "schema": {"type": "string", "format": "email"}
+            },
+            {
+                "name": "cursor",
+                "in": "query",
+                "description": "next_cursor from the previous page",
+                "required": False,
+                "schema": {"type": "string"}
+            },
+            {
+                "name": "limit",
+                "in": "query",
+                "description": "Vendors per page (max 500; default 50 when only cursor is given). "
+                               "Without limit and cursor every vendor is returned",
+                "required": False,
+                "schema": {"type": "integer"}
             }
         ],
         responses={200: dict}
@@ -697,6 +847,20 @@ class VendorQuotationsView(APIView):
             return Response({
                 "error": "template_id and user_email are required"
             }, status=400)
+
+        cursor = request.query_params.get('cursor')
+        limit = request.query_params.get('limit')
+        try:
+            if cursor:
+                quotation_read_model.decode_cursor(cursor)
+            if limit or cursor:
+                limit = min(int(limit or quotation_read_model.DEFAULT_PAGE_SIZE), quotation_read_model.MAX_PAGE_SIZE)
+            else:
+                limit = None
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit"}, status=400)
+        if limit is not None and limit < 1:
+            return Response({"error": "limit must be positive"}, status=400)
         
         try:
             # Verify user has access to this template
@@ -715,75 +879,36 @@ class VendorQuotationsView(APIView):
                 user_email=user_email,
                 verbosity=0
             )
-            
-            # Get all sent emails for this template
-            sent_emails = SentEmail.objects.filter(
-                template=template,
-                status='sent'
-            ).prefetch_related('quotations__email_message')
-            
-            quotations_data = []
-            
-            for sent_email in sent_emails:
-                vendor_data = {
-                    "vendor_id": sent_email.vendor.id,
-                    "vendor_name": sent_email.vendor_name_at_time,
-                    "vendor_email": sent_email.vendor_email_at_time,
-                    "vendor_company": sent_email.vendor_company_at_time,
-                    "email_sent_at": sent_email.sent_at.isoformat(),
-                    "thread_id": sent_email.thread_id,
-                    "quotations": []
-                }
-                
-                for quotation in sent_email.quotations.all():
-                    vendor_data["quotations"].append({
-                        "id": quotation.id,
-                        "message_id": quotation.email_message.message_id,
-                        "subject": quotation.subject,
-                        "body": quotation.body,
-                        "quoted_amount": float(quotation.quoted_amount) if quotation.quoted_amount else None,
-                        "currency": quotation.currency,
-                        "received_at": quotation.received_at.isoformat(),
-                        "is_reviewed": quotation.is_reviewed,
-                        "notes": quotation.notes
-                    })
-                
-                # Add vendor score if it exists
-                try:
-                    vendor_score = VendorScore.objects.get(sent_email=sent_email)
-                    vendor_data["score"] = {
-                        "final_score": float(vendor_score.final_score),
-                        "rank": vendor_score.rank,
-                        "price_score": float(vendor_score.price_score),
-                        "vendor_quality_score": float(vendor_score.vendor_quality_score),
-                        "breakdown": {
-                            "verification": float(vendor_score.verification_score),
-                            "rating": float(vendor_score.rating_score),
-                            "delivery": float(vendor_score.delivery_score),
-                            "warranty": float(vendor_score.warranty_score),
-                            "response": float(vendor_score.response_score)
-                        }
-                    }
-                except VendorScore.DoesNotExist:
-                    vendor_data["score"] = None
-                
-                quotations_data.append(vendor_data)
-            
-            # Sort by rank if scores exist
-            quotations_data.sort(key=lambda x: (x["score"]["rank"] if x["score"] and x["score"]["rank"] else float('inf')))
 
+            # Apply pending incremental rescoring so scores below are fresh
+            incremental_scoring.flush()
             
-            return Response({
+            # Fixed number of queries per page: sent emails with scores and
+            # ranks, their quotations, and the template-wide counts
+            sent_emails, next_cursor = quotation_read_model.sent_email_page(template, cursor, limit)
+            counts = quotation_read_model.template_counts(template)
+            # Built before streaming so any error is answered with a 500 below
+            rows = [quotation_read_model.vendor_row(sent_email) for sent_email in sent_emails]
+
+            header = {
                 "template": {
                     "id": template.id,
                     "subject": template.subject,
                     "generated_at": template.generated_at.isoformat()
-                },
-                "vendors_with_quotations": quotations_data,
-                "total_vendors_contacted": sent_emails.count(),
-                "total_vendors_responded": len([v for v in quotations_data if v["quotations"]]),
+                }
+            }
+            trailer = {
+                "total_vendors_contacted": counts["contacted"],
+                "total_vendors_responded": counts["responded"],
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
                 "sync_status": "completed"
-            })
+            }
+
+            return StreamingHttpResponse(
+                quotation_read_model.render_json(header, rows, trailer),
+                content_type="application/json"
+            )
             
         except GmailAccount.DoesNotExist:
             return Response({"error": "Gmail account not found"}, status=404)
@@ -800,26 +925,15 @@ class SyncQuotationsView(APIView):
     
     @extend_schema(
         description="Manually sync vendor quotations for a template",
-        request={
-            "application/json": {
-                "type": "object",
-                "properties": {
-                    "template_id": {"type": "integer"},
-                    "user_email": {"type": "string", "format": "email"}
-                },
-                "required": ["template_id", "user_email"]
-            }
-        },
+        request=SyncQuotationsSerializer,
         responses={200: dict}
     )
     def post(self, request):
-        template_id = request.data.get('template_id')
-        user_email = request.data.get('user_email')
-        
-        if not template_id or not user_email:
-            return Response({
-                "error": "template_id and user_email are required"
-            }, status=400)
+        serializer = SyncQuotationsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        template_id = serializer.validated_data['template_id']
+        user_email = serializer.validated_data['user_email']
+        reextract = serializer.validated_data['reextract']
         
         try:
             # Verify access
@@ -895,7 +1009,8 @@ class SyncQuotationsView(APIView):
                     '--once', 
                     stdout=output_buffer,
                     template_id=template_id,  # We need to add this parameter support
-                    user_email=user_email
+                    user_email=user_email,
+                    reextract=reextract
                 )
                 
                 sync_output = output_buffer.getvalue()
@@ -1004,3 +1119,103 @@ class CalculateVendorScoresView(APIView):
             return Response({"error": "Template not found"}, status=404)
         except Exception as e:
             return Response({"error": f"Failed to calculate scores: {str(e)}"}, status=500)
+
+
+class WhatIfScoringView(APIView):
+    """
+    Rank a scored template's vendors under custom weights.
+    Computed in memory from the stored component scores; nothing is written.
+    """
+
+    @extend_schema(
+        description="Try one or several weightings on the stored component scores of a template",
+        request=WhatIfScoringSerializer,
+        responses={200: dict},
+        examples=[
+            OpenApiExample(
+                "Compare two weightings",
+                value={
+                    "template_id": 1,
+                    "user_email": "user@example.com",
+                    "weight_sets": [
+                        {"label": "price first", "price": 0.7},
+                        {"label": "reliability", "price": 0.3, "rating": 0.5, "delivery": 0.3, "response": 0.0}
+                    ],
+                    "limit": 10
+                },
+                request_only=True,
+            )
+        ]
+    )
+    def post(self, request):
+        serializer = WhatIfScoringSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            gmail_account = GmailAccount.objects.get(email=data['user_email'])
+            template = EmailTemplate.objects.get(
+                id=data['template_id'],
+                session__gmail_account=gmail_account
+            )
+        except GmailAccount.DoesNotExist:
+            return Response({"error": "Gmail account not found"}, status=404)
+        except EmailTemplate.DoesNotExist:
+            return Response({"error": "Template not found"}, status=404)
+
+        weight_sets = data.get('weight_sets') or [data['weights']]
+
+        # Apply pending incremental rescoring so the stored components are fresh
+        incremental_scoring.flush()
+
+        try:
+            result = what_if_scoring.rank_with_weights(template, weight_sets, limit=data['limit'])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        if not result["vendors_scored"]:
+            return Response({
+                "error": "No scores calculated for this template yet. Calculate scores first."
+            }, status=400)
+
+        return Response({"template_id": template.id, **result})
+
+
+class QuotationWindowView(APIView):
+    """
+    Close or reopen quote collection for an RFP template.
+    Closed or expired templates are skipped by the reply sync.
+    """
+
+    @extend_schema(
+        description="Close or reopen vendor quote collection for a template",
+        request=QuotationWindowSerializer,
+        responses={200: dict}
+    )
+    def post(self, request):
+        serializer = QuotationWindowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            gmail_account = GmailAccount.objects.get(email=data['user_email'])
+            template = EmailTemplate.objects.get(
+                id=data['template_id'],
+                session__gmail_account=gmail_account
+            )
+
+            if data['closed']:
+                template.close_for_quotes()
+            else:
+                template.reopen_for_quotes(data.get('response_window_days'))
+
+            return Response({
+                "template_id": template.id,
+                "is_closed_for_quotes": template.is_closed_for_quotes,
+                "response_deadline": template.response_deadline.isoformat() if template.response_deadline else None
+            })
+
+        except GmailAccount.DoesNotExist:
+            return Response({"error": "Gmail account not found"}, status=404)
+        except EmailTemplate.DoesNotExist:
+            return Response({"error": "Template not found"}, status=404)
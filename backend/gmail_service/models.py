@@ -12,6 +12,9 @@ class GmailAccount(models.Model):
     access_token = models.TextField(null=True, blank=True)
     token_expires_at = models.DateTimeField(null=True, blank=True)
 
+    # Mailbox-wide reply discovery watermark
+    replies_synced_at = models.DateTimeField(null=True, blank=True)
+
     # Debug or tracking
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
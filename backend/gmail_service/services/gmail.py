@@ -186,9 +186,16 @@ class GmailService:
         }
 
     @classmethod
-    def read_thread(cls, gmail_account, thread_id):
+    def get_service(cls, gmail_account):
+        """
+        Build a Gmail API client. Reuse it across calls in the same batch.
+        """
         creds = cls.get_credentials(gmail_account)
-        service = build("gmail", "v1", credentials=creds)
+        return build("gmail", "v1", credentials=creds)
+
+    @classmethod
+    def read_thread(cls, gmail_account, thread_id, service=None):
+        service = service or cls.get_service(gmail_account)
 
         thread = service.users().threads().get(
             userId="me",
@@ -196,66 +203,106 @@ class GmailService:
             format="full"
         ).execute()
 
-        messages = []
-
-        for msg in thread.get("messages", []):
-            payload = msg.get("payload", {})
-            headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
-            
-            from_email = headers.get("From", "")
-            subject = headers.get("Subject", "")
-            direction = "OUTBOUND" if gmail_account.email in from_email else "INBOUND"
-
-            # Extract email body
-            body = ""
-            def extract_body(payload):
-                """Recursively extract text body from email payload"""
-                if payload.get("mimeType") == "text/plain":
-                    data = payload.get("body", {}).get("data", "")
-                    if data:
-                        import base64
-                        return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                elif payload.get("mimeType") == "text/html":
-                    data = payload.get("body", {}).get("data", "")
-                    if data:
-                        import base64
-                        html_content = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                        # Simple HTML to text conversion (remove HTML tags)
-                        import re
-                        return re.sub('<[^<]+?>', '', html_content)
-                elif "parts" in payload:
-                    for part in payload["parts"]:
-                        text = extract_body(part)
-                        if text:
-                            return text
-                return ""
-
-            body = extract_body(payload)
-
-            date_header = headers.get("Date")
-
-            if date_header:
-                try:
-                    timestamp = parsedate_to_datetime(date_header)
-                    if timestamp.tzinfo is None:
-                        timestamp = timezone.make_aware(timestamp)
-                except Exception:
-                    timestamp = timezone.datetime.fromtimestamp(
-                        int(msg["internalDate"]) / 1000, tz=timezone.utc
-                    )
-            else:
+        return [cls.parse_message(gmail_account, msg) for msg in thread.get("messages", [])]
+
+    @classmethod
+    def list_message_ids(cls, gmail_account, query, service=None, page_size=500):
+        """
+        Run a users.messages.list search and return [{"id", "threadId"}] for all pages.
+        """
+        service = service or cls.get_service(gmail_account)
+
+        results = []
+        page_token = None
+
+        while True:
+            response = service.users().messages().list(
+                userId="me",
+                q=query,
+                maxResults=page_size,
+                pageToken=page_token
+            ).execute()
+
+            results.extend(response.get("messages", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        return results
+
+    @classmethod
+    def get_message(cls, gmail_account, message_id, service=None):
+        service = service or cls.get_service(gmail_account)
+
+        msg = service.users().messages().get(
+            userId="me",
+            id=message_id,
+            format="full"
+        ).execute()
+
+        return cls.parse_message(gmail_account, msg)
+
+    @classmethod
+    def parse_message(cls, gmail_account, msg):
+        """
+        Convert a Gmail API message resource into our message dict.
+        """
+        payload = msg.get("payload", {})
+        headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
+        
+        from_email = headers.get("From", "")
+        subject = headers.get("Subject", "")
+        direction = "OUTBOUND" if gmail_account.email in from_email else "INBOUND"
+
+        # Extract email body
+        body = ""
+        def extract_body(payload):
+            """Recursively extract text body from email payload"""
+            if payload.get("mimeType") == "text/plain":
+                data = payload.get("body", {}).get("data", "")
+                if data:
+                    import base64
+                    return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+            elif payload.get("mimeType") == "text/html":
+                data = payload.get("body", {}).get("data", "")
+                if data:
+                    import base64
+                    html_content = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                    # Simple HTML to text conversion (remove HTML tags)
+                    import re
+                    return re.sub('<[^<]+?>', '', html_content)
+            elif "parts" in payload:
+                for part in payload["parts"]:
+                    text = extract_body(part)
+                    if text:
+                        return text
+            return ""
+
+        body = extract_body(payload)
+
+        date_header = headers.get("Date")
+
+        if date_header:
+            try:
+                timestamp = parsedate_to_datetime(date_header)
+                if timestamp.tzinfo is None:
+                    timestamp = timezone.make_aware(timestamp)
+            except Exception:
                 timestamp = timezone.datetime.fromtimestamp(
                     int(msg["internalDate"]) / 1000, tz=timezone.utc
                 )
+        else:
+            timestamp = timezone.datetime.fromtimestamp(
+                int(msg["internalDate"]) / 1000, tz=timezone.utc
+            )
 
-            messages.append({
-                "message_id": msg["id"],
-                "from": from_email,
-                "subject": subject,
-                "body": body,
-                "snippet": msg.get("snippet"),
-                "timestamp": timestamp.isoformat(),
-                "direction": direction,
-            })
-
-        return messages
+        return {
+            "message_id": msg["id"],
+            "thread_id": msg.get("threadId"),
+            "from": from_email,
+            "subject": subject,
+            "body": body,
+            "snippet": msg.get("snippet"),
+            "timestamp": timestamp.isoformat(),
+            "direction": direction,
+        }
@@ -160,6 +160,52 @@ MISTRAL_API_KEY = config('MISTRAL_API_KEY', default='')
 HF_API_KEY = config('HF_API_KEY', default='')
 HF_MODEL = config('HF_MODEL', default='mistralai/Mistral-7B-Instruct-v0.1')
 CHAT_LLM_PROVIDER = config('CHAT_LLM_PROVIDER', default='mistralai/Mixtral-8x7B-Instruct-v0.1')
+# Stream assistant replies over the chat WebSocket token by token
+CHAT_STREAMING = config('CHAT_STREAMING', default=False, cast=bool)
+# Run chat turns on a background worker pool and answer the HTTP request with 202 + turn_id
+CHAT_ASYNC_TURNS = config('CHAT_ASYNC_TURNS', default=False, cast=bool)
+CHAT_WORKER_THREADS = config('CHAT_WORKER_THREADS', default=8, cast=int)
+# Messages per chat history page
+CHAT_HISTORY_PAGE_SIZE = config('CHAT_HISTORY_PAGE_SIZE', default=100, cast=int)
+# Ask the model for draft patches (RFP_PATCH_PROMPT) instead of the full merged draft
+CHAT_DRAFT_PATCHES = config('CHAT_DRAFT_PATCHES', default=True, cast=bool)
+
+# Shared LLM client pools (see chat/services/llm_clients.py)
+LLM_CLIENT_POOLING = config('LLM_CLIENT_POOLING', default=True, cast=bool)
+LLM_CONNECT_TIMEOUT_SECONDS = config('LLM_CONNECT_TIMEOUT_SECONDS', default=5, cast=float)
+LLM_TIMEOUT_SECONDS = config('LLM_TIMEOUT_SECONDS', default=30, cast=float)
+LLM_POOL_MAXSIZE = config('LLM_POOL_MAXSIZE', default=10, cast=int)
+LLM_KEEPALIVE_SECONDS = config('LLM_KEEPALIVE_SECONDS', default=60, cast=float)
+MISTRAL_SERVER_URL = config('MISTRAL_SERVER_URL', default='')
+HF_INFERENCE_URL = config('HF_INFERENCE_URL', default='https://api-inference.huggingface.co')
+
+# Provider routing for chat and email generation (see chat/services/llm_router.py)
+LLM_ROUTING = config('LLM_ROUTING', default=True, cast=bool)
+LLM_PROVIDERS = config('LLM_PROVIDERS', default='mistral,hf', cast=lambda v: [p.strip() for p in v.split(',') if p.strip()])
+LLM_CALL_DEADLINE_SECONDS = config('LLM_CALL_DEADLINE_SECONDS', default=20, cast=float)
+LLM_HEDGING = config('LLM_HEDGING', default=False, cast=bool)
+LLM_HEDGE_MIN_SAMPLES = config('LLM_HEDGE_MIN_SAMPLES', default=20, cast=int)
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = config('LLM_HEDGE_DEFAULT_DELAY_SECONDS', default=2, cast=float)
+LLM_EWMA_ALPHA = config('LLM_EWMA_ALPHA', default=0.2, cast=float)
+LLM_BREAKER_FAILURE_THRESHOLD = config('LLM_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+LLM_BREAKER_SLOW_CALL_SECONDS = config('LLM_BREAKER_SLOW_CALL_SECONDS', default=15, cast=float)
+LLM_BREAKER_COOLDOWN_SECONDS = config('LLM_BREAKER_COOLDOWN_SECONDS', default=30, cast=float)
+LLM_ROUTER_MAX_WORKERS = config('LLM_ROUTER_MAX_WORKERS', default=16, cast=int)
+
+# LLM quotation extraction cache (in-process LRU + CachedQuotationExtraction table)
+QUOTATION_CACHE_TTL_SECONDS = config('QUOTATION_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+QUOTATION_CACHE_LOCAL_SIZE = config('QUOTATION_CACHE_LOCAL_SIZE', default=1024, cast=int)
+QUOTATION_CACHE_MAX_ROWS = config('QUOTATION_CACHE_MAX_ROWS', default=50000, cast=int)
+# Emails per batched LLM extraction call
+QUOTATION_BATCH_SIZE = config('QUOTATION_BATCH_SIZE', default=8, cast=int)
+
+# Rescore changed vendors/quotations of already scored RFPs, batching bursts
+CHAT_INCREMENTAL_RESCORING = config('CHAT_INCREMENTAL_RESCORING', default=True, cast=bool)
+CHAT_RESCORE_DEBOUNCE_SECONDS = config('CHAT_RESCORE_DEBOUNCE_SECONDS', default=2.0, cast=float)
+
+# Vendor replies are synced for this many days after an RFP is sent when
+# neither the template nor the RFP draft (deadline_days) sets a window.
+RFP_DEFAULT_RESPONSE_WINDOW_DAYS = config('RFP_DEFAULT_RESPONSE_WINDOW_DAYS', default=30, cast=int)
 
 RFP_PROMPT = """
 You are an AI assistant that helps users create Request For Proposals (RFPs) through natural conversation.
@@ -216,6 +262,41 @@ Result: {{"items": [{{"name": "laptops", "quantity": 10}}, {{"name": "monitors",
 Return your response as JSON with assistant_reply, updated_json, and missing_fields.
 """
 
+# Patch protocol: the model returns only the changes to the draft (see chat/services/draft_patch.py)
+RFP_PATCH_PROMPT = """
+You are an AI assistant that helps users create Request For Proposals (RFPs) through natural conversation.
+
+STRICT RULES:
+- You MUST respond with ONLY valid JSON.
+- Do NOT include any explanation before or after the JSON.
+- Do NOT include markdown formatting or code blocks.
+
+Current RFP JSON: {draft_json}
+User message: {user_message}
+
+Do NOT repeat the RFP. Return only the CHANGES the user's message implies, as a list of operations:
+- {{"op": "set", "path": "<field>", "value": <value>}} sets or replaces a field
+- {{"op": "append", "path": "items", "value": {{"name": "string", "quantity": number, "specs": {{}}}}}} adds an item
+- {{"op": "remove", "path": "<field>"}} removes a field, only if the user explicitly asks
+Paths are dot separated; list elements use their index, e.g. "items.0.quantity".
+Leave existing data alone unless the user explicitly changes it. Use an empty list when nothing changes.
+
+RFP fields: project_title (string), budget (number), deadline_days (number),
+items (array of {{name, quantity, specs}}), payment_terms (string), warranty (string), other_requirements (string)
+
+EXAMPLES:
+Existing: {{"project_title": "Office Setup"}}
+User: "Budget is $50,000"
+draft_patch: [{{"op": "set", "path": "budget", "value": 50000}}]
+
+Existing: {{"items": [{{"name": "laptops", "quantity": 10}}]}}
+User: "Make it 12 laptops and also 5 monitors"
+draft_patch: [{{"op": "set", "path": "items.0.quantity", "value": 12}}, {{"op": "append", "path": "items", "value": {{"name": "monitors", "quantity": 5}}}}]
+
+Respond with exactly these fields, in this order:
+{{"assistant_reply": "conversational response (string)", "draft_patch": [operations], "missing_fields": ["fields that still need clarification"]}}
+"""
+
 
 # Email Template Generation Prompt
 EMAIL_GENERATION_PROMPT = """
@@ -302,14 +383,36 @@ Return ONLY the JSON. No explanation, no commentary, no markdown code blocks.
 
 ASGI_APPLICATION = "google_email_service.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("localhost", 6379)],
+# 'redis' for multi-process deployments, 'memory' for a single node or tests
+CHANNEL_LAYER_BACKEND = config("CHANNEL_LAYER_BACKEND", default="redis")
+CHANNEL_REDIS_URL = config("CHANNEL_REDIS_URL", default="redis://localhost:6379/0")
+
+if CHANNEL_LAYER_BACKEND == "memory":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
         },
-    },
-}
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [CHANNEL_REDIS_URL],
+            },
+        },
+    }
+
+# WebSocket broadcasts are collected for this long and sent as one batch per group
+CHAT_BROADCAST_FLUSH_SECONDS = config("CHAT_BROADCAST_FLUSH_SECONDS", default=0.005, cast=float)
+CHAT_BROADCAST_MAX_BATCH = config("CHAT_BROADCAST_MAX_BATCH", default=500, cast=int)
+
+# Recent broadcasts kept per chat group so reconnecting clients can resume (?last_seq=)
+CHAT_REPLAY_BUFFER = config("CHAT_REPLAY_BUFFER", default=True, cast=bool)
+CHAT_REPLAY_BUFFER_SIZE = config("CHAT_REPLAY_BUFFER_SIZE", default=200, cast=int)
+CHAT_REPLAY_TTL_SECONDS = config("CHAT_REPLAY_TTL_SECONDS", default=300, cast=int)
+# Groups (chat sessions) the in-memory replay buffer keeps counters for
+CHAT_REPLAY_MAX_GROUPS = config("CHAT_REPLAY_MAX_GROUPS", default=10000, cast=int)
 
 CORS_ALLOW_ALL_ORIGINS = config("CORS_ALLOW_ALL_ORIGINS", default=True, cast=bool)
 CORS_ALLOW_CREDENTIALS = config("CORS_ALLOW_CREDENTIALS", default=True, cast=bool)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from vendors import quality
+from vendors.models import refresh_quality_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Recompute the vendor quality snapshot (quality_* columns) used by RFP scoring'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute every vendor, not only those with a missing or outdated snapshot',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Vendors per bulk update (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        written = refresh_quality_snapshots(
+            stale_only=not options['all'],
+            batch_size=options['batch_size']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Recomputed quality snapshot for {written} vendor(s) '
+                f'(version {quality.QUALITY_SNAPSHOT_VERSION})'
+            )
+        )
@@ -1,6 +1,91 @@
 from django.db import models
 
-# Create your models here.
+from vendors import quality
+
+
+class VendorQuerySet(models.QuerySet):
+    """
+    Keeps the quality snapshot columns in step on bulk writes, which
+    bypass Vendor.save(), and marks the vendors' RFP scores for rescoring.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for vendor in objs:
+            quality.apply_snapshot(vendor)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if not set(fields) & set(quality.SOURCE_FIELDS):
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        objs = list(objs)
+        for vendor in objs:
+            quality.apply_snapshot(vendor)
+        fields += [field for field in quality.SNAPSHOT_FIELDS if field not in fields]
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        _mark_rescoring([vendor.pk for vendor in objs])
+        return rows
+
+    def update(self, **kwargs):
+        if not set(kwargs) & set(quality.SOURCE_FIELDS):
+            return super().update(**kwargs)
+
+        # The filter may stop matching once the update is applied
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        refresh_quality_snapshots(pks)
+        _mark_rescoring(pks)
+        return rows
+
+
+def _mark_rescoring(pks):
+    # Bulk writes send no signals, so RFP scores are marked for rescoring here
+    from chat.services import incremental_scoring
+
+    incremental_scoring.mark_vendors_changed(pks)
+
+
+def refresh_quality_snapshots(pks=None, stale_only=False, batch_size=1000):
+    """
+    Recompute the quality snapshot of the given vendors (all when pks is
+    None; with stale_only, only those not on the current formula version)
+    in batches. Returns the number of vendors written.
+    """
+    queryset = Vendor.objects.order_by('pk').only('pk', *quality.SOURCE_FIELDS)
+    if stale_only:
+        queryset = queryset.exclude(quality_version=quality.QUALITY_SNAPSHOT_VERSION)
+
+    if pks is not None:
+        pks = sorted(pks)
+        batches = (
+            queryset.filter(pk__in=pks[start:start + batch_size])
+            for start in range(0, len(pks), batch_size)
+        )
+    else:
+        batches = _keyset_batches(queryset, batch_size)
+
+    written = 0
+    for batch in batches:
+        batch = list(batch)
+        for vendor in batch:
+            quality.apply_snapshot(vendor)
+        # Snapshot fields only, so this does not recurse into update()
+        Vendor.objects.bulk_update(batch, list(quality.SNAPSHOT_FIELDS))
+        written += len(batch)
+    return written
+
+
+def _keyset_batches(queryset, batch_size):
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
 
 class Vendor(models.Model):
     name = models.CharField(max_length=255)
@@ -29,8 +114,31 @@ class Vendor(models.Model):
         help_text="Percentage of orders delivered on time (0-100)"
     )
 
+    # Quality components derived from the fields above (see vendors.quality)
+    quality_verification_score = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
+    quality_rating_score = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
+    quality_delivery_score = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
+    quality_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Formula version of the quality_* columns (0 = not computed yet)"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = VendorQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} - {self.email}"
+
+    def save(self, *args, **kwargs):
+        # Source fields that were never loaded cannot have changed
+        if not self.get_deferred_fields() & set(quality.SOURCE_FIELDS):
+            quality.apply_snapshot(self)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(quality.SOURCE_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | set(quality.SNAPSHOT_FIELDS)
+
+        super().save(*args, **kwargs)
@@ -0,0 +1,74 @@
+"""
+Vendor quality components that depend only on Vendor fields.
+
+They are stored on the vendor itself (the quality_* columns) whenever it
+is saved, bulk created or bulk updated, so RFP scoring reads them instead
+of recomputing them for every vendor of every RFP. quality_version records
+which version of these formulas produced the stored values; bump
+QUALITY_SNAPSHOT_VERSION when a formula changes and run
+`manage.py recompute_vendor_quality` to backfill.
+"""
+from decimal import Decimal
+
+QUALITY_SNAPSHOT_VERSION = 1
+
+# Vendor fields the components are computed from
+SOURCE_FIELDS = (
+    'is_email_verified',
+    'is_phone_verified',
+    'is_business_verified',
+    'overall_rating',
+    'on_time_delivery_rate',
+)
+
+SNAPSHOT_FIELDS = (
+    'quality_verification_score',
+    'quality_rating_score',
+    'quality_delivery_score',
+    'quality_version',
+)
+
+
+def verification_score(is_email_verified, is_phone_verified, is_business_verified):
+    score = Decimal('0.00')
+
+    if is_email_verified:
+        score += Decimal('33.33')
+    if is_phone_verified:
+        score += Decimal('33.33')
+    if is_business_verified:
+        score += Decimal('33.34')
+
+    return score
+
+
+def rating_score(overall_rating):
+    # Convert 1-5 rating to 0-100 scale
+    rating = Decimal(str(overall_rating))
+    score = (rating / Decimal('5.00')) * 100
+    return Decimal(str(round(score, 2)))
+
+
+def delivery_score(on_time_delivery_rate):
+    return Decimal(str(on_time_delivery_rate))
+
+
+def snapshot_values(vendor):
+    """
+    Current quality_* column values for vendor.
+    """
+    return {
+        'quality_verification_score': verification_score(
+            vendor.is_email_verified,
+            vendor.is_phone_verified,
+            vendor.is_business_verified,
+        ),
+        'quality_rating_score': rating_score(vendor.overall_rating),
+        'quality_delivery_score': delivery_score(vendor.on_time_delivery_rate),
+        'quality_version': QUALITY_SNAPSHOT_VERSION,
+    }
+
+
+def apply_snapshot(vendor):
+    for field, value in snapshot_values(vendor).items():
+        setattr(vendor, field, value)